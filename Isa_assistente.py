@@ -1,8 +1,25 @@
 import os
-import json 
-import base64 
+import time
+from collections import deque
 import streamlit as st
-from groq import Groq
+from isa.archive import available_formats, export_conversations, file_extension, import_archive
+from isa.backends import LOCAL_API_KEY, get_backend
+from isa.batch import MAX_BATCH_QUESTIONS, describe_item, describe_summary, parse_questions, render_batch, run_batch
+from isa.context import build_context, context_budget, count_tokens
+from isa.documents import UPLOAD_TYPES, SessionDocuments
+from isa.history_view import HISTORY_PAGE, render_history
+from isa.metrics import REGISTRY, TurnTimings, record_turn, stage_timer
+from isa.persistence import HistoryPersistence
+from isa.pipeline import ServiceBusyError, complete_chat, overload_errors, stream_chat
+from isa.prompts import FOCUS_OPTIONS, STYLE_OPTIONS, get_prefix_tracker, get_template
+from isa.response_cache import cache_key, get_response_cache
+from isa.retrieval import build_file_injection
+from isa.router import DEFAULT_MODEL, get_router
+from isa.session_store import SEARCH_ENABLED, get_session_store
+from isa.startup import initialize, warmup
+from isa.summarizer import ConversationSummary, collect_summary, submit_summary
+from isa.theme import DEFAULT_THEME, apply_theme, confirm_theme
+from isa.streaming import TurnStats, cached_prompt_tokens, iter_groq_deltas, render_stream
 
 # Configuração da página
 st.set_page_config(
@@ -17,301 +34,114 @@ if 'prompt_starter_value' not in st.session_state:
     st.session_state.prompt_starter_value = None
 # NOVO: Estado para controlar o tema
 if 'theme' not in st.session_state:
-    st.session_state.theme = 'dark' # Tema padrão: escuro
+    st.session_state.theme = DEFAULT_THEME # Tema padrão: escuro (ou ISA_DEFAULT_THEME)
+# Métricas por turno (TTFT, tokens/s) das últimas respostas
+if 'turn_stats' not in st.session_state:
+    st.session_state.turn_stats = deque(maxlen=50)
 
-# --- LÓGICA DE PERSISTÊNCIA ---
+# Inicialização do processo (uma vez só: exportadores e coletores de métricas)
+# e os tempos desta execução do script
+initialize()
+tempos = TurnTimings()
 
-def load_history_from_url():
-    """Carrega o histórico de mensagens da URL (parâmetro 'h') usando st.query_params."""
-    query_params = st.query_params
-    if 'h' in query_params:
-        try:
-            encoded_history = query_params['h']
-            # Decodifica de base64 e depois de JSON
-            json_string = base64.b64decode(encoded_history).decode('utf-8')
-            return json.loads(json_string)
-        except Exception:
-            return []
-    return []
+# --- LÓGICA DE PERSISTÊNCIA ---
 
-def save_history_to_url():
-    """Salva o histórico atual no parâmetro 'h' da URL usando st.query_params."""
-    history_to_save = st.session_state.messages
-    json_string = json.dumps(history_to_save)
-    encoded_history = base64.b64encode(json_string.encode('utf-8')).decode('utf-8')
-    st.query_params['h'] = encoded_history
-
-# --- CONFIGURAÇÃO DE TEMA DINÂMICA (CORREÇÃO DE CORES INCLUÍDA) ---
-# Lógica para alternar cores dependendo do estado do tema
-is_dark = st.session_state.theme == 'dark'
-
-# Cores base
-# Fundo principal (Cor de Fundo Mais Escura)
-BG_MAIN = '#0c121e' if is_dark else '#f1f5f9' 
-# Fundo secundário/sidebar (Cor de Fundo da Sidebar, um pouco mais clara que o BG_MAIN)
-BG_SECONDARY = '#111827' if is_dark else '#ffffff' 
-# Cor do input e widget (Fundo da caixa de código, chat, input de texto)
-BG_WIDGET_DARK = '#1e293b' 
-BG_WIDGET_LIGHT = '#f8fafc' # Cor para widgets no tema claro
-BG_WIDGET = BG_WIDGET_DARK if is_dark else BG_WIDGET_LIGHT 
-
-# Cor do texto principal: BRANCO/NEON no escuro, PRETO/CINZA ESCURO no claro
-COLOR_TEXT_DARK = '#e2e8f0' 
-COLOR_TEXT_LIGHT = '#1e293b' # <-- ESTA É A COR PRETA/CINZA ESCURO
-COLOR_TEXT = COLOR_TEXT_DARK if is_dark else COLOR_TEXT_LIGHT
-# Cor Neon 
-COLOR_ACCENT = '#00ffb3' 
-# Sombra Neon
-COLOR_SHADOW = 'rgba(0, 255, 179, 0.3)' 
-# Cor das linhas separadoras (hr) e bordas
-COLOR_HR_LIGHT = '#94a3b8' 
-COLOR_BORDER_LIGHT = '#94a3b8' 
-
-# Cor de Fundo do balão de CHAT e Fundo de Código
-CHAT_BUBBLE_BG = BG_WIDGET
-
-# CSS base para o tema
-st.markdown(f"""
-    <style>
-    /* Estilo do corpo, Main, e App */
-    body, .main, .stApp {{
-        /* Fundo principal usa o BG_MAIN */
-        background: linear-gradient(145deg, {BG_MAIN}, {'#1e293b' if is_dark else '#e2e8f0'}) !important;
-        color: {COLOR_TEXT};
-        font-family: 'Segoe UI', sans-serif;
-    }}
-    
-    /* Títulos e Elementos Neon */
-    h1, h2, h3, .stMarkdown h1, section[data-testid="stSidebar"] h1, section[data-testid="stSidebar"] h2, section[data-testid="stSidebar"] h3 {{
-        color: {COLOR_ACCENT if is_dark else COLOR_TEXT} !important;
-        text-shadow: 0 0 15px {COLOR_ACCENT} {'!important' if is_dark else ''};
-        font-weight: 700;
-    }}
-    
-    /* Sidebar */
-    section[data-testid="stSidebar"] {{
-        background-color: {BG_SECONDARY};
-        border-right: 2px solid {COLOR_ACCENT};
-        box-shadow: 0 0 10px {COLOR_SHADOW};
-    }}
-    
-    /* CORREÇÃO FINAL DE TEXTO: AGRESSIVIDADE MÁXIMA PARA A SIDEBAR */
-    section[data-testid="stSidebar"] * {{
-        color: {COLOR_TEXT} !important; 
-    }}
-
-    /* Seletor para o texto do Main (chat, markdown geral) */
-    .stMarkdown, 
-    .stMarkdown p, 
-    .stMarkdown li {{
-        color: {COLOR_TEXT} !important; 
-    }}
-
-    /* EXCEÇÃO: Mantém as cores do status da API (verde/vermelho) */
-    p[style*='color: #00ffb3'] {{
-        color: #00ffb3 !important;
-    }}
-    p[style*='color: #ff4b4b'] {{
-        color: #ff4b4b !important;
-    }}
-
-    /* --- LINHAS SEPARADORAS (HR) --- */
-    hr {{
-        border-top: 1px solid {COLOR_ACCENT if is_dark else COLOR_HR_LIGHT} !important;
-        margin: 1rem 0 !important;
-    }}
-
-
-    /* --- PADRONIZAÇÃO DE FUNDO DOS WIDGETS E CHAT/CÓDIGO --- */
-
-    /* Fundo do Input do Chat */
-    div[data-testid="stForm"] > div > div {{
-        background-color: {BG_WIDGET} !important;
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-        border-radius: 10px;
-    }}
-    
-    /* Fundo do ALERTA (st.info, st.warning etc.) */
-    div[data-testid^="stAlert"] {{
-        background-color: {BG_WIDGET} !important; 
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-        color: {COLOR_TEXT} !important; /* CORRIGINDO A COR DO TEXTO AQUI */
-    }}
-    /* Garante que o texto dentro do alerta também siga a cor */
-    div[data-testid^="stAlert"] * {{
-        color: {COLOR_TEXT} !important; 
-    }}
-
-
-    /* Fundo dos Balões de Chat (user e assistant) */
-    div[data-testid="stChatMessage"] {{
-        background-color: {CHAT_BUBBLE_BG} !important; 
-    }}
-
-    /* Balão de chat do usuário */
-    div[data-testid="stChatMessage"]:nth-child(even) {{
-        background-color: {CHAT_BUBBLE_BG} !important; 
-    }}
-
-    /* Balão de chat do assistente */
-    div[data-testid="stChatMessage"]:nth-child(odd) {{
-        background-color: {CHAT_BUBBLE_BG} !important; 
-    }}
-    
-    /* Garante que o texto do balão também use a cor padrão */
-    div[data-testid="stChatMessage"] div.stMarkdown, 
-    div[data-testid="stChatMessage"] .stMarkdown p, 
-    div[data-testid="stChatMessage"] .stMarkdown li {{
-        color: {COLOR_TEXT} !important; 
-    }}
-    
-    /* Fundo dos Widgets de Input na Sidebar (Slider, Selectbox, TextInput) */
-    div[data-testid^="st"] > div > div > div[data-baseweb="input"],
-    div[data-testid^="st"] > div > div > div[data-baseweb="select"],
-    div[data-testid^="st"] > div > div > div[data-baseweb="slider"],
-    section[data-testid="stSidebar"] div[data-testid="stTextInput"] > div > div,
-    section[data-testid="stSidebar"] div[data-testid="stSelectbox"] > div > div,
-    section[data-testid="stSidebar"] div[data-testid="stSlider"] > div > div {{
-        background-color: {BG_WIDGET} !important;
-        color: {COLOR_TEXT} !important; 
-    }}
-
-    /* Fundo do código (bloco de código no markdown <pre>) */
-    pre, div[data-testid="stCodeBlock"] {{
-        background-color: {BG_WIDGET} !important;
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-        border-radius: 6px;
-    }}
-
-    /* Fundo do componente de UPLOAD de arquivo (Caixa de arquivo) */
-    section[data-testid="stFileUploaderDropzone"] {{
-        background-color: {BG_WIDGET} !important; 
-        border: 2px dashed {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-        border-radius: 6px;
-    }}
-    
-    /* O botão 'Browse files' dentro do File Uploader */
-    section[data-testid="stFileUploaderDropzone"] button {{
-        background-color: {BG_WIDGET} !important; 
-        color: {COLOR_TEXT} !important;
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-    }}
-    section[data-testid="stFileUploaderDropzone"] button:hover {{
-        background-color: {COLOR_ACCENT} !important;
-        color: {BG_MAIN} !important;
-    }}
-    
-    /* Cores do scrollbar */
-    ::-webkit-scrollbar {{
-        width: 8px;
-    }}
-    ::-webkit-scrollbar-thumb {{
-        background: {COLOR_ACCENT};
-        border-radius: 10px;
-    }}
-    
-    /* Estilo dos botões de sugestão (Main) */
-    .stButton>button {{
-        color: {COLOR_ACCENT} !important;
-        border-color: {COLOR_ACCENT} !important;
-        background-color: {BG_MAIN} !important;
-        border-radius: 20px;
-        padding: 5px 15px;
-        margin: 5px;
-        transition: all 0.2s;
-        white-space: normal; 
-        line-height: 1.2;
-        height: auto; 
-    }}
-    .stButton>button:hover {{
-        background-color: {COLOR_ACCENT} !important;
-        color: {BG_MAIN} !important;
-        box-shadow: 0 0 10px {COLOR_ACCENT};
-    }}
-
-    /* CORREÇÃO DOS BOTÕES NA SIDEBAR (Tema, Limpar Histórico) */
-    div[data-testid="stSidebar"] .stButton > button {{
-        background-color: {BG_SECONDARY} !important;
-        color: {COLOR_TEXT} !important; 
-        border-color: {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT} !important;
-    }}
-    div[data-testid="stSidebar"] .stButton > button:hover {{
-        background-color: {COLOR_ACCENT} !important;
-        color: {BG_MAIN} !important;
-    }}
-    
-    /* CORREÇÃO VISUAL DO TRECHO "Modelo em Uso" E BOTÃO SUPORTE */
-    /* Garante que todo texto da sidebar use COLOR_TEXT */
-    section[data-testid="stSidebar"] p,
-    section[data-testid="stSidebar"] span,
-    section[data-testid="stSidebar"] div {{
-        color: {COLOR_TEXT} !important;
-    }}
-
-    /* Corrigir o bloco de código inline (o nome do modelo) */
-    section[data-testid="stSidebar"] code {{
-        background-color: {BG_WIDGET} !important;
-        color: {COLOR_TEXT} !important;
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT};
-        border-radius: 4px;
-        padding: 2px 4px;
-        font-weight: bold;
-    }}
-
-    /* Botão "E-mail Para o Suporte" (Link Button) */
-    section[data-testid="stSidebar"] a, 
-    section[data-testid="stSidebar"] .st-link-button {{
-        /* Cor do Texto do Link */
-        color: {COLOR_TEXT} !important; 
-        /* Cor de Fundo do Botão de Link */
-        background-color: {BG_WIDGET} !important;
-        /* Cor da Borda do Botão de Link */
-        border: 1px solid {COLOR_ACCENT if is_dark else COLOR_BORDER_LIGHT} !important;
-    }}
-
-    /* Outras configurações (rodapé, etc.) */
-    footer, div[role="contentinfo"] {{
-        display: none;
-    }}
-    /* Otimização: remove a animação de digitação do H1 (causa problemas de layout) */
-    .typing {{
-        border-right: none;
-        white-space: normal;
-        overflow: visible;
-        animation: none;
-    }}
-    </style>
-""", unsafe_allow_html=True)
+def get_history_persistence():
+    """Estado incremental de salvamento do histórico desta sessão."""
+    if 'history_persistence' not in st.session_state:
+        st.session_state.history_persistence = HistoryPersistence()
+    return st.session_state.history_persistence
 
-# Ícone animado da ISA (canto superior direito)
-st.markdown("""
-    <style>
-    .isa-icon {
-        position: fixed;
-        top: 20px;
-        right: 40px;
-        font-size: 35px;
-        color: #00ffb3;
-        animation: pulse 2s infinite;
-        z-index: 999;
-    }
-    @keyframes pulse {
-        0% { text-shadow: 0 0 5px #00ffb3; }
-        50% { text-shadow: 0 0 20px #00ffb3; transform: scale(1.1); }
-        100% { text-shadow: 0 0 5px #00ffb3; transform: scale(1); }
-    }
-    </style>
-    <div class="isa-icon">🤖</div>
-""", unsafe_allow_html=True)
+def remember_conversation(conversation_id):
+    """Guarda o ID entre as conversas desta sessão (as únicas que a busca pode mostrar)."""
+    if conversation_id:
+        st.session_state.setdefault('own_conversations', set()).add(conversation_id)
 
-# --- PROMPT DO SISTEMA PADRÃO ---
-BASE_PROMPT = """
-Você é o "ISA AI", um assistente virtual amigável, inteligente e útil. 
-Sua missão é responder perguntas sobre diversos tópicos, gerar códigos, dar explicações e fornecer resumos de forma clara, precisa e útil. Seu tom deve ser encorajador e profissional.
-"""
+def load_history_from_url():
+    """Carrega o histórico indicado na URL: ID da conversa no servidor ('hid') ou envelope comprimido ('h')."""
+    messages = get_history_persistence().load(st.query_params)
+    remember_conversation(get_history_persistence().conversation_id)
+    return messages
 
-# Modelo de IA fixo (o mais rápido e estável que funcionou)
-MODELO_ESTAVEL = "llama-3.1-8b-instant" 
+def save_history_to_url():
+    """Salva só as mensagens novas (no armazenamento do servidor; na URL com ISA_HISTORY_STORAGE=url)."""
+    get_history_persistence().save(
+        st.session_state.messages, st.query_params, st.session_state.get('conversation_summary')
+    )
+    remember_conversation(get_history_persistence().conversation_id)
+
+def open_conversation(conversation_id):
+    """Troca a conversa da sessão pela salva no servidor sob `conversation_id`."""
+    st.query_params.clear()
+    st.query_params["hid"] = conversation_id
+    for chave in ('messages', 'history_persistence', 'conversation_summary'):
+        st.session_state.pop(chave, None)
+    st.session_state.summary_future = None
+    st.session_state.history_window = HISTORY_PAGE
+
+def render_turn_panel(placeholder):
+    """Métricas do último turno, cache e contexto (mostradas na sidebar)."""
+    with placeholder.container():
+        if st.session_state.turn_stats:
+            ultimo_turno = st.session_state.turn_stats[-1]
+            if ultimo_turno['cache_hit']:
+                st.caption(f"Último turno: resposta do cache em {ultimo_turno['total'] * 1000:.0f} ms")
+            else:
+                st.caption(f"Último turno: {ultimo_turno['ttft']:.2f}s até o 1º token · {ultimo_turno['tokens_per_sec']:.0f} tokens/s")
+        cache_stats = get_response_cache().stats()
+        if cache_stats['hits']:
+            st.caption(f"Cache de respostas: {cache_stats['hits']} acertos em {cache_stats['hits'] + cache_stats['misses']} consultas")
+        prefix_stats = get_prefix_tracker().stats()
+        if prefix_stats['requests']:
+            st.caption(f"Cache de prefixo do prompt: {prefix_stats['hit_ratio']:.0%} dos pedidos · {prefix_stats['token_ratio']:.0%} dos tokens")
+        context_report = st.session_state.get('last_context_report')
+        if context_report and context_report.trimmed_messages:
+            st.caption(f"Contexto: {context_report.trimmed_messages} mensagens antigas (~{context_report.trimmed_tokens} tokens) ficaram fora do último prompt.")
+
+def render_model_panel(placeholder):
+    """Modelo escolhido na última pergunta, o motivo e a latência medida de cada modelo."""
+    router = get_router()
+    decisao = st.session_state.get('last_route')
+    modelo = decisao.model if decisao else MODELO_ESTAVEL
+    with placeholder.container():
+        # O nome do modelo está entre crases (` `) para usar o novo estilo de bloco inline.
+        st.markdown(f"**Modelo em Uso:** `{modelo}` ({router.profile(modelo).label})")
+        if decisao:
+            motivo = decisao.reason
+            if decisao.failed_over_from:
+                motivo += f" · failover de {', '.join(decisao.failed_over_from)}"
+            st.caption(f"Roteamento: {motivo}")
+        for nome, saude in router.health().items():
+            if saude.samples:
+                partes = []
+                if saude.p50 is not None:
+                    partes.append(f"p50 {saude.p50:.2f}s · p95 {saude.p95:.2f}s")
+                if saude.total_p95 is not None:
+                    partes.append(f"p95 sem streaming {saude.total_p95:.2f}s")
+                latencia = " · ".join(partes) or "sem respostas"
+                st.caption(f"`{nome}`: {latencia} · erros {saude.error_rate:.0%} ({saude.samples} req.)")
+
+def render_debug_panel(placeholder):
+    """Tempo de cada etapa (debug): do último turno e desta execução do script."""
+    with placeholder.container():
+        with st.expander("⏱️ Tempos (debug)"):
+            ultimo_turno = st.session_state.get('last_turn_timings')
+            if ultimo_turno:
+                st.markdown("**Último turno**")
+                for etapa, ms in ultimo_turno.items():
+                    st.caption(f"`{etapa}`: {ms:.1f} ms")
+            st.markdown("**Esta execução**")
+            for etapa, ms in tempos.as_ms().items():
+                st.caption(f"`{etapa}`: {ms:.1f} ms")
+
+# --- CONFIGURAÇÃO DE TEMA DINÂMICA ---
+# As folhas de estilo de cada tema são compiladas uma vez (isa/theme.py);
+# o CSS só é reenviado ao navegador quando o tema da sessão muda.
+apply_theme(st.session_state.theme)
+
+# Modelo padrão (o mais rápido e estável que funcionou); também é o usado nos resumos.
+# O modelo de cada pergunta é escolhido pelo roteador (isa/router.py).
+MODELO_ESTAVEL = DEFAULT_MODEL
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -325,9 +155,15 @@ with st.sidebar:
         help="Obtenha sua chave em https://console.groq.com/keys"
     )
     groq_api_key_final = groq_api_key_input or os.getenv("GROQ_API_KEY")
+    # Backend local (ISA_LLM_BACKEND=local, ex.: isa/mock_server.py) dispensa a chave
+    backend = get_backend()
+    if not backend.requires_api_key:
+        groq_api_key_final = groq_api_key_final or LOCAL_API_KEY
     
     # NOVO: Indicador Visual de API Key
-    if groq_api_key_final:
+    if not backend.requires_api_key:
+        st.markdown(f"<p style='color: #00ffb3; font-weight: bold;'>🟢 Backend: {backend.label}</p>", unsafe_allow_html=True)
+    elif groq_api_key_final:
         st.markdown("<p style='color: #00ffb3; font-weight: bold;'>🟢 API Key Detectada e Pronta</p>", unsafe_allow_html=True)
     else:
         st.markdown("<p style='color: #ff4b4b; font-weight: bold;'>🔴 API Key Faltando ou Inválida</p>", unsafe_allow_html=True)
@@ -336,11 +172,36 @@ with st.sidebar:
     
     # Uploader de Arquivos para Análise
     st.subheader("📁 Análise de Arquivos")
-    uploaded_file = st.file_uploader(
-        "Carregue um arquivo de texto, código ou Markdown (.txt, .py, .md, .java, etc.)", 
-        type=['txt', 'py', 'md', 'java', 'js', 'html', 'css'], 
+    uploaded_files = st.file_uploader(
+        "Carregue arquivos de texto, código ou Markdown (.txt, .py, .md, .java, etc.) ou um projeto em .zip", 
+        type=UPLOAD_TYPES, 
+        accept_multiple_files=True,
         help="A ISA AI pode ler o conteúdo e responder perguntas sobre ele."
     )
+    # Índice de documentos da sessão: só arquivos novos são processados, os removidos saem do índice
+    if 'documents' not in st.session_state:
+        st.session_state.documents = SessionDocuments()
+    documentos = st.session_state.documents
+    with stage_timer("file_decode", tempos):
+        ingest_report = documentos.sync(uploaded_files)
+    for nome_rejeitado, motivo in ingest_report.rejected:
+        st.warning(f"{nome_rejeitado}: {motivo}")
+    for nome_truncado, linhas_omitidas in ingest_report.truncated:
+        st.info(f"{nome_truncado}: arquivo grande; {linhas_omitidas} linhas do meio ficaram de fora (a ISA AI vê o início, o fim e a estrutura do código).")
+    for nome_convertido, codificacao in ingest_report.converted:
+        st.caption(f"{nome_convertido}: lido como {codificacao}")
+    if len(documentos.index):
+        st.caption(f"{len(documentos.index)} documento(s) indexado(s) · {documentos.index.chunk_count} trechos")
+        # Várias perguntas de uma vez sobre os arquivos, respondidas em paralelo (isa/batch.py)
+        with st.expander("📋 Várias Perguntas de Uma Vez"):
+            perguntas_lote = parse_questions(st.text_area(
+                "Uma pergunta por linha",
+                placeholder="Resuma o arquivo\nEncontre possíveis bugs\nExplique cada função",
+                help=f"Até {MAX_BATCH_QUESTIONS} perguntas. Todas usam os mesmos trechos dos arquivos e são respondidas em paralelo.",
+            ))
+            executar_lote = st.button("Analisar em Paralelo ⚡", disabled=not perguntas_lote)
+    else:
+        perguntas_lote, executar_lote = [], False
     st.markdown("---") 
     
     # NOVAS CONFIGURAÇÕES AVANÇADAS
@@ -349,7 +210,7 @@ with st.sidebar:
         # 1. Estilo da Resposta (Tone)
         estilo_resposta = st.selectbox(
             "Estilo da Resposta",
-            options=["Profissional (Padrão)", "Casual e Amigável", "Formal e Detalhado", "Encorajador"],
+            options=STYLE_OPTIONS,
             index=0,
             help="Define o tom da conversa da ISA AI."
         )
@@ -357,7 +218,7 @@ with st.sidebar:
         # 2. Foco da Resposta (Focus)
         foco_resposta = st.selectbox(
             "Foco Principal",
-            options=["Geral (Resumo e Explicação)", "Geração de Código", "Lista de Tópicos", "Respostas Curtas e Diretas"],
+            options=FOCUS_OPTIONS,
             index=0,
             help="Define o formato preferencial da resposta."
         )
@@ -372,6 +233,35 @@ with st.sidebar:
             help="O comprimento máximo da resposta da IA."
         )
 
+        # 4. Streaming (exibe a resposta token a token)
+        usar_streaming = st.toggle(
+            "Resposta em Streaming",
+            value=True,
+            help="Mostra a resposta enquanto ela é gerada, em vez de esperar o texto completo."
+        )
+
+        # 5. Orçamento de contexto (histórico enviado a cada pergunta)
+        orcamento_contexto = st.select_slider(
+            "Orçamento de Contexto (tokens)",
+            options=[4096, 8192, 16384, 32768, 65536, 131072],
+            value=8192,
+            help="Limite de tokens do prompt (sistema + histórico + pergunta). As mensagens mais antigas que não couberem ficam de fora."
+        )
+
+        # 6. Cache de respostas (prompts repetidos respondem na hora)
+        usar_cache = st.toggle(
+            "Usar Cache de Respostas",
+            value=True,
+            help="Reaproveita a resposta de um pedido idêntico feito antes. Desative para forçar uma nova resposta."
+        )
+
+        # 7. Tempos de cada etapa do turno (diagnóstico de desempenho)
+        mostrar_tempos = st.toggle(
+            "Mostrar Tempos (debug)",
+            value=os.getenv("ISA_DEBUG_TIMINGS") == "1",
+            help="Mostra na barra lateral quanto tempo cada etapa do turno levou."
+        )
+
     st.markdown("---")
     
     # --- Botão de Tema ---
@@ -395,13 +285,69 @@ with st.sidebar:
     if st.button("Limpar Histórico do Chat 🧹"):
         st.session_state.messages = []
         st.session_state.prompt_starter_value = None 
-        if 'h' in st.query_params:
-            del st.query_params['h']
+        st.session_state.conversation_summary = ConversationSummary()
+        st.session_state.summary_future = None
+        st.session_state.history_window = HISTORY_PAGE
+        st.session_state.pop('batch_results', None)
+        get_history_persistence().reset(st.query_params)
         st.rerun() 
 
+    # Exportar / importar / buscar conversas (isa/archive.py)
+    with st.expander("🗂️ Conversas"):
+        formato = st.selectbox("Formato da exportação", available_formats(), help="JSON Lines comprimido ou Parquet (colunar)")
+        conversa = list(st.session_state.get('messages', []))
+        resumo = st.session_state.get('conversation_summary')
+        id_conversa = get_history_persistence().conversation_id or ""
+        st.download_button(
+            "Exportar conversa ⬇️",
+            # Gerado só no clique, fora da execução do script
+            data=lambda: export_conversations([(id_conversa, conversa, resumo)], formato),
+            file_name=f"isa-conversa{file_extension(formato)}",
+            disabled=not conversa,
+        )
+        arquivo_conversa = st.file_uploader(
+            "Importar conversa", type=["jsonl", "zst", "gz", "parquet", "json", "txt"], key="import_conversa"
+        )
+        if arquivo_conversa is not None and arquivo_conversa.file_id != st.session_state.get('imported_file_id'):
+            st.session_state.imported_file_id = arquivo_conversa.file_id
+            try:
+                importadas = import_archive(arquivo_conversa.getvalue())
+            except Exception as e:
+                st.error(f"Não foi possível importar o arquivo: {e}")
+            else:
+                for id_importada, _ in importadas:
+                    remember_conversation(id_importada)
+                if importadas:
+                    # Abre a primeira; as demais ficam salvas (e aparecem na busca)
+                    open_conversation(importadas[0][0])
+                    st.rerun()
+                st.warning("Nenhuma mensagem encontrada no arquivo.")
+        if SEARCH_ENABLED:
+            busca = st.text_input(
+                "Buscar nas suas conversas",
+                placeholder="ex.: lista encadeada",
+                help="Só nas conversas criadas, abertas ou importadas nesta sessão.",
+            )
+            if busca:
+                resultados = get_session_store().search(
+                    busca, conversation_ids=st.session_state.get('own_conversations', set())
+                )
+                if not resultados:
+                    st.caption("Nada encontrado.")
+                for resultado in resultados:
+                    papel = "ISA AI" if resultado.role == "assistant" else "Você"
+                    trecho = " ".join(resultado.snippet.split())
+                    st.markdown(f"**{papel}:** {trecho} · [abrir](?hid={resultado.conversation_id})")
+
     st.markdown("---")
-    # O nome do modelo está entre crases (` `) para usar o novo estilo de bloco inline.
-    st.markdown(f"**Modelo em Uso:** `{MODELO_ESTAVEL}` (Rápido e Estável)")
+    # Modelo da última pergunta e latência de cada modelo (atualizado ao fim de cada resposta)
+    painel_modelo = st.empty()
+    render_model_panel(painel_modelo)
+    # Painel com as métricas do último turno (atualizado de novo ao fim de cada resposta)
+    painel_turno = st.empty()
+    render_turn_panel(painel_turno)
+    # Tempos de cada etapa (preenchido no fim da execução, quando ligado nas configurações)
+    painel_debug = st.empty()
     st.markdown("Desenvolvido para auxiliar em suas dúvidas no geral. A IA pode cometer erros, sempre verifique as respostas.")
     st.link_button("✉️ E-mail Para o Suporte ISA", "mailto:isabellyidelfonso@gmail.com")
 
@@ -415,40 +361,37 @@ st.caption("Faça sua pergunta e obtenha código, resumo, explicações e refer
 # --- Lógica do chat ---
 # Inicialização das mensagens
 if "messages" not in st.session_state:
-    st.session_state.messages = load_history_from_url()
-    if st.session_state.messages and 'h' in st.query_params:
-        del st.query_params['h'] 
-
-# Exibe o histórico de mensagens
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Inicialização do cliente Groq
-client = None
-if groq_api_key_final:
-    try:
-        client = Groq(api_key=groq_api_key_final)
-    except Exception as e:
-        # Se a chave for detectada, mas falhar na inicialização
-        st.sidebar.error(f"Erro ao inicializar o cliente Groq. Tente novamente.")
-        st.error(f"Detalhes do erro: {e}")
-        groq_api_key_final = None # Marca como inválida para não prosseguir
-else:
+    with stage_timer("history_load", tempos):
+        st.session_state.messages = load_history_from_url()
+    saved_summary = get_history_persistence().summary
+    st.session_state.conversation_summary = ConversationSummary(**saved_summary) if saved_summary else ConversationSummary()
+    st.session_state.summary_future = None
+
+# Aplica (e salva) o resumo dos turnos antigos, se a atualização em segundo plano já terminou
+if st.session_state.summary_future is not None:
+    st.session_state.conversation_summary, st.session_state.summary_future = collect_summary(
+        st.session_state.summary_future, st.session_state.conversation_summary
+    )
+    save_history_to_url()
+
+# Exibe o histórico de mensagens (só a janela mais recente; as anteriores sob demanda)
+with stage_timer("render_history", tempos):
+    render_history(st.session_state.messages)
+# O turno atual é desenhado logo abaixo do histórico, sem precisar de st.rerun()
+turn_container = st.container()
+# Respostas do último lote de perguntas sobre os arquivos
+batch_container = st.container()
+
+# Os clientes da Groq ficam no pipeline e são criados no primeiro pedido (ou no aquecimento, ao fim desta execução)
+if not groq_api_key_final:
     if not st.session_state.messages:
         # Corrigido para st.info, que tem fundo claro, mas agora o texto será escuro
         st.info("🔑 Por favor, insira sua API Key da Groq na barra lateral para começar.")
 
-# --- Montagem do PROMPT Personalizado ---
-prompt_personalizado = f"""
-{BASE_PROMPT}
-
-Instruções Adicionais (Baseado nas Configurações Avançadas do Usuário):
-1. ESTILO: Responda de forma {estilo_resposta.split('(')[0].strip()}.
-2. FOCO: Sua resposta deve ter como foco principal {foco_resposta.lower()}. Se a resposta for um código, envolva-o em blocos de código Markdown com o idioma especificado (ex: ```python, ```javascript).
-3. PRECISÃO: Mantenha a precisão e a utilidade acima de tudo.
-"""
-# --- Fim da montagem do PROMPT ---
+# --- PROMPT DO SISTEMA ---
+# Pré-compilado para cada estilo/foco (isa/prompts.py), com o mesmo prefixo para todos os
+# usuários; o que varia por pedido (resumo, histórico, arquivos) vai depois dele
+template_prompt = get_template(estilo_resposta, foco_resposta)
 
 # 4. Sugestões de Perguntas (Prompt Starters) - Lógica Mantida
 SUGESTOES = [
@@ -473,13 +416,13 @@ with st.container():
         )
 
 # Define o prompt (priorizando o botão, depois o input do chat)
+# O input é sempre desenhado, já que a página não é recarregada após a resposta
+chat_prompt = st.chat_input("Qual sua dúvida?")
 if st.session_state.prompt_starter_value:
     prompt = st.session_state.prompt_starter_value
     st.session_state.prompt_starter_value = None
-elif st.session_state.prompt_starter_value is None:
-    prompt = st.chat_input("Qual sua dúvida?")
 else:
-    prompt = None
+    prompt = chat_prompt
 
 
 if prompt:
@@ -489,16 +432,19 @@ if prompt:
 
     # --- Lógica de Injeção de Arquivo ---
     full_user_prompt = prompt
-    if uploaded_file is not None:
+    if len(documentos.index):
         try:
-            file_content = uploaded_file.getvalue().decode("utf-8")
-            file_injection = f"\n\n--- CONTEÚDO DO ARQUIVO: {uploaded_file.name} ---\n{file_content}\n--- FIM DO ARQUIVO ---\n\n"
-            full_user_prompt = f"Com base no arquivo que forneci, responda o seguinte: {prompt}{file_injection}"
+            # Só os trechos mais relevantes para a pergunta vão para o prompt
+            # (os documentos já estão indexados desde o upload)
+            with stage_timer("file_injection", tempos):
+                file_injection = build_file_injection(documentos.index, prompt)
+            full_user_prompt = f"Com base nos arquivos que forneci, responda o seguinte: {prompt}{file_injection}"
+            nomes_arquivos = documentos.describe()
             
-            # Adiciona a entrada do usuário ao histórico (com menção ao arquivo)
-            st.session_state.messages.append({"role": "user", "content": f"Arquivo carregado: **{uploaded_file.name}**\n\nMinha pergunta: {prompt}"})
-            with st.chat_message("user"):
-                st.markdown(f"Arquivo carregado: **{uploaded_file.name}**\n\nMinha pergunta: {prompt}")
+            # Adiciona a entrada do usuário ao histórico (com menção aos arquivos)
+            st.session_state.messages.append({"role": "user", "content": f"Arquivo carregado: {nomes_arquivos}\n\nMinha pergunta: {prompt}"})
+            with turn_container.chat_message("user"):
+                st.markdown(f"Arquivo carregado: {nomes_arquivos}\n\nMinha pergunta: {prompt}")
 
         except Exception as e:
             st.error(f"Não foi possível ler o arquivo. Certifique-se de que é um arquivo de texto válido. Erro: {e}")
@@ -506,43 +452,176 @@ if prompt:
     else:
         # Se não há arquivo, apenas adiciona a pergunta normal
         st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
+        with turn_container.chat_message("user"):
             st.markdown(prompt)
 
-    # Prepara as mensagens para a API
-    messages_for_api = [{"role": "system", "content": prompt_personalizado}]
-    for msg in st.session_state.messages[:-1]:
-        messages_for_api.append(msg)
-    messages_for_api.append({"role": "user", "content": full_user_prompt})
-
+    with stage_timer("prompt_assembly", tempos):
+        # Escolhe o modelo pelo tamanho do pedido, pelo foco e pela latência medida de cada um
+        router = get_router()
+        decisao = router.route(
+            template_prompt.tokens + count_tokens(full_user_prompt), max_tokens, foco_resposta
+        )
+        st.session_state.last_route = decisao
+
+        # Prepara as mensagens para a API: resumo dos turnos antigos + janela deslizante
+        # das mensagens recentes dentro do orçamento de tokens
+        summary = st.session_state.conversation_summary
+        messages_for_api, context_report = build_context(
+            template_prompt.system,
+            st.session_state.messages[summary.covered:-1],
+            full_user_prompt,
+            context_budget(decisao.model, max_tokens, orcamento_contexto),
+            summary.as_message() if summary.text else None,
+        )
+    st.session_state.last_context_report = context_report
+    if context_report.trimmed_messages:
+        REGISTRY.inc("isa_context_trimmed_messages_total", context_report.trimmed_messages)
+    if context_report.history_dropped:
+        turn_container.caption(
+            f"⚠️ Nenhuma das {context_report.trimmed_messages} mensagens anteriores coube no orçamento de contexto "
+            f"(a ISA AI não verá o histórico nesta resposta). Aumente o orçamento ou reduza o Max Tokens."
+        )
 
-    # Tenta obter o cliente Groq novamente (se a chave foi inserida agora)
-    client = Groq(api_key=groq_api_key_final) 
+    # Pedido idêntico já respondido? (a resposta nova é gravada mesmo com o cache desativado)
+    response_cache = get_response_cache()
+    chave_cache = cache_key(decisao.model, messages_for_api, max_tokens)
+    resposta_em_cache = response_cache.get(chave_cache) if usar_cache else None
 
-    with st.chat_message("assistant"):
-        with st.spinner(f"ISA AI analisando e pensando..."):
-            try:
-                chat_completion = client.chat.completions.create(
+    with turn_container.chat_message("assistant"):
+        try:
+            stats = TurnStats()
+            started_at = time.perf_counter()
+            if resposta_em_cache:
+                dsa_ai_resposta = resposta_em_cache["content"]
+                st.markdown(dsa_ai_resposta)
+                stats.total = stats.ttft = time.perf_counter() - started_at
+                stats.completion_tokens = resposta_em_cache["completion_tokens"] or 0
+                stats.cache_hit = True
+            else:
+                parametros = dict(
                     messages=messages_for_api,
-                    model=MODELO_ESTAVEL, 
                     temperature=0.7, 
                     max_tokens=max_tokens,
                 )
-                dsa_ai_resposta = chat_completion.choices[0].message.content
-                st.markdown(dsa_ai_resposta)
-                
-                # A resposta da IA é adicionada ao histórico
-                st.session_state.messages.append({"role": "assistant", "content": dsa_ai_resposta})
-            except Exception as e:
-                # Exibe o erro no chat principal
-                st.error(f"Erro da API: Não foi possível obter a resposta da ISA AI. Verifique se sua API Key está correta ou se o modelo está ativo.")
-                st.info(f"Detalhes: {e}")
-                # Remove a última mensagem do usuário do histórico para que não seja salva
-                st.session_state.messages.pop() 
-
-    # Salva o histórico na URL após cada interação (se não houve erro fatal)
-    save_history_to_url()
-    st.rerun() 
+                if usar_streaming:
+                    # A requisição roda no pipeline assíncrono (prazo, novas tentativas e limite de taxa);
+                    # se o modelo falhar antes do primeiro chunk, o roteador passa para o próximo
+                    def iniciar_stream(modelo, tentativas, prazo_primeiro_chunk):
+                        pedido = stream_chat(groq_api_key_final, max_attempts=tentativas, model=modelo, **parametros)
+                        pedido.wait_first_event(prazo_primeiro_chunk)
+                        return pedido
+
+                    # O spinner cobre só a espera pelo primeiro chunk
+                    with st.spinner(f"ISA AI analisando e pensando..."), stage_timer("llm_first_chunk", tempos):
+                        pedido = router.run(decisao, iniciar_stream)
+                    # Renderiza os deltas em lotes; só o texto final vai para o histórico
+                    with stage_timer("llm_stream_render", tempos):
+                        dsa_ai_resposta, stats = render_stream(
+                            iter_groq_deltas(pedido.chunks(), stats), st.empty(), stats, started_at
+                        )
+                else:
+                    def completar(modelo, tentativas, prazo_primeiro_chunk):
+                        # Sem streaming não há primeiro chunk: vale só o prazo total do pipeline
+                        return complete_chat(groq_api_key_final, max_attempts=tentativas, model=modelo, **parametros)
+
+                    with st.spinner(f"ISA AI analisando e pensando..."), stage_timer("llm_response", tempos):
+                        chat_completion = router.run(decisao, completar)
+                    dsa_ai_resposta = chat_completion.choices[0].message.content
+                    st.markdown(dsa_ai_resposta)
+                    stats.total = stats.ttft = time.perf_counter() - started_at
+                    if chat_completion.usage:
+                        stats.completion_tokens = chat_completion.usage.completion_tokens
+                        stats.prompt_tokens = chat_completion.usage.prompt_tokens
+                        stats.cached_tokens = cached_prompt_tokens(chat_completion.usage)
+                router.record(decisao.model, stats.ttft, streaming=usar_streaming)
+                get_prefix_tracker().observe(decisao.model, template_prompt, stats.prompt_tokens, stats.cached_tokens)
+
+                # Após um failover a resposta é de outro modelo: grava sob a chave dele
+                if decisao.failed_over_from:
+                    chave_cache = cache_key(decisao.model, messages_for_api, max_tokens)
+                response_cache.put(chave_cache, dsa_ai_resposta, stats.completion_tokens)
+            
+            # A resposta da IA é adicionada ao histórico
+            st.session_state.messages.append({"role": "assistant", "content": dsa_ai_resposta})
+            st.session_state.turn_stats.append(stats.as_dict())
+            record_turn(decisao.model, stats)
+
+            # Incorpora os turnos mais antigos ao resumo, em segundo plano
+            if st.session_state.summary_future is None:
+                st.session_state.summary_future = submit_summary(
+                    groq_api_key_final, MODELO_ESTAVEL, st.session_state.messages, st.session_state.conversation_summary
+                )
+        except ServiceBusyError as e:
+            # Limite de taxa da API Key ou circuito aberto: nada foi enviado à API
+            st.warning(str(e))
+            st.session_state.messages.pop()
+            record_turn(decisao.model, None, outcome="busy")
+        except overload_errors() as e:
+            st.error("A API da Groq está sobrecarregada ou demorou demais para responder, mesmo após novas tentativas. Tente novamente em instantes.")
+            st.info(f"Detalhes: {e}")
+            st.session_state.messages.pop()
+            record_turn(decisao.model, None, outcome="overloaded")
+        except Exception as e:
+            # Exibe o erro no chat principal
+            st.error(f"Erro da API: Não foi possível obter a resposta da ISA AI. Verifique se sua API Key está correta ou se o modelo está ativo.")
+            st.info(f"Detalhes: {e}")
+            # Remove a última mensagem do usuário do histórico para que não seja salva
+            st.session_state.messages.pop() 
+            record_turn(decisao.model, None, outcome="error")
+
+    # Salva o histórico após cada interação (se não houve erro fatal)
+    with stage_timer("history_save", tempos):
+        save_history_to_url()
+    st.session_state.last_turn_timings = tempos.as_ms()
+    render_turn_panel(painel_turno)
+    render_model_panel(painel_modelo)
+
+if executar_lote:
+    if not groq_api_key_final:
+        st.warning("Por favor, insira sua API Key da Groq na barra lateral para começar.")
+        st.stop()
+    with batch_container:
+        st.markdown(f"**Análise dos arquivos:** {documentos.describe()}")
+        # Um bloco recolhível por pergunta, preenchido enquanto as respostas chegam
+        placeholders = []
+        for pergunta in perguntas_lote:
+            with st.expander(pergunta, expanded=True):
+                placeholders.append((st.empty(), st.empty()))
+        resumo_lote = st.empty()
+        with stage_timer("batch", tempos):
+            lote = run_batch(
+                groq_api_key_final, get_router(), template_prompt, foco_resposta, documentos.index,
+                perguntas_lote, max_tokens, usar_cache,
+            )
+            resumo = render_batch(lote, placeholders)
+        resumo_lote.caption(describe_summary(resumo))
+    st.session_state.batch_results = {
+        "files": documentos.describe(),
+        "items": [
+            {"question": item.question, "answer": item.text, "error": str(item.error or ""), "caption": describe_item(item)}
+            for item in lote.items
+        ],
+        "summary": resumo,
+    }
+    st.session_state.last_turn_timings = tempos.as_ms()
+    render_turn_panel(painel_turno)
+    render_model_panel(painel_modelo)
+elif st.session_state.get('batch_results'):
+    # Lote anterior: as respostas continuam disponíveis (recolhidas) até o próximo
+    lote_anterior = st.session_state.batch_results
+    with batch_container:
+        st.markdown(f"**Análise dos arquivos:** {lote_anterior['files']}")
+        for item in lote_anterior["items"]:
+            with st.expander(item["question"]):
+                if item["error"]:
+                    st.error(f"Não foi possível responder esta pergunta. Detalhes: {item['error']}")
+                else:
+                    st.markdown(item["answer"])
+                st.caption(item["caption"])
+        st.caption(describe_summary(lote_anterior["summary"]))
+
+if mostrar_tempos:
+    render_debug_panel(painel_debug)
 
 # --- Rodapé com brilho (Mantido) ---
 st.markdown("""
@@ -551,4 +630,10 @@ st.markdown("""
         <p style="font-size: 14px;">Feito com ❤️ por <b style="color:#00ffb3;">Isabelly Moraes</b> | 
         <span style="color:#00ffb3;">ISA AI © 2025</span></p>
     </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# O CSS do tema enviado nesta execução chegou ao fim dela (não foi interrompido por um st.rerun())
+confirm_theme()
+
+# Depois da página desenhada: importa o SDK e compila os outros temas em segundo plano
+warmup()
\ No newline at end of file
@@ -0,0 +1,491 @@
+"""Benchmarks do caminho quente do chat, sem rede (AppTest + servidor local simulado).
+
+Mede o custo de um rerun conforme o histórico cresce, salvar/carregar o histórico,
+a injeção de CSS do tema, a injeção de arquivos conforme o tamanho do upload, a
+vazão (turnos/s) com várias sessões simultâneas, o lote de perguntas em paralelo sobre
+um arquivo e a partida a frio (processo novo). O resultado vai para um JSON; com
+--compare, os números são comparados a um JSON anterior e regressões acima da
+tolerância fazem o comando sair com código 1.
+
+    python benchmarks/bench_chat.py --output bench.json
+    python benchmarks/bench_chat.py --quick --compare bench.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP_FILE = os.path.join(ROOT, "Isa_assistente.py")
+
+# Precisa valer antes de importar o app: dados num diretório temporário e sem o
+# limite de taxa da conta Groq (todas as sessões usam a mesma chave local, e o
+# servidor local aguenta bem mais)
+os.environ.setdefault("ISA_DATA_DIR", tempfile.mkdtemp(prefix="isa-bench-"))
+os.environ.setdefault("ISA_RATE_LIMIT_RPS", "10000")
+os.environ.setdefault("ISA_RATE_LIMIT_BURST", "10000")
+os.environ["ISA_LLM_BACKEND"] = "local"
+
+from isa.backends import Backend, set_backend  # noqa: E402
+from isa.mock_server import start_mock_server  # noqa: E402
+
+
+# Métricas comparadas entre versões (p95 e mínimo variam demais entre execuções)
+COMPARED_METRICS = ("median_ms", "turn_p50_ms", "turns_per_sec")
+# Tempos menores que isso também variam demais para serem comparados
+MIN_COMPARABLE_MS = 0.1
+
+
+def p95(values):
+    """Percentil 95 por posição mais próxima (valores já ordenados)."""
+    return values[max(math.ceil(0.95 * len(values)) - 1, 0)]
+
+
+def timed(fn, repeat, setup=None):
+    """Executa `fn` `repeat` vezes e devolve estatísticas em milissegundos.
+
+    Com `setup`, o valor devolvido por ele (preparado fora da medição) é passado a `fn`.
+    """
+    samples = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(p95(samples), 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+
+def fake_history(count):
+    """Histórico alternando perguntas e respostas (com Markdown e blocos de código)."""
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": f"Pergunta {i}: como otimizar a função processa_{i}?"})
+        else:
+            messages.append({
+                "role": "assistant",
+                "content": (
+                    f"Resposta {i}. Use **cache** e evite recomputar.\n\n"
+                    f"```python\ndef processa_{i}(dados):\n    return sorted(set(dados))\n```\n"
+                    "Depois meça de novo. " * 3
+                ),
+            })
+    return messages
+
+
+def share_script_cache():
+    """Faz todos os AppTest usarem um único ScriptCache, como o servidor real.
+
+    O AppTest cria um cache novo (e recompila o script) a cada run; além de somar o
+    custo da compilação a toda medição, compilar em várias threads ao mesmo tempo
+    quebra o ast.parse do CPython 3.11.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+
+def keep_runtime():
+    """Mantém o Runtime simulado do AppTest entre execuções simultâneas.
+
+    Cada AppTest.run instala um Runtime falso e o apaga ao terminar; com várias sessões
+    ao mesmo tempo, a que termina primeiro derruba as outras no meio da execução.
+    """
+    from streamlit.runtime.runtime import Runtime
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    Runtime.instance = classmethod(instance)
+
+
+def new_app():
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(APP_FILE, default_timeout=60)
+
+
+def seeded_app(messages):
+    from isa.summarizer import ConversationSummary
+    at = new_app()
+    at.session_state["messages"] = list(messages)
+    at.session_state["conversation_summary"] = ConversationSummary()
+    at.session_state["summary_future"] = None
+    return at.run()
+
+
+# Roda num processo novo: mede a primeira execução do script (imports e inicialização
+# incluídos, o "first paint") e o primeiro rerun
+STARTUP_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+started = time.perf_counter()
+at.run()
+first_run = time.perf_counter()
+heavy = [name for name in ("groq", "numpy", "pyarrow", "charset_normalizer") if name in sys.modules]
+# O primeiro rerun vem de uma interação do usuário, não imediatamente
+time.sleep(1.0)
+rerun_started = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    "first_run_ms": (first_run - started) * 1000,
+    "rerun_ms": (rerun - rerun_started) * 1000,
+    "loaded": heavy,
+    "errors": len(at.exception),
+}))
+"""
+
+
+def bench_startup(repeat):
+    """Partida a frio: primeira execução do script e primeiro rerun num processo novo."""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, APP_FILE],
+            capture_output=True, text=True, check=True, env=os.environ.copy(),
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["process_ms"] = (time.perf_counter() - started) * 1000
+        runs.append(run)
+
+    def summary(key):
+        samples = sorted(run[key] for run in runs)
+        return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(samples[0], 3)}
+
+    return {
+        "first_run": summary("first_run_ms"),
+        "first_rerun": summary("rerun_ms"),
+        "process": summary("process_ms"),
+        "loaded_after_first_run": runs[-1]["loaded"],
+        "errors": sum(run["errors"] for run in runs),
+    }
+
+
+def bench_rerun(sizes, repeat):
+    """Rerun sem pergunta nova (ex.: clique num widget) conforme o histórico cresce."""
+    results = []
+    for size in sizes:
+        at = seeded_app(fake_history(size))
+        results.append({"messages": size, **timed(at.run, repeat)})
+    return results
+
+
+def bench_persistence(sizes, repeat):
+    """Salvar do zero, salvar mais um turno e carregar um histórico de N mensagens."""
+    from isa.persistence import HistoryPersistence
+    from isa.session_store import SessionStore, get_session_store
+    results = []
+    for size in sizes:
+        messages = fake_history(size)
+
+        def save_full():
+            HistoryPersistence().save(messages, {})
+
+        def saved_before_turn():
+            persistence, params = HistoryPersistence(), {}
+            persistence.save(messages[:-2], params)
+            return persistence, params
+
+        def save_turn(prepared):
+            # Só as duas últimas mensagens (o turno novo) são codificadas
+            persistence, params = prepared
+            persistence.save(messages, params)
+
+        full_params = {}
+        HistoryPersistence().save(messages, full_params)
+
+        get_session_store().flush()
+
+        def load():
+            # Reconexão: a conversa ainda está na memória do processo
+            HistoryPersistence().load(full_params)
+
+        def load_cold():
+            # Processo novo: a conversa vem do SQLite
+            HistoryPersistence(store=SessionStore()).load(full_params)
+
+        results.append({
+            "messages": size,
+            "storage": "store" if "hid" in full_params else "url",
+            "save_full": timed(save_full, repeat),
+            "save_turn": timed(save_turn, repeat, saved_before_turn),
+            "load": timed(load, repeat),
+            "load_cold": timed(load_cold, repeat),
+        })
+    return results
+
+
+def bench_theme(repeat):
+    """Compilação das folhas de estilo e rerun com e sem troca de tema."""
+    from isa.theme import PALETTES, _stylesheet, minify
+    compile_stats = timed(lambda: [minify(_stylesheet(p)) for p in PALETTES.values()], repeat)
+    at = seeded_app([])
+    steady = timed(at.run, repeat)
+
+    def toggle():
+        at.button(key="theme_toggle_button").click().run()
+
+    return {"compile": compile_stats, "rerun_same_theme": steady, "rerun_theme_change": timed(toggle, repeat)}
+
+
+def fake_source(size):
+    """Código Python sintético com aproximadamente `size` bytes."""
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        block = (
+            f"def calcula_total_{i}(itens, desconto=0.{i % 9}):\n"
+            f"    \"\"\"Soma os itens do pedido {i} aplicando o desconto.\"\"\"\n"
+            f"    subtotal = sum(item.preco * item.quantidade for item in itens)\n"
+            f"    return subtotal * (1 - desconto)\n\n"
+        )
+        lines.append(block)
+        total += len(block)
+        i += 1
+    return "".join(lines)
+
+
+def bench_file_injection(sizes, repeat):
+    """Indexação de um upload (feita uma vez) e montagem dos trechos para uma pergunta."""
+    from isa.retrieval import CorpusIndex, build_file_injection, content_hash, parse_document
+    results = []
+    for size in sizes:
+        text = fake_source(size)
+        digest = content_hash(text.encode("utf-8"))
+
+        def index_document():
+            index = CorpusIndex()
+            index.add(parse_document(text, "projeto.py", digest))
+            return index
+
+        index = index_document()
+        query = "como calcula_total_42 aplica o desconto nos itens?"
+        build_file_injection(index, query)
+        results.append({
+            "bytes": len(text),
+            "index": timed(index_document, max(repeat // 5, 1)),
+            "inject": timed(lambda: build_file_injection(index, query), repeat),
+        })
+    return results
+
+
+def bench_sessions(session_counts, turns):
+    """Sessões simultâneas fazendo `turns` perguntas cada; mede turnos/s e latência."""
+    results = []
+    for sessions in session_counts:
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def run_session(number):
+            at = new_app().run()
+            for turn in range(turns):
+                # Perguntas únicas: nenhuma resposta vem do cache
+                started = time.perf_counter()
+                at.chat_input[0].set_value(f"[{sessions}/{number}/{turn}] Explique listas em Python").run()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    errors.extend(e.value for e in at.error)
+
+        threads = [threading.Thread(target=run_session, args=(n,)) for n in range(sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        results.append({
+            "sessions": sessions,
+            "turns": len(latencies),
+            "errors": len(errors),
+            "turns_per_sec": round(len(latencies) / elapsed, 3),
+            "turn_p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "turn_p95_ms": round(p95(latencies) * 1000, 3),
+        })
+    return results
+
+
+def bench_burst(server, session_counts):
+    """Sessões enviando a mesma pergunta ao mesmo tempo (ex.: botão de sugestão numa oficina).
+
+    Pedidos idênticos em andamento são agrupados: as chamadas ao servidor devem ficar
+    perto de 1 por rodada, e não de uma por sessão.
+    """
+    results = []
+    for sessions in session_counts:
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(sessions)
+        # Pergunta nova a cada rodada, para não vir do cache de respostas da rodada anterior
+        question = f"[burst {sessions}] Gere um código Python para uma calculadora."
+
+        def run_session():
+            at = new_app().run()
+            barrier.wait()
+            started = time.perf_counter()
+            at.chat_input[0].set_value(question).run()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+        requests_before = server.requests
+        threads = [threading.Thread(target=run_session) for _ in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencies.sort()
+        results.append({
+            "sessions": sessions,
+            "upstream_requests": server.requests - requests_before,
+            "turn_p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "turn_p95_ms": round(p95(latencies) * 1000, 3),
+        })
+    return results
+
+
+def bench_batch(question_counts):
+    """Várias perguntas sobre um arquivo num lote: tempo total contra a soma das latências."""
+    results = []
+    at = new_app().run()
+    at.get("file_uploader")[0].upload("modulo.py", fake_source(10_000).encode("utf-8")).run()
+    for count in question_counts:
+        # Perguntas novas a cada rodada, para não virem do cache de respostas
+        questions = "\n".join(f"[lote {count}] Explique a função calcula_total_{i}" for i in range(count))
+        at.text_area[0].set_value(questions).run()
+        started = time.perf_counter()
+        next(b for b in at.button if "Paralelo" in b.label).click().run()
+        elapsed = time.perf_counter() - started
+        summary = at.session_state["batch_results"]["summary"]
+        results.append({
+            "questions": count,
+            "errors": summary["errors"],
+            "concurrency": summary["concurrency"],
+            "run_ms": round(elapsed * 1000, 3),
+            "wall_ms": round(summary["wall_time"] * 1000, 3),
+            "sequential_ms": round(summary["sequential_time"] * 1000, 3),
+            "speedup": summary["speedup"],
+        })
+    return results
+
+
+def flatten(data, prefix=""):
+    """Métricas em ms/turnos por segundo com um nome estável (para comparar versões)."""
+    metrics = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            metrics.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, list):
+        for item in data:
+            label = next((f"{k}={item[k]}" for k in ("messages", "bytes", "sessions", "questions") if k in item), "")
+            metrics.update(flatten({k: v for k, v in item.items() if f"{k}=" not in label}, f"{prefix}[{label}]"))
+    elif isinstance(data, (int, float)) and (prefix.endswith("_ms") or prefix.endswith("turns_per_sec")):
+        metrics[prefix] = data
+    return metrics
+
+
+def compare(current, previous, tolerance):
+    """Lista as métricas que pioraram mais que `tolerance` (fração) em relação à execução anterior."""
+    regressions = []
+    old = flatten(previous["results"])
+    for name, value in flatten(current["results"]).items():
+        before = old.get(name)
+        if not name.endswith(COMPARED_METRICS) or not before:
+            continue
+        if name.endswith("_ms") and max(before, value) < MIN_COMPARABLE_MS:
+            continue
+        # Para tempos, maior é pior; para vazão, menor é pior
+        change = (value - before) / before if name.endswith("_ms") else (before - value) / before
+        if change > tolerance:
+            regressions.append({"metric": name, "before": before, "now": value, "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora aceitável (0.25 = 25%%)")
+    parser.add_argument("--quick", action="store_true", help="menos tamanhos e repetições")
+    parser.add_argument("--sessions", default="1,4,8", help="quantidades de sessões simultâneas")
+    parser.add_argument("--turns", type=int, default=3, help="perguntas por sessão")
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=2000.0)
+    args = parser.parse_args()
+
+    repeat = 5 if args.quick else 20
+    history_sizes = [0, 50, 200] if args.quick else [0, 20, 100, 500, 2000]
+    upload_sizes = [10_000, 200_000] if args.quick else [10_000, 100_000, 1_000_000, 5_000_000]
+
+    share_script_cache()
+    keep_runtime()
+    server = start_mock_server(latency=args.mock_latency, tokens_per_sec=args.mock_tokens_per_sec)
+    set_backend(Backend("local", f"Servidor local ({server.base_url})", server.base_url, requires_api_key=False))
+
+    import streamlit
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "platform": platform.platform(),
+            "mock": {"latency": args.mock_latency, "tokens_per_sec": args.mock_tokens_per_sec},
+            "quick": args.quick,
+        },
+        "results": {},
+    }
+    steps = [
+        ("startup", lambda: bench_startup(3 if args.quick else 7)),
+        ("rerun_vs_history", lambda: bench_rerun(history_sizes, repeat)),
+        ("persistence", lambda: bench_persistence(history_sizes, repeat)),
+        ("theme", lambda: bench_theme(repeat)),
+        ("file_injection", lambda: bench_file_injection(upload_sizes, repeat)),
+        ("sessions", lambda: bench_sessions([int(n) for n in args.sessions.split(",")], args.turns)),
+        ("burst", lambda: bench_burst(server, [int(n) for n in args.sessions.split(",")])),
+        ("batch", lambda: bench_batch([2, 4, 8])),
+    ]
+    for name, step in steps:
+        print(f"-> {name}...", flush=True)
+        report["results"][name] = step()
+    report["meta"]["mock"]["requests"] = server.requests
+    server.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for item in regressions:
+            print(f"REGRESSÃO {item['metric']}: {item['before']} -> {item['now']} ({item['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("Sem regressões acima da tolerância.")
+
+
+if __name__ == "__main__":
+    main()
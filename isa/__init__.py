@@ -0,0 +1 @@
+"""Módulos de apoio da ISA AI (streaming, persistência, contexto e afins)."""
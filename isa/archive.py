@@ -0,0 +1,288 @@
+"""Exportação e importação de conversas: JSON Lines comprimido ou Parquet.
+
+Formatos (detectados pelo conteúdo na importação):
+
+- JSON Lines em frames zstd (ou gzip, sem o pacote 'zstandard'): uma linha por
+  mensagem {"conversation", "seq", "role", "content"} e, se houver, uma linha de
+  resumo {"conversation", "summary", "covered"}. Cada conversa é um frame
+  independente, então exportar mais conversas é só acrescentar bytes ao arquivo
+  (arquivos também podem ser concatenados).
+- Parquet (com pyarrow): colunas conversation, seq, role e content comprimidas com
+  zstd; os resumos vão nos metadados do arquivo.
+- O parâmetro 'h' de um link antigo do app (ou o histórico em JSON puro).
+
+Uso pela linha de comando (conversas do armazenamento do servidor):
+
+    python -m isa.archive export conversas.jsonl.zst          (todas)
+    python -m isa.archive export conversa.parquet --id <hid>
+    python -m isa.archive import conversas.jsonl.zst
+    python -m isa.archive search "lista encadeada"
+"""
+import argparse
+import gzip
+import importlib.util
+import io
+import json
+import secrets
+import sys
+import time
+from collections import OrderedDict
+
+from isa.ingest import READ_BLOCK
+from isa.persistence import decode_url_history
+from isa.session_store import SEARCH_LIMIT, get_session_store
+from isa.summarizer import ConversationSummary
+
+try:  # zstd é opcional; sem ele os frames são gzip
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Parquet é opcional; o pyarrow (pesado) só é importado ao exportar/importar nesse formato
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Limite do conteúdo descompactado na importação (protege contra "zip bombs")
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+
+FORMAT_JSONL = "jsonl"
+FORMAT_PARQUET = "parquet"
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+_PARQUET_MAGIC = b"PAR1"
+_PARQUET_SUMMARIES_KEY = b"isa.summaries"
+
+
+def available_formats():
+    return [FORMAT_JSONL, FORMAT_PARQUET] if HAS_PYARROW else [FORMAT_JSONL]
+
+
+def _pyarrow(action):
+    if not HAS_PYARROW:
+        raise ValueError(f"{action} em Parquet requer o pacote 'pyarrow'.")
+    import pyarrow
+    import pyarrow.parquet
+
+    return pyarrow
+
+
+def file_extension(fmt):
+    if fmt == FORMAT_PARQUET:
+        return ".parquet"
+    return ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+
+
+def _summary_dict(summary):
+    if summary is None:
+        return None
+    if isinstance(summary, dict):
+        return summary
+    return {"text": summary.text, "covered": summary.covered}
+
+
+def _jsonl_frame(conversation_id, messages, summary=None):
+    lines = [
+        json.dumps(
+            {"conversation": conversation_id, "seq": seq, "role": m["role"], "content": m["content"]},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        for seq, m in enumerate(messages)
+    ]
+    summary = _summary_dict(summary)
+    if summary and summary["covered"]:
+        record = {"conversation": conversation_id, "summary": summary["text"], "covered": summary["covered"]}
+        lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def export_conversations(conversations, fmt=FORMAT_JSONL, output=None):
+    """Grava [(id, mensagens, resumo), ...] em `output` (arquivo binário) ou devolve os bytes."""
+    buffer = output if output is not None else io.BytesIO()
+    if fmt == FORMAT_PARQUET:
+        pyarrow = _pyarrow("Exportar")
+        columns = {"conversation": [], "seq": [], "role": [], "content": []}
+        summaries = {}
+        for conversation_id, messages, summary in conversations:
+            for seq, message in enumerate(messages):
+                columns["conversation"].append(conversation_id)
+                columns["seq"].append(seq)
+                columns["role"].append(message["role"])
+                columns["content"].append(message["content"])
+            if _summary_dict(summary):
+                summaries[conversation_id] = _summary_dict(summary)
+        table = pyarrow.table({
+            "conversation": pyarrow.array(columns["conversation"], pyarrow.string()).dictionary_encode(),
+            "seq": pyarrow.array(columns["seq"], pyarrow.int32()),
+            "role": pyarrow.array(columns["role"], pyarrow.string()).dictionary_encode(),
+            "content": pyarrow.array(columns["content"], pyarrow.string()),
+        })
+        table = table.replace_schema_metadata({_PARQUET_SUMMARIES_KEY: json.dumps(summaries).encode("utf-8")})
+        pyarrow.parquet.write_table(table, buffer, compression="zstd")
+    else:
+        for conversation_id, messages, summary in conversations:
+            buffer.write(_jsonl_frame(conversation_id, messages, summary))
+    return buffer.getvalue() if output is None else None
+
+
+def _decompress_frames(data, max_bytes=None):
+    """Descomprime em blocos, parando com ValueError se passar de `max_bytes` (padrão: MAX_IMPORT_BYTES)."""
+    max_bytes = max_bytes or MAX_IMPORT_BYTES
+    if data.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Arquivo comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        stream = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+    else:
+        # GzipFile também lê vários membros concatenados
+        stream = gzip.GzipFile(fileobj=io.BytesIO(data))
+    output = bytearray()
+    with stream:
+        while block := stream.read(READ_BLOCK):
+            output += block
+            if len(output) > max_bytes:
+                raise ValueError(f"Conteúdo descompactado passa de {max_bytes // (1024 * 1024)} MB.")
+    return bytes(output)
+
+
+def _check_messages(messages):
+    """Garante que cada mensagem tem role e content em texto (o resto do app assume isso)."""
+    if not isinstance(messages, list):
+        raise ValueError("Histórico inválido: esperada uma lista de mensagens.")
+    for message in messages:
+        if not (isinstance(message, dict) and isinstance(message.get("role"), str)
+                and isinstance(message.get("content"), str)):
+            raise ValueError("Mensagem inválida no arquivo: 'role' e 'content' precisam ser texto.")
+    return messages
+
+
+def _check_summary(summary):
+    if summary is None:
+        return None
+    if not (isinstance(summary, dict) and isinstance(summary.get("text"), str)
+            and isinstance(summary.get("covered"), int)):
+        raise ValueError("Resumo inválido no arquivo.")
+    return summary
+
+
+def _group_records(records):
+    """{id: (mensagens, resumo)} a partir dos registros, na ordem em que as conversas aparecem."""
+    conversations = OrderedDict()
+    for record in records:
+        if not isinstance(record, dict) or not isinstance(record.get("conversation", ""), str):
+            raise ValueError("Registro inválido no arquivo.")
+        messages, summary = conversations.setdefault(record.get("conversation", ""), ([], [None]))
+        if "summary" in record:
+            summary[0] = _check_summary({"text": record["summary"], "covered": record.get("covered")})
+        else:
+            seq = record.get("seq", len(messages))
+            if not isinstance(seq, int):
+                raise ValueError("Registro inválido no arquivo: 'seq' precisa ser um número.")
+            message = _check_messages([{"role": record.get("role"), "content": record.get("content")}])[0]
+            messages.append((seq, message["role"], message["content"]))
+    return OrderedDict(
+        (conversation_id, ([{"role": role, "content": content} for _, role, content in sorted(rows)], summary[0]))
+        for conversation_id, (rows, summary) in conversations.items()
+    )
+
+
+def read_archive(data):
+    """Lê um arquivo exportado (qualquer formato suportado) em {id: (mensagens, resumo)}.
+
+    Levanta ValueError se o conteúdo não tiver o formato esperado.
+    """
+    conversations = _read_conversations(data)
+    for conversation_id, (messages, summary) in conversations.items():
+        conversations[conversation_id] = (_check_messages(messages), _check_summary(summary))
+    return conversations
+
+
+def _read_conversations(data):
+    if data.startswith(_PARQUET_MAGIC):
+        pyarrow = _pyarrow("Importar")
+        table = pyarrow.parquet.read_table(io.BytesIO(data))
+        summaries = json.loads((table.schema.metadata or {}).get(_PARQUET_SUMMARIES_KEY, b"{}"))
+        conversations = _group_records(table.to_pylist())
+        for conversation_id, summary in summaries.items():
+            if conversation_id in conversations:
+                conversations[conversation_id] = (conversations[conversation_id][0], summary)
+        return conversations
+    if data.startswith(_ZSTD_MAGIC) or data.startswith(_GZIP_MAGIC):
+        data = _decompress_frames(data)
+    text = data.decode("utf-8-sig").strip()
+    if text.startswith("{"):
+        return _group_records(json.loads(line) for line in text.splitlines() if line.strip())
+    if text.startswith("["):
+        return OrderedDict([("", (json.loads(text), None))])
+    # Parâmetro 'h' de um link do app (com ou sem o restante da URL)
+    value = text.rsplit("h=", 1)[-1].split("&", 1)[0]
+    messages, summary = decode_url_history(value)
+    return OrderedDict([("", (messages, summary))])
+
+
+def import_archive(data, store=None):
+    """Grava cada conversa do arquivo no armazenamento do servidor com um ID novo.
+
+    Devolve a lista de (id_novo, quantidade de mensagens).
+    """
+    store = store or get_session_store()
+    imported = []
+    for messages, summary in read_archive(data).values():
+        if not messages:
+            continue
+        conversation_id = secrets.token_urlsafe(12)
+        store.append(conversation_id, 0, messages)
+        if summary and summary.get("covered"):
+            store.save_summary(conversation_id, ConversationSummary(**summary))
+        imported.append((conversation_id, len(messages)))
+    store.flush()
+    return imported
+
+
+def export_store(conversation_ids=None, fmt=FORMAT_JSONL, output=None, store=None):
+    """Exporta conversas do armazenamento do servidor (todas, se `conversation_ids` for None)."""
+    store = store or get_session_store()
+    ids = conversation_ids if conversation_ids is not None else store.conversation_ids()
+    conversations = ((conversation_id, *store.load(conversation_id)) for conversation_id in ids)
+    return export_conversations(conversations, fmt, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta, importa e busca conversas da ISA AI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="grava conversas num arquivo")
+    export.add_argument("path")
+    export.add_argument("--id", action="append", dest="ids", help="conversa a exportar (padrão: todas)")
+    export.add_argument("--format", choices=[FORMAT_JSONL, FORMAT_PARQUET], help="padrão: pela extensão do arquivo")
+    load = commands.add_parser("import", help="lê conversas de arquivos exportados")
+    load.add_argument("paths", nargs="+")
+    search = commands.add_parser("search", help="busca texto em todas as conversas salvas")
+    search.add_argument("text")
+    search.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    search.add_argument("--answers", action="store_true", help="só nas respostas da ISA AI")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        fmt = args.format or (FORMAT_PARQUET if args.path.endswith(".parquet") else FORMAT_JSONL)
+        with open(args.path, "wb") as f:
+            export_store(args.ids, fmt, f)
+        print(f"Conversas exportadas para {args.path}")
+    elif args.command == "import":
+        for path in args.paths:
+            with open(path, "rb") as f:
+                imported = import_archive(f.read())
+            for conversation_id, count in imported:
+                print(f"{path}: {count} mensagens -> ?hid={conversation_id}")
+    else:
+        started = time.perf_counter()
+        hits = get_session_store().search(args.text, args.limit, "assistant" if args.answers else None)
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            print(f"?hid={hit.conversation_id} #{hit.seq} [{hit.role}] {hit.snippet}")
+        print(f"{len(hits)} resultado(s) em {elapsed * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
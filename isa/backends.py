@@ -0,0 +1,71 @@
+"""Backends de LLM: a API da Groq ou um servidor local compatível (ex.: isa/mock_server.py).
+
+O resto do app só conhece a interface `chat.completions.create` dos clientes da Groq,
+então um backend é apenas a receita para criar esses clientes (assíncronos, usados pelo
+pipeline de requisições) apontando para o servidor certo (o SDK só é importado ao criar o primeiro cliente).
+O backend é escolhido por variável de ambiente:
+
+    ISA_LLM_BACKEND=groq   (padrão) API oficial da Groq
+    ISA_LLM_BACKEND=local  servidor em ISA_LLM_BASE_URL (padrão http://127.0.0.1:8765)
+"""
+import os
+from dataclasses import dataclass
+
+# Limites do pool de conexões de cada cliente (httpx.Limits). O keep-alive é maior que
+# o padrão do SDK (5s) porque entre dois turnos de chat costuma passar mais que isso.
+CONNECTION_LIMITS = dict(
+    max_connections=50,
+    max_keepalive_connections=10,
+    keepalive_expiry=120.0,
+)
+
+LOCAL_BASE_URL = "http://127.0.0.1:8765"
+# Chave usada com o servidor local (ele não valida a chave)
+LOCAL_API_KEY = "local"
+
+
+@dataclass(frozen=True)
+class Backend:
+    """Destino das requisições de chat."""
+    name: str
+    label: str
+    base_url: str | None = None
+    requires_api_key: bool = True
+
+    def async_client(self, api_key):
+        """Cliente assíncrono (usado pelo pipeline de requisições, que cuida das novas tentativas)."""
+        import httpx
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+        return AsyncGroq(
+            api_key=api_key,
+            base_url=self.base_url,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(**CONNECTION_LIMITS)),
+            max_retries=0,
+        )
+
+
+def backend_from_env():
+    name = os.getenv("ISA_LLM_BACKEND", "groq").strip().lower()
+    if name == "groq":
+        return Backend("groq", "API Groq")
+    if name == "local":
+        base_url = os.getenv("ISA_LLM_BASE_URL", LOCAL_BASE_URL).rstrip("/")
+        return Backend("local", f"Servidor local ({base_url})", base_url, requires_api_key=False)
+    raise ValueError(f"ISA_LLM_BACKEND desconhecido: {name!r} (use 'groq' ou 'local')")
+
+
+_BACKEND = backend_from_env()
+
+
+def get_backend():
+    return _BACKEND
+
+
+def set_backend(backend):
+    """Troca o backend do processo (ex.: benchmarks apontando para o servidor local).
+
+    Deve ser chamado antes das primeiras requisições: os clientes já criados ficam no pool.
+    """
+    global _BACKEND
+    _BACKEND = backend
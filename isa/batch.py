@@ -0,0 +1,267 @@
+"""Várias perguntas sobre os arquivos enviados, respondidas em paralelo.
+
+Todas as perguntas de um lote recebem exatamente o mesmo começo de prompt:
+
+    [sistema (isa/prompts.py)] [trechos dos arquivos, recuperados uma vez para o lote todo] [pergunta]
+
+então, depois do primeiro pedido, os seguintes reaproveitam o cache de prefixo do
+provedor. O histórico da conversa fica de fora: cada pergunta é independente.
+
+As perguntas rodam em até BATCH_CONCURRENCY pedidos simultâneos (cada um passa pelo
+pipeline, com limite de taxa, novas tentativas e failover do roteador). A thread do
+Streamlit só desenha o texto já recebido de cada uma, em lotes como no chat.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from isa.context import count_tokens
+from isa.metrics import REGISTRY, record_turn
+from isa.pipeline import stream_chat
+from isa.prompts import get_prefix_tracker
+from isa.response_cache import cache_key, get_response_cache
+from isa.retrieval import TOP_K, build_file_injection
+from isa.streaming import CURSOR, FLUSH_INTERVAL, TurnStats, iter_groq_deltas
+
+# Pedidos simultâneos de um lote
+BATCH_CONCURRENCY = int(os.getenv("ISA_BATCH_CONCURRENCY", "4"))
+# Perguntas aceitas por lote (as demais linhas são ignoradas)
+MAX_BATCH_QUESTIONS = int(os.getenv("ISA_MAX_BATCH_QUESTIONS", "10"))
+# Trechos recuperados para o lote (as perguntas juntas costumam precisar de mais que uma só)
+BATCH_TOP_K = TOP_K * 2
+
+# Threads de todos os lotes do processo; cada lote usa no máximo BATCH_CONCURRENCY delas
+_EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY * 4, thread_name_prefix="isa-lote")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def parse_questions(text, limit=MAX_BATCH_QUESTIONS):
+    """Uma pergunta por linha (sem marcadores de lista, vazias e repetidas)."""
+    questions = []
+    for line in text.splitlines():
+        question = _BULLET_RE.sub("", line).strip()
+        if question and question not in questions:
+            questions.append(question)
+    return questions[:limit]
+
+
+def shared_context(index, questions, top_k=BATCH_TOP_K):
+    """Começo da mensagem do usuário, igual para todas as perguntas do lote."""
+    file_injection = build_file_injection(index, "\n".join(questions), top_k)
+    return f"Com base nos arquivos que forneci, responda à pergunta que vem depois deles.{file_injection}"
+
+
+@dataclass
+class BatchItem:
+    """Uma pergunta do lote e o que já chegou da resposta."""
+    question: str
+    parts: list = field(default_factory=list)
+    status: str = "queued"
+    model: str | None = None
+    error: Exception | None = None
+    stats: TurnStats = field(default_factory=TurnStats)
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def done(self):
+        return self.status in ("done", "error")
+
+
+class BatchRun:
+    """Execução de um lote: as perguntas vão sendo enviadas por até `concurrency` workers."""
+
+    def __init__(self, api_key, router, decision, template, context, questions, max_tokens,
+                 use_cache=True, concurrency=BATCH_CONCURRENCY):
+        self.api_key = api_key
+        self.router = router
+        self.decision = decision
+        self.template = template
+        self.context = context
+        self.max_tokens = max_tokens
+        self.use_cache = use_cache
+        self.items = [BatchItem(question) for question in questions]
+        self.concurrency = max(1, min(concurrency, len(self.items)))
+        self.started = None
+        self.finished = None
+        self._pending = iter(self.items)
+        self._lock = threading.Lock()
+        self._remaining = len(self.items)
+        self._all_done = threading.Event()
+
+    def messages(self, question):
+        return [self.template.message, {"role": "user", "content": f"{self.context}Pergunta: {question}"}]
+
+    def start(self):
+        self.started = time.perf_counter()
+        if not self.items:
+            self.finished = self.started
+            self._all_done.set()
+        for _ in range(self.concurrency):
+            _EXECUTOR.submit(self._work)
+        return self
+
+    def _next(self):
+        with self._lock:
+            return next(self._pending, None)
+
+    def _work(self):
+        while (item := self._next()) is not None:
+            try:
+                self._answer(item)
+            except Exception as error:
+                # Ex.: falha no cache de respostas; a pergunta falha, o lote continua
+                item.error = error
+                item.status = "error"
+            with self._lock:
+                self._remaining -= 1
+                if not self._remaining:
+                    self.finished = time.perf_counter()
+                    self._all_done.set()
+
+    def _answer(self, item):
+        item.status = "running"
+        started_at = time.perf_counter()
+        messages = self.messages(item.question)
+        response_cache = get_response_cache()
+        key = cache_key(self.decision.model, messages, self.max_tokens)
+        cached = response_cache.get(key) if self.use_cache else None
+        if cached:
+            item.parts.append(cached["content"])
+            item.model = self.decision.model
+            item.stats.total = item.stats.ttft = time.perf_counter() - started_at
+            item.stats.completion_tokens = cached["completion_tokens"] or 0
+            item.stats.cache_hit = True
+            item.status = "done"
+            record_turn(item.model, item.stats)
+            return
+        # Cada pergunta tem a sua decisão: o failover de uma não muda o modelo das outras
+        decision = replace(self.decision)
+        params = dict(messages=messages, temperature=0.7, max_tokens=self.max_tokens)
+
+        def start_stream(model, attempts, first_token_timeout):
+            request = stream_chat(self.api_key, max_attempts=attempts, model=model, **params)
+            request.wait_first_event(first_token_timeout)
+            return request
+
+        try:
+            request = self.router.run(decision, start_stream)
+            for delta in iter_groq_deltas(request.chunks(), item.stats):
+                if item.stats.ttft is None:
+                    item.stats.ttft = time.perf_counter() - started_at
+                item.stats.chunks += 1
+                item.parts.append(delta)
+        except Exception as error:
+            item.error = error
+            item.model = decision.model
+            item.stats.total = time.perf_counter() - started_at
+            item.status = "error"
+            record_turn(decision.model, None, outcome="error")
+            return
+        item.model = decision.model
+        item.stats.total = time.perf_counter() - started_at
+        if not item.stats.completion_tokens:
+            item.stats.completion_tokens = item.stats.chunks
+        self.router.record(decision.model, item.stats.ttft)
+        get_prefix_tracker().observe(decision.model, self.template, item.stats.prompt_tokens, item.stats.cached_tokens)
+        if decision.failed_over_from:
+            key = cache_key(decision.model, messages, self.max_tokens)
+        response_cache.put(key, item.text, item.stats.completion_tokens)
+        item.status = "done"
+        record_turn(decision.model, item.stats)
+
+    @property
+    def done(self):
+        return self._all_done.is_set()
+
+    def wait(self, timeout=None):
+        return self._all_done.wait(timeout)
+
+    @property
+    def wall_time(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def sequential_time(self):
+        """Tempo estimado se as perguntas fossem feitas uma depois da outra (soma das latências)."""
+        return sum(item.stats.total for item in self.items if item.done)
+
+    @property
+    def speedup(self):
+        return self.sequential_time / self.wall_time if self.done and self.wall_time > 0 else 0.0
+
+    def summary(self):
+        return {
+            "questions": len(self.items),
+            "errors": sum(item.status == "error" for item in self.items),
+            "cached": sum(item.stats.cache_hit for item in self.items),
+            "concurrency": self.concurrency,
+            "wall_time": round(self.wall_time, 3),
+            "sequential_time": round(self.sequential_time, 3),
+            "speedup": round(self.speedup, 2),
+        }
+
+
+def run_batch(api_key, router, template, focus, index, questions, max_tokens, use_cache=True,
+              concurrency=BATCH_CONCURRENCY):
+    """Escolhe o modelo para o lote e inicia as perguntas; devolve o BatchRun em andamento."""
+    context = shared_context(index, questions)
+    longest = max((count_tokens(question) for question in questions), default=0)
+    decision = router.route(template.tokens + count_tokens(context) + longest, max_tokens, focus)
+    run = BatchRun(api_key, router, decision, template, context, questions, max_tokens, use_cache, concurrency)
+    REGISTRY.inc("isa_batch_questions_total", len(questions))
+    return run.start()
+
+
+def render_batch(run, placeholders, interval=FLUSH_INTERVAL):
+    """Desenha o texto de cada pergunta (um placeholder por item) até o lote terminar.
+
+    `placeholders` é uma lista de (placeholder do texto, placeholder da legenda).
+    """
+    shown = [None] * len(run.items)
+    while True:
+        finished = run.wait(interval)
+        for position, (item, (body, caption)) in enumerate(zip(run.items, placeholders)):
+            state = (item.status, len(item.parts))
+            if state == shown[position]:
+                continue
+            shown[position] = state
+            if item.status == "error":
+                body.error(f"Não foi possível responder esta pergunta. Detalhes: {item.error}")
+            elif item.parts:
+                body.markdown(item.text if item.done else item.text + CURSOR)
+            if item.done:
+                caption.caption(describe_item(item))
+        if finished:
+            break
+    return run.summary()
+
+
+def describe_item(item):
+    """Legenda de uma pergunta: modelo e latência (ou só o modelo, se falhou)."""
+    if item.status == "error":
+        return f"`{item.model}` · falhou"
+    if item.stats.cache_hit:
+        return f"Do cache em {item.stats.total * 1000:.0f} ms"
+    return f"`{item.model}` · {item.stats.ttft or 0:.2f}s até o 1º token · {item.stats.total:.2f}s no total"
+
+
+def describe_summary(summary):
+    """Tempo total do lote comparado ao de fazer as perguntas uma a uma."""
+    if summary["errors"] == summary["questions"]:
+        return f"Nenhuma das {summary['questions']} perguntas foi respondida ({summary['wall_time']:.2f}s)"
+    if summary["cached"] == summary["questions"]:
+        return f"{summary['questions']} perguntas respondidas do cache em {summary['wall_time'] * 1000:.0f} ms"
+    return (
+        f"{summary['questions']} perguntas em {summary['wall_time']:.2f}s "
+        f"({summary['concurrency']} em paralelo) · uma a uma levariam ~{summary['sequential_time']:.2f}s "
+        f"· {summary['speedup']:.1f}× mais rápido"
+    )
+
+
+REGISTRY.describe("isa_batch_questions_total", "Perguntas enviadas no modo de várias perguntas sobre os arquivos.")
@@ -0,0 +1,121 @@
+"""Pool de clientes Groq compartilhado entre reruns e sessões do mesmo processo.
+
+Cada API Key ganha um único cliente (e um único pool de conexões HTTP), então as
+conexões keep-alive e as sessões TLS são reaproveitadas de um turno para o outro.
+A chave nunca é guardada em texto puro: o registro usa o hash SHA-256 dela.
+
+Um cliente que sai do pool (LRU ou `discard`) enquanto ainda atende uma requisição só
+é fechado quando ela termina.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from isa.backends import get_backend
+
+# Quantidade máxima de clientes (API Keys distintas) mantidos no processo
+MAX_CLIENTS = int(os.getenv("ISA_CLIENT_POOL_SIZE", "32"))
+
+
+def hash_api_key(api_key):
+    """Identificador estável (e não reversível) de uma API Key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class ClientPool:
+    """Registro LRU de clientes Groq, limitado a `max_size` entradas."""
+
+    def __init__(self, factory, closer=None, max_size=MAX_CLIENTS):
+        self.factory = factory
+        self.closer = closer or _close_quietly
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        # Requisições em andamento por cliente (id) e clientes já fora do pool esperando a última
+        self._leases = {}
+        self._retired = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key):
+        """Cliente da chave (criado se preciso); para uma requisição, use `lease`."""
+        with self._lock:
+            client, evicted = self._get(api_key)
+        self._close(evicted)
+        return client
+
+    @contextmanager
+    def lease(self, api_key):
+        """Cliente da chave, que não é fechado enquanto o bloco estiver em andamento."""
+        with self._lock:
+            client, evicted = self._get(api_key)
+            self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+        self._close(evicted)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                remaining = self._leases.pop(id(client)) - 1
+                if remaining:
+                    self._leases[id(client)] = remaining
+                close = not remaining and id(client) in self._retired
+                if close:
+                    self._retired.discard(id(client))
+            if close:
+                self.closer(client)
+
+    def _get(self, api_key):
+        """(cliente, clientes a fechar); chamado com o lock."""
+        key = hash_api_key(api_key)
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            self.hits += 1
+            return client, []
+        self.misses += 1
+        client = self._clients[key] = self.factory(api_key)
+        evicted = []
+        while len(self._clients) > self.max_size:
+            _, old = self._clients.popitem(last=False)
+            self.evictions += 1
+            evicted += self._retire(old)
+        return client, evicted
+
+    def _retire(self, client):
+        """Tira o cliente de circulação: fecha já ou quando a última requisição terminar."""
+        if id(client) in self._leases:
+            self._retired.add(id(client))
+            return []
+        return [client]
+
+    def _close(self, clients):
+        for client in clients:
+            self.closer(client)
+
+    def discard(self, api_key):
+        """Remove (e fecha) o cliente de uma chave, ex.: após erro de autenticação."""
+        with self._lock:
+            client = self._clients.pop(hash_api_key(api_key), None)
+            closing = self._retire(client) if client is not None else []
+        self._close(closing)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._clients)
+            retired = len(self._retired)
+        return {"size": size, "retired": retired, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def _close_quietly(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def new_async_client(api_key):
+    """Cliente assíncrono (usado pelo pipeline de requisições, que cuida das novas tentativas)."""
+    return get_backend().async_client(api_key)
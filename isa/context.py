@@ -0,0 +1,128 @@
+"""Janela de contexto com orçamento de tokens para as mensagens enviadas à API."""
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+try:  # Tokenizador real é opcional; sem ele usamos uma estimativa conservadora
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Janela de contexto (tokens) de cada modelo suportado
+MODEL_CONTEXT = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "openai/gpt-oss-20b": 131072,
+}
+DEFAULT_CONTEXT = 8192
+
+# Orçamento padrão de tokens do prompt (pode ser bem menor que a janela do modelo,
+# já que o limite de tokens por minuto da conta costuma chegar antes)
+DEFAULT_BUDGET = int(os.getenv("ISA_CONTEXT_BUDGET", "8192"))
+# Mínimo garantido para o prompt mesmo quando a resposta (max_tokens) ocupa o orçamento
+# inteiro: a pergunta e as mensagens mais recentes sempre têm espaço
+MIN_PROMPT_BUDGET = 2048
+
+# Tokens extras por mensagem (papel e delimitadores do template de chat)
+MESSAGE_OVERHEAD = 4
+# Caracteres por token na estimativa sem tokenizador (texto em português e código)
+CHARS_PER_TOKEN = 3.5
+
+
+# Contagens memoizadas pelo hash do texto (o cache não guarda cópias de textos grandes)
+TOKEN_CACHE_SIZE = 4096
+_TOKEN_CACHE = OrderedDict()
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def count_tokens(text):
+    """Conta (ou estima) os tokens de um texto. Memoizado: cada mensagem é contada uma vez."""
+    if _ENCODING is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _TOKEN_CACHE_LOCK:
+        count = _TOKEN_CACHE.get(key)
+        if count is not None:
+            _TOKEN_CACHE.move_to_end(key)
+            return count
+    count = len(_ENCODING.encode(text, disallowed_special=()))
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[key] = count
+        while len(_TOKEN_CACHE) > TOKEN_CACHE_SIZE:
+            _TOKEN_CACHE.popitem(last=False)
+    return count
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+@dataclass
+class ContextReport:
+    """O que foi enviado e o que ficou de fora da janela de contexto."""
+    budget: int
+    prompt_tokens: int = 0
+    kept_messages: int = 0
+    trimmed_messages: int = 0
+    trimmed_tokens: int = 0
+    over_budget: bool = False
+
+    @property
+    def history_dropped(self):
+        """Havia histórico e nenhuma mensagem dele coube."""
+        return self.trimmed_messages > 0 and self.kept_messages == 0
+
+
+def context_budget(model, max_tokens, budget=None):
+    """Tokens disponíveis para o prompt depois de reservar espaço para a resposta.
+
+    Nunca fica abaixo de MIN_PROMPT_BUDGET (a menos que a janela do modelo não comporte).
+    """
+    window = MODEL_CONTEXT.get(model, DEFAULT_CONTEXT)
+    budget = min(budget or DEFAULT_BUDGET, window)
+    return max(budget - max_tokens, min(MIN_PROMPT_BUDGET, window - max_tokens), 0)
+
+
+def build_context(system_prompt, history, latest_user_content, budget, summary_message=None):
+    """Monta as mensagens da API cabendo em `budget` tokens.
+
+    O prompt do sistema, o resumo da conversa (se houver) e a pergunta atual são
+    sempre mantidos; do histórico entram as mensagens mais recentes que couberem
+    (janela deslizante). Devolve (mensagens, ContextReport).
+    """
+    system_message = {"role": "system", "content": system_prompt}
+    latest_message = {"role": "user", "content": latest_user_content}
+    used = message_tokens(system_message) + message_tokens(latest_message)
+    if summary_message is not None:
+        used += message_tokens(summary_message)
+    report = ContextReport(budget=budget)
+
+    kept = []
+    for index in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[index])
+        if used + cost > budget:
+            break
+        kept.append(history[index])
+        used += cost
+    kept.reverse()
+    # Não começa a janela com uma resposta cuja pergunta ficou de fora
+    while kept and kept[0]["role"] == "assistant" and len(kept) < len(history):
+        used -= message_tokens(kept.pop(0))
+
+    trimmed = history[:len(history) - len(kept)]
+    report.kept_messages = len(kept)
+    report.trimmed_messages = len(trimmed)
+    report.trimmed_tokens = sum(message_tokens(m) for m in trimmed)
+    report.prompt_tokens = used
+    report.over_budget = used > budget
+
+    messages = [system_message]
+    if summary_message is not None:
+        messages.append(summary_message)
+    messages.extend({"role": m["role"], "content": m["content"]} for m in kept)
+    messages.append(latest_message)
+    return messages, report
@@ -0,0 +1,130 @@
+"""Índice de documentos por sessão: vários arquivos e arquivos .zip, com inclusão e remoção incrementais."""
+import zipfile
+from dataclasses import dataclass, field
+
+from isa.ingest import READ_BLOCK, memoryview_blocks, read_text
+from isa.retrieval import CorpusIndex, cached_document, content_hash, load_document
+
+# Extensões de texto aceitas (no uploader e dentro dos .zip)
+TEXT_EXTENSIONS = ("txt", "py", "md", "java", "js", "html", "css", "json", "ts", "sql", "yml", "yaml", "xml", "csv")
+UPLOAD_TYPES = list(TEXT_EXTENSIONS) + ["zip"]
+
+# Limites de segurança para .zip (arquivos enormes ou "zip bombs")
+MAX_MEMBER_BYTES = 2 * 1024 * 1024
+MAX_ARCHIVE_MEMBERS = 500
+MAX_ARCHIVE_BYTES = 20 * 1024 * 1024
+
+
+@dataclass
+class IngestReport:
+    """Resultado de uma sincronização com o uploader."""
+    added: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    rejected: list = field(default_factory=list)
+    # (nome, linhas omitidas) dos arquivos grandes demais para entrar inteiros
+    truncated: list = field(default_factory=list)
+    # (nome, codificação) dos arquivos que não estavam em UTF-8
+    converted: list = field(default_factory=list)
+    removed: int = 0
+
+
+def _is_text_member(name):
+    base = name.rsplit("/", 1)[-1]
+    if not base or base.startswith(".") or name.startswith("__MACOSX/"):
+        return False
+    return "." in base and base.rsplit(".", 1)[-1].lower() in TEXT_EXTENSIONS
+
+
+class SessionDocuments:
+    """Documentos carregados na sessão, sincronizados com o st.file_uploader."""
+
+    def __init__(self):
+        self.index = CorpusIndex()
+        # file_id do uploader -> hashes dos documentos que vieram dele
+        self.sources = {}
+        # (CRC32, tamanho) de membros de .zip já vistos -> hash, para pular sem descompactar
+        self._zip_members = {}
+
+    def sync(self, uploaded_files):
+        """Inclui os arquivos novos e remove os que saíram do uploader."""
+        report = IngestReport()
+        current = {f.file_id: f for f in uploaded_files or []}
+        for file_id in [i for i in self.sources if i not in current]:
+            for digest in self.sources.pop(file_id):
+                if not any(digest in digests for digests in self.sources.values()):
+                    self.index.remove(digest)
+                    report.removed += 1
+        for file_id, upload in current.items():
+            if file_id not in self.sources:
+                self.sources[file_id] = self._ingest(upload, report)
+        return report
+
+    def describe(self, limit=5):
+        """Nomes dos documentos em Markdown (abreviado quando há muitos)."""
+        names = [f"**{d.name}**" for d in self.index.documents.values()]
+        if len(names) > limit:
+            return ", ".join(names[:limit]) + f" e mais {len(names) - limit}"
+        return ", ".join(names)
+
+    def _ingest(self, upload, report):
+        if upload.name.lower().endswith(".zip"):
+            return self._ingest_zip(upload, report)
+        # Buffer do próprio upload (sem cópia); o texto é lido dele em blocos
+        data = upload.getbuffer()
+        digest = content_hash(data)
+        self._add(upload.name, digest, lambda: read_text(memoryview_blocks(data), upload.name), report)
+        return [digest]
+
+    def _add(self, name, digest, read, report):
+        if digest in self.index:
+            report.skipped.append(name)
+            return
+        document = cached_document(digest, name)
+        if document is None:
+            ingested = read()
+            if ingested.truncated:
+                report.truncated.append((name, ingested.omitted_lines))
+            if ingested.encoding not in ("utf-8", "utf-8-sig"):
+                report.converted.append((name, ingested.encoding))
+            document = load_document(ingested.text, name, digest)
+        self.index.add(document)
+        report.added.append(name)
+
+    def _ingest_zip(self, upload, report):
+        digests = []
+        total = 0
+        try:
+            archive = zipfile.ZipFile(upload)
+        except zipfile.BadZipFile:
+            report.rejected.append((upload.name, "arquivo .zip inválido"))
+            return digests
+        with archive:
+            members = [i for i in archive.infolist() if not i.is_dir() and _is_text_member(i.filename)]
+            if len(members) > MAX_ARCHIVE_MEMBERS:
+                report.rejected.append((upload.name, f"só os primeiros {MAX_ARCHIVE_MEMBERS} arquivos foram lidos"))
+            for info in members[:MAX_ARCHIVE_MEMBERS]:
+                name = f"{upload.name}/{info.filename}"
+                if info.file_size > MAX_MEMBER_BYTES:
+                    report.rejected.append((name, "arquivo grande demais"))
+                    continue
+                total += info.file_size
+                if total > MAX_ARCHIVE_BYTES:
+                    report.rejected.append((upload.name, "conteúdo descompactado grande demais"))
+                    break
+                known = self._zip_members.get((info.CRC, info.file_size))
+                if known in self.index:
+                    report.skipped.append(name)
+                    digests.append(known)
+                    continue
+                try:
+                    with archive.open(info) as stream:
+                        # O limite de leitura protege contra tamanhos falsos no cabeçalho do .zip
+                        blocks = iter(lambda: stream.read(READ_BLOCK), b"")
+                        ingested = read_text(blocks, name, max_bytes=MAX_MEMBER_BYTES)
+                except (zipfile.BadZipFile, RuntimeError) as e:
+                    report.rejected.append((name, str(e)))
+                    continue
+                self._zip_members[(info.CRC, info.file_size)] = ingested.digest
+                self._add(name, ingested.digest, lambda: ingested, report)
+                digests.append(ingested.digest)
+        return digests
@@ -0,0 +1,34 @@
+"""Renderização do histórico do chat em janela (só as mensagens mais recentes)."""
+import streamlit as st
+
+# Mensagens exibidas de início e a cada clique em "carregar anteriores"
+HISTORY_PAGE = 20
+
+
+def render_message(message):
+    """Desenha uma mensagem do chat em Markdown, igual à resposta durante o streaming.
+
+    Os blocos de código ficam por conta do próprio st.markdown (CommonMark), que trata
+    cercas aninhadas, de quatro crases e com '~~~'.
+    """
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+
+def _show_more():
+    st.session_state.history_window += HISTORY_PAGE
+
+
+def render_history(messages):
+    """Desenha só a janela mais recente do histórico, com paginação para trás."""
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = HISTORY_PAGE
+    hidden = max(len(messages) - st.session_state.history_window, 0)
+    if hidden:
+        st.button(
+            f"⬆️ Carregar mensagens anteriores ({hidden} ocultas)",
+            key="history_load_more",
+            on_click=_show_more,
+        )
+    for message in messages[hidden:]:
+        render_message(message)
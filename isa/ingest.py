@@ -0,0 +1,255 @@
+"""Leitura de arquivos de texto em streaming: detecção de codificação e limite de tamanho.
+
+Os bytes são lidos em blocos (fatias de memoryview, sem cópias) e decodificados de
+forma incremental. O texto guardado nunca passa de MAX_DOCUMENT_TOKENS: num arquivo
+maior, ficam o começo, o fim e, no meio, a estrutura do código que ficou de fora
+(assinaturas de funções e classes com o número da linha). Assim a memória por
+upload não cresce com o tamanho do arquivo.
+"""
+import codecs
+import hashlib
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from isa.context import CHARS_PER_TOKEN
+from isa.retrieval import boundary_pattern
+
+# Tamanho de cada leitura
+READ_BLOCK = 64 * 1024
+# Bytes usados para detectar a codificação
+DETECT_SAMPLE_BYTES = 64 * 1024
+# Bytes lidos de um arquivo; o que passar disso é ignorado (o fim mostrado é o do trecho lido)
+MAX_READ_BYTES = int(os.getenv("ISA_MAX_READ_BYTES", str(32 * 1024 * 1024)))
+# Tokens de texto guardados por arquivo (estimados pelos caracteres, sem tokenizar o arquivo)
+MAX_DOCUMENT_TOKENS = int(os.getenv("ISA_MAX_DOCUMENT_TOKENS", "40000"))
+# Codificação legada mais comum nos arquivos dos usuários (Windows em português);
+# preferida quando o texto decodificado parece de uma língua da Europa Ocidental, já
+# que o detector confunde as cp125x (ex.: "ação" lido como cp1250 vira "açăo")
+LEGACY_ENCODING = "cp1252"
+# Caracteres fora do ASCII esperados nesses textos (acentos, cedilha e pontuação do Windows)
+WESTERN_CHARS = frozenset("áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑºª°§€“”‘’–—…•«»¿¡·")
+# Parte mínima dos caracteres fora do ASCII que precisa ser desse conjunto e parte
+# máxima das letras que pode estar fora do ASCII (cirílico ou grego lidos como cp1252
+# viram quase só letras acentuadas)
+MIN_WESTERN_SHARE = 0.9
+MAX_EXTENDED_LETTERS = 0.5
+# Divisão do espaço de um arquivo truncado: começo, estrutura do meio e fim
+HEAD_SHARE = 0.6
+OUTLINE_SHARE = 0.15
+OUTLINE_LINE_CHARS = 160
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_LINE_RE = re.compile(r"[^\n]*\n")
+
+
+@dataclass
+class IngestedText:
+    """Texto (possivelmente truncado) de um arquivo e como ele foi lido."""
+    text: str
+    digest: str
+    encoding: str
+    total_bytes: int
+    truncated: bool = False
+    omitted_lines: int = 0
+
+
+def memoryview_blocks(data, size=READ_BLOCK):
+    """Fatias de um buffer (bytes/memoryview) sem copiar o conteúdo."""
+    view = memoryview(data)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+
+@lru_cache(maxsize=1)
+def _charset_normalizer():
+    """from_bytes do charset_normalizer, importado só no primeiro arquivo que não é UTF-8 nem cp1252.
+
+    A detecção de codificação é opcional; sem ela, o que não é UTF-8 vira cp1252.
+    """
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        return None
+    return from_bytes
+
+
+def looks_western(text):
+    """O texto (decodificado como cp1252) parece português ou outra língua da Europa Ocidental?"""
+    extended = [c for c in text if ord(c) > 127]
+    if not extended:
+        return True
+    if sum(c in WESTERN_CHARS for c in extended) < MIN_WESTERN_SHARE * len(extended):
+        return False
+    letters = sum(c.isalpha() for c in text)
+    return sum(c.isalpha() for c in extended) <= MAX_EXTENDED_LETTERS * letters
+
+
+def detect_encoding(sample):
+    """Codificação pelo BOM; senão UTF-8 se a amostra for válida; senão a mais provável."""
+    for bom, encoding in _BOMS:
+        if bytes(sample[:len(bom)]) == bom:
+            return encoding
+    try:
+        # final=False: um caractere cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        legacy = bytes(sample).decode(LEGACY_ENCODING)
+    except UnicodeDecodeError:
+        legacy = None
+    if legacy is not None and looks_western(legacy):
+        return LEGACY_ENCODING
+    from_bytes = _charset_normalizer()
+    if from_bytes is None:
+        return LEGACY_ENCODING
+    best = from_bytes(bytes(sample)).best()
+    return best.encoding if best is not None else LEGACY_ENCODING
+
+
+class _BoundedText:
+    """Acumula o texto decodificado guardando no máximo `max_chars` caracteres."""
+
+    def __init__(self, max_chars, filename):
+        self.max_chars = max_chars
+        self.head_chars = int(max_chars * HEAD_SHARE)
+        self.outline_chars = int(max_chars * OUTLINE_SHARE)
+        self.tail_chars = max_chars - self.head_chars - self.outline_chars
+        self.boundary = boundary_pattern(filename)
+        self.parts = []
+        self.size = 0
+        self.head = None
+        self.head_lines = 0
+        self.pending = ""
+        self.tail = deque()
+        self.tail_size = 0
+        self.line_count = 0
+        self.outline = []
+        self.outline_size = 0
+        # Só uma a cada `outline_stride` definições entra na estrutura; dobra quando ela enche,
+        # para cobrir o trecho omitido inteiro em vez de só o começo dele
+        self.outline_stride = 1
+        self.definitions = 0
+        self.omitted = 0
+
+    def feed(self, text):
+        if not text:
+            return
+        if self.head is None:
+            self.parts.append(text)
+            self.size += len(text)
+            if self.size <= self.max_chars:
+                return
+            # Passou do limite: separa o começo e passa o resto pelo filtro de linhas
+            everything = "".join(self.parts)
+            self.parts = None
+            cut = everything.rfind("\n", 0, self.head_chars) + 1 or self.head_chars
+            self.head = everything[:cut]
+            self.head_lines = self.line_count = self.head.count("\n")
+            text = everything[cut:]
+        self._feed_lines(self.pending + text)
+
+    def _feed_lines(self, text):
+        position = 0
+        for match in _LINE_RE.finditer(text):
+            self._push_line(match.group())
+            position = match.end()
+        self.pending = text[position:]
+        if len(self.pending) > self.tail_chars:
+            # Linha gigante (ex.: JSON minificado): guarda só o fim dela
+            self.pending = self.pending[-self.tail_chars:]
+
+    def _push_line(self, line):
+        self.line_count += 1
+        self.tail.append((self.line_count, line))
+        self.tail_size += len(line)
+        while self.tail_size > self.tail_chars and len(self.tail) > 1:
+            number, dropped = self.tail.popleft()
+            self.tail_size -= len(dropped)
+            self.omitted += 1
+            if self.boundary is not None and self.boundary.match(dropped):
+                self._add_definition(number, dropped)
+
+    def _add_definition(self, number, line):
+        self.definitions += 1
+        if (self.definitions - 1) % self.outline_stride:
+            return
+        entry = f"{number}: {line.strip()[:OUTLINE_LINE_CHARS]}\n"
+        self.outline.append(entry)
+        self.outline_size += len(entry)
+        if self.outline_size > self.outline_chars:
+            self.outline = self.outline[::2]
+            self.outline_size = sum(map(len, self.outline))
+            self.outline_stride *= 2
+
+    def result(self):
+        """(texto final, truncado?, linhas omitidas)."""
+        if self.head is None:
+            return "".join(self.parts), False, 0
+        if self.pending:
+            self._push_line(self.pending)
+            self.pending = ""
+        first = self.head_lines + 1
+        last = self.head_lines + self.omitted
+        marker = f"\n[... {self.omitted} linhas omitidas ({first}-{last} de {self.line_count}) ...]\n"
+        if self.outline:
+            marker += "[Estrutura do trecho omitido]\n" + "".join(self.outline)
+        marker += "[... fim do trecho omitido ...]\n"
+        text = self.head + marker + "".join(line for _, line in self.tail)
+        return text, True, self.omitted
+
+
+def read_text(blocks, filename, max_bytes=MAX_READ_BYTES, max_tokens=MAX_DOCUMENT_TOKENS):
+    """Lê os blocos (bytes/memoryview), calcula o hash e devolve o IngestedText.
+
+    Nada além do texto final (limitado a `max_tokens`) e de um bloco por vez fica na memória.
+    """
+    hasher = hashlib.sha256()
+    text = _BoundedText(int(max_tokens * CHARS_PER_TOKEN), filename)
+    sample = bytearray()
+    decoder = None
+    encoding = None
+    total = 0
+    stopped = False
+    for block in blocks:
+        if total + len(block) > max_bytes:
+            block = block[:max_bytes - total]
+            stopped = True
+        total += len(block)
+        hasher.update(block)
+        if decoder is None:
+            sample += block
+            if len(sample) < DETECT_SAMPLE_BYTES and not stopped:
+                continue
+            encoding = detect_encoding(sample)
+            decoder = codecs.getincrementaldecoder(encoding)("replace")
+            block, sample = sample, None
+        text.feed(decoder.decode(block))
+        if stopped:
+            break
+    if decoder is None:
+        encoding = detect_encoding(sample)
+        decoder = codecs.getincrementaldecoder(encoding)("replace")
+        text.feed(decoder.decode(sample))
+    text.feed(decoder.decode(b"", final=True))
+    content, truncated, omitted = text.result()
+    if stopped:
+        content += f"\n[... leitura interrompida após {total / (1024 * 1024):.1f} MB ...]\n"
+    return IngestedText(
+        text=content,
+        digest=hasher.hexdigest(),
+        encoding=encoding,
+        total_bytes=total,
+        truncated=truncated or stopped,
+        omitted_lines=omitted,
+    )
@@ -0,0 +1,240 @@
+"""Métricas do processo (contadores e histogramas) e os tempos de cada etapa do turno.
+
+O registro é leve (dicionários protegidos por um lock) e é exportado de duas formas
+opcionais, ligadas por variável de ambiente:
+
+    ISA_METRICS_PORT=9108        endpoint HTTP /metrics no formato texto do Prometheus
+    ISA_METRICS_FILE=metrics.json  arquivo JSON regravado a cada ISA_METRICS_INTERVAL segundos
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("ISA_METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("ISA_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.getenv("ISA_METRICS_INTERVAL", "15"))
+
+# Limites (segundos) dos baldes dos histogramas de tempo
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Registry:
+    """Contadores e histogramas por nome e rótulos, seguros entre threads (sessões)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(TIME_BUCKETS), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(TIME_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def register_collector(self, name, collect):
+        """`collect()` devolve {nome_da_métrica: valor} lidos na hora da exportação (gauges)."""
+        self._collectors[name] = collect
+
+    def _gauges(self):
+        gauges = {}
+        for collect in list(self._collectors.values()):
+            try:
+                gauges.update(collect())
+            except Exception:
+                pass
+        return gauges
+
+    def snapshot(self):
+        """Cópia das métricas em estruturas JSON."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h["count"],
+                    "sum": round(h["sum"], 6),
+                    "buckets": dict(zip(map(str, TIME_BUCKETS), h["buckets"])),
+                }
+                for (name, labels), h in self._histograms.items()
+            ]
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms, "gauges": self._gauges()}
+
+    def render_prometheus(self):
+        """Métricas no formato texto de exposição do Prometheus."""
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h["buckets"]), h["sum"], h["count"]) for key, h in self._histograms.items()
+            )
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels_text(labels)} {value}")
+        for (name, labels), buckets, total, count in histograms:
+            header(name, "histogram")
+            for bound, bucket_count in zip(TIME_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{_labels_text(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels_text(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels_text(labels)} {count}")
+        for name, value in sorted(self._gauges().items()):
+            header(name, "gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.describe("isa_stage_seconds", "Tempo de cada etapa do processamento de um turno.")
+REGISTRY.describe("isa_llm_ttft_seconds", "Tempo até o primeiro token da resposta.")
+REGISTRY.describe("isa_llm_latency_seconds", "Tempo total da resposta do modelo.")
+REGISTRY.describe("isa_llm_tokens_total", "Tokens de prompt e de resposta.")
+REGISTRY.describe("isa_turns_total", "Turnos de chat por resultado.")
+REGISTRY.describe("isa_context_trimmed_messages_total", "Mensagens do histórico que ficaram fora do orçamento de contexto.")
+
+
+class TurnTimings:
+    """Tempo (em segundos) gasto em cada etapa durante uma execução do script."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_ms(self):
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+
+
+@contextmanager
+def stage_timer(stage, timings=None):
+    """Mede o bloco: vai para o histograma do processo e, se dado, para `timings`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe("isa_stage_seconds", elapsed, stage=stage)
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+
+def record_turn(model, stats, outcome="ok"):
+    """Registra as métricas da chamada ao modelo a partir das TurnStats do turno."""
+    if outcome == "ok" and stats.cache_hit:
+        outcome = "cache_hit"
+    REGISTRY.inc("isa_turns_total", outcome=outcome)
+    if outcome != "ok":
+        return
+    if stats.ttft is not None:
+        REGISTRY.observe("isa_llm_ttft_seconds", stats.ttft, model=model)
+    REGISTRY.observe("isa_llm_latency_seconds", stats.total, model=model)
+    if stats.prompt_tokens:
+        REGISTRY.inc("isa_llm_tokens_total", stats.prompt_tokens, model=model, kind="prompt")
+    if stats.completion_tokens:
+        REGISTRY.inc("isa_llm_tokens_total", stats.completion_tokens, model=model, kind="completion")
+    if stats.cached_tokens:
+        REGISTRY.inc("isa_llm_tokens_total", stats.cached_tokens, model=model, kind="cached")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = REGISTRY.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(REGISTRY.snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def dump_json(path):
+    """Grava o snapshot de forma atômica (quem lê nunca vê um arquivo pela metade)."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(temporary, path)
+
+
+def _dump_forever(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            dump_json(path)
+        except OSError:
+            pass
+
+
+_EXPORTERS_STARTED = False
+_EXPORTERS_LOCK = threading.Lock()
+
+
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_INTERVAL):
+    """Sobe (uma vez por processo) o endpoint HTTP e/ou o dump periódico configurados."""
+    global _EXPORTERS_STARTED
+    with _EXPORTERS_LOCK:
+        if _EXPORTERS_STARTED:
+            return
+        _EXPORTERS_STARTED = True
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError:
+            # Porta ocupada (ex.: outro processo do app): segue sem o endpoint
+            server = None
+        if server is not None:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="isa-metrics-http", daemon=True).start()
+    if path:
+        threading.Thread(target=_dump_forever, args=(path, interval), name="isa-metrics-dump", daemon=True).start()
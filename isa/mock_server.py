@@ -0,0 +1,207 @@
+"""Servidor local compatível com a API de chat da Groq/OpenAI, para testes sem rede.
+
+Simula latência até o primeiro token, taxa de geração (tokens/s), streaming (SSE)
+e erros (429/5xx com retry-after). Uso:
+
+    python -m isa.mock_server --port 8765 --latency 0.3 --tokens-per-sec 300 --error-rate 0.05
+    ISA_LLM_BACKEND=local streamlit run Isa_assistente.py
+
+Atende POST /openai/v1/chat/completions (caminho do SDK da Groq) e /v1/chat/completions.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+MODELS_PATHS = ("/openai/v1/models", "/v1/models")
+
+_WORDS = (
+    "a ISA AI analisou sua pergunta e preparou uma resposta clara com exemplos "
+    "práticos passo a passo código explicação resumo tópicos importantes dados "
+    "função variável teste desempenho memória latência servidor cliente modelo"
+).split()
+
+
+@dataclass
+class MockConfig:
+    """Comportamento simulado do servidor (pode ser alterado com ele rodando)."""
+    latency: float = 0.2
+    tokens_per_sec: float = 400.0
+    reply_tokens: int = 120
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: float = 1.0
+
+
+def reply_words(messages, count):
+    """Resposta determinística para a mesma conversa (útil para o cache de respostas)."""
+    seed = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    rng = random.Random(seed)
+    return [rng.choice(_WORDS) for _ in range(count)]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "IsaMock/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in MODELS_PATHS:
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path not in CHAT_PATHS:
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        self.server.requests += 1
+        config = self.config
+        time.sleep(config.latency)
+        if config.error_rate and random.random() < config.error_rate:
+            self.server.errors += 1
+            self._send_json(
+                config.error_status,
+                {"error": {"message": "erro simulado", "type": "mock_error"}},
+                {"retry-after": f"{config.retry_after:g}"},
+            )
+            return
+        messages = request.get("messages", [])
+        count = min(config.reply_tokens, request.get("max_tokens") or config.reply_tokens)
+        words = reply_words(messages, count)
+        usage = {
+            "prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in messages),
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "mock")
+        if request.get("stream"):
+            try:
+                self._stream(completion_id, model, words, usage)
+            except (BrokenPipeError, ConnectionResetError):
+                # O cliente desistiu no meio (ex.: failover por lentidão do roteador)
+                self.close_connection = True
+        else:
+            time.sleep(len(words) / config.tokens_per_sec)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    def _stream(self, completion_id, model, words, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        created = int(time.time())
+        interval = 1 / self.config.tokens_per_sec
+
+        def event(delta, finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for index, word in enumerate(words):
+            event({"content": word if index == 0 else " " + word})
+            time.sleep(interval)
+        event({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}, "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None):
+        super().__init__(address, MockHandler)
+        self.config = config or MockConfig()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_server(host="127.0.0.1", port=0, **config):
+    """Sobe o servidor numa thread de fundo (porta 0 = porta livre) e o devolve."""
+    server = MockServer((host, port), MockConfig(**config))
+    threading.Thread(target=server.serve_forever, name="isa-mock-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de chat da Groq.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="segundos até o primeiro token")
+    parser.add_argument("--tokens-per-sec", type=float, default=MockConfig.tokens_per_sec)
+    parser.add_argument("--reply-tokens", type=int, default=MockConfig.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate, help="fração de respostas com erro")
+    parser.add_argument("--error-status", type=int, default=MockConfig.error_status)
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after)
+    args = parser.parse_args()
+    config = MockConfig(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+    )
+    server = MockServer((args.host, args.port), config)
+    print(f"Servidor mock em {server.base_url} (Ctrl+C para sair)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
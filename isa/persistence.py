@@ -0,0 +1,219 @@
+"""Persistência do histórico do chat: ID opaco na URL (padrão) ou a conversa inteira na URL.
+
+Com ISA_HISTORY_STORAGE=store (padrão), a conversa fica no armazenamento do servidor
+(isa/session_store.py) e a URL carrega só o ID dela (parâmetro 'hid').
+
+Com ISA_HISTORY_STORAGE=url, a URL (parâmetro 'h') leva um envelope binário em base64 url-safe
+    [versão: 1 byte][codec: 1 byte][mensagens em JSON Lines, comprimidas em stream]
+Linhas {"summary": ..., "covered": n} guardam o resumo contínuo da conversa; vale a última.
+O compressor é mantido entre os turnos, então cada salvamento comprime apenas as
+mensagens novas. Quando o envelope passa de URL_MAX_BYTES, o histórico migra para o
+armazenamento do servidor e a URL passa a carregar só o ID. Links antigos com 'h'
+continuam abrindo nos dois modos.
+"""
+import base64
+import json
+import os
+import secrets
+import sqlite3
+import zlib
+
+from isa.session_store import get_session_store
+from isa.summarizer import ConversationSummary
+
+try:  # zstd é opcional; sem ele usamos zlib
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ENVELOPE_VERSION = 1
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+URL_PARAM = "h"
+ID_PARAM = "hid"
+
+# Tamanho máximo do envelope (antes do base64) que ainda vai na URL.
+# ~6 KB viram ~8 KB de base64, abaixo do limite usual de navegadores e proxies.
+URL_MAX_BYTES = int(os.getenv("ISA_URL_HISTORY_MAX_BYTES", "6144"))
+
+# "store": só o ID na URL; "url": conversa na URL enquanto couber
+STORAGE_MODE = os.getenv("ISA_HISTORY_STORAGE", "store")
+
+
+# --- Compressão em stream ---
+
+class _StreamCompressor:
+    """Compressor incremental: cada `feed` devolve só os bytes novos do stream."""
+
+    def __init__(self, codec):
+        self.codec = codec
+        if codec == CODEC_ZSTD:
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._obj = zlib.compressobj(level=9)
+
+    def feed(self, data):
+        if self.codec == CODEC_ZSTD:
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _decompress(codec, payload):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Histórico comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj().decompress(payload)
+    raise ValueError(f"Codec de histórico desconhecido: {codec}")
+
+
+def _encode_messages(messages):
+    """Serializa mensagens como JSON Lines (uma mensagem por linha)."""
+    return "".join(
+        json.dumps({"role": m["role"], "content": m["content"]}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for m in messages
+    ).encode("utf-8")
+
+
+def _encode_summary(summary):
+    record = {"summary": summary.text, "covered": summary.covered}
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _decode_records(data):
+    """Separa as mensagens do último resumo gravado no stream."""
+    messages, summary = [], None
+    for line in data.decode("utf-8").splitlines():
+        if not line:
+            continue
+        record = json.loads(line)
+        if "summary" in record:
+            summary = {"text": record["summary"], "covered": record["covered"]}
+        else:
+            messages.append(record)
+    return messages, summary
+
+
+def decode_url_history(value):
+    """Decodifica o parâmetro 'h' (envelope novo ou o base64/JSON antigo) em (mensagens, resumo)."""
+    padded = value + "=" * (-len(value) % 4)
+    raw = base64.urlsafe_b64decode(padded)
+    if len(raw) >= 2 and raw[0] == ENVELOPE_VERSION and raw[1] in (CODEC_ZLIB, CODEC_ZSTD):
+        return _decode_records(_decompress(raw[1], raw[2:]))
+    # Formato legado: base64 padrão de uma lista JSON
+    return json.loads(base64.b64decode(value).decode("utf-8")), None
+
+
+# --- Controlador por sessão ---
+
+class HistoryPersistence:
+    """Mantém o estado incremental de salvamento de uma sessão (guardado em st.session_state)."""
+
+    def __init__(self, store=None, storage=STORAGE_MODE):
+        self.store = store or get_session_store()
+        self.storage = storage
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self._reset_state()
+
+    def _reset_state(self):
+        self.saved_count = 0
+        self.summary = None
+        self.saved_summary_covered = 0
+        self.conversation_id = None
+        self._compressor = _StreamCompressor(self.codec)
+        self._payload = bytearray([ENVELOPE_VERSION, self.codec])
+
+    @property
+    def mode(self):
+        return "store" if self.conversation_id else "url"
+
+    def load(self, query_params):
+        """Carrega o histórico indicado pela URL e prepara o estado incremental."""
+        messages = []
+        try:
+            if ID_PARAM in query_params:
+                self.conversation_id = query_params[ID_PARAM]
+                # Em memória (reconexão) não há nada a decodificar; senão vem do SQLite
+                messages, self.summary = self.store.load(self.conversation_id)
+            elif URL_PARAM in query_params:
+                messages, self.summary = decode_url_history(query_params[URL_PARAM])
+                if self.storage == "store" and messages:
+                    # Link antigo: passa a conversa para o servidor e encurta a URL
+                    self._move_to_store(messages, query_params, self.summary)
+                else:
+                    # O stream é refeito com tudo o que veio do link, inclusive o resumo
+                    # (que não é regravado enquanto não avançar)
+                    chunk = _encode_messages(messages)
+                    if self.summary:
+                        chunk += _encode_summary(ConversationSummary(**self.summary))
+                    self._payload += self._compressor.feed(chunk)
+        except Exception:
+            self._reset_state()
+            return []
+        self.saved_count = len(messages)
+        if self.summary:
+            self.saved_summary_covered = self.summary["covered"]
+        return messages
+
+    def save(self, messages, query_params, summary=None):
+        """Persiste apenas as mensagens (e o resumo) adicionados desde o último salvamento."""
+        if len(messages) < self.saved_count:
+            # O histórico foi reduzido (ex.: limpeza): recomeça do zero
+            self.reset(query_params)
+        new_messages = messages[self.saved_count:]
+        new_summary = summary if summary and summary.covered > self.saved_summary_covered else None
+        if not new_messages and not new_summary:
+            return
+        if self.conversation_id is None and self.storage == "store":
+            self.conversation_id = secrets.token_urlsafe(12)
+            query_params[ID_PARAM] = self.conversation_id
+
+        if self.conversation_id is None:
+            chunk = _encode_messages(new_messages)
+            if new_summary:
+                chunk += _encode_summary(new_summary)
+            self._payload += self._compressor.feed(chunk)
+            if len(self._payload) > URL_MAX_BYTES and self._move_to_store(messages, query_params, summary):
+                self.saved_count = len(messages)
+                return
+            query_params[URL_PARAM] = base64.urlsafe_b64encode(bytes(self._payload)).decode("ascii").rstrip("=")
+        else:
+            # Só a memória é atualizada aqui; o SQLite é gravado em lote em segundo plano
+            if new_messages:
+                self.store.append(self.conversation_id, self.saved_count, new_messages)
+            if new_summary:
+                self.store.save_summary(self.conversation_id, new_summary)
+        self.saved_count = len(messages)
+        if new_summary:
+            self.saved_summary_covered = new_summary.covered
+
+    def _move_to_store(self, messages, query_params, summary=None):
+        """Move o histórico da URL (uma única vez) para o armazenamento do servidor."""
+        if isinstance(summary, dict):
+            summary = ConversationSummary(**summary)
+        conversation_id = secrets.token_urlsafe(12)
+        try:
+            self.store.append(conversation_id, 0, messages)
+            if summary and summary.covered:
+                self.store.save_summary(conversation_id, summary)
+                self.saved_summary_covered = summary.covered
+        except (OSError, sqlite3.Error):
+            # Sem armazenamento disponível: continua usando a URL
+            return False
+        self.conversation_id = conversation_id
+        self._payload = bytearray()
+        if URL_PARAM in query_params:
+            del query_params[URL_PARAM]
+        query_params[ID_PARAM] = conversation_id
+        return True
+
+    def reset(self, query_params):
+        """Esquece o histórico salvo (URL e armazenamento do servidor)."""
+        if self.conversation_id:
+            self.store.delete(self.conversation_id)
+        for param in (URL_PARAM, ID_PARAM):
+            if param in query_params:
+                del query_params[param]
+        self._reset_state()
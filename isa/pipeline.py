@@ -0,0 +1,477 @@
+"""Pipeline assíncrono das chamadas à Groq: prazos, novas tentativas, limite de taxa e circuit breaker.
+
+Todas as requisições do processo rodam num único event loop em uma thread de fundo.
+Assim os limitadores (um token bucket por API Key, como o limite da conta na Groq) e
+os circuit breakers (um por modelo e chave) são compartilhados por todas as sessões sem precisar de locks, e os clientes assíncronos (com seus pools de conexão)
+ficam sempre presos ao mesmo loop. A thread do Streamlit só consome os eventos
+(chunks, fim ou erro) gravados pela requisição.
+
+Pedidos idênticos em andamento (mesma chave da API, modelo, mensagens e parâmetros,
+vindos de qualquer sessão) são agrupados: só o primeiro vai à API e os demais acompanham a
+mesma resposta, em streaming ou completa. As chamadas à API (e o consumo do limite
+de taxa) crescem com o número de perguntas distintas de cada chave, não com o de
+sessões usando a mesma chave.
+"""
+import asyncio
+import email.utils
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from isa.client_pool import ClientPool, hash_api_key, new_async_client
+
+# Prazo total de uma requisição (incluindo novas tentativas e o streaming)
+REQUEST_DEADLINE = float(os.getenv("ISA_REQUEST_DEADLINE", "90"))
+# Tentativas por requisição (1 = sem novas tentativas)
+MAX_ATTEMPTS = int(os.getenv("ISA_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+# Limite de requisições por segundo de cada API Key e rajada permitida
+RATE_LIMIT_RPS = float(os.getenv("ISA_RATE_LIMIT_RPS", "0.5"))
+RATE_LIMIT_BURST = int(os.getenv("ISA_RATE_LIMIT_BURST", "5"))
+# Limitadores e circuit breakers mantidos (o menos usado sai e recomeça do zero se voltar)
+MAX_BUCKETS = 1024
+MAX_BREAKERS = 1024
+# Tempo máximo que um pedido espera na fila (limitador ou circuito aberto) antes de falhar
+QUEUE_MAX_WAIT = float(os.getenv("ISA_QUEUE_MAX_WAIT", "15"))
+# Falhas seguidas que abrem o circuito e por quanto tempo ele fica aberto
+BREAKER_THRESHOLD = int(os.getenv("ISA_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ISA_BREAKER_COOLDOWN", "30"))
+
+
+class ServiceBusyError(Exception):
+    """A requisição não pôde ser enviada (fila cheia demais ou circuito aberto)."""
+
+
+class CircuitOpenError(ServiceBusyError):
+    """O circuito do modelo está aberto para esta chave (outro modelo pode atender)."""
+
+
+class DeadlineExceededError(Exception):
+    """O prazo total da requisição acabou (mesmo contando as novas tentativas)."""
+
+
+class FirstTokenTimeoutError(Exception):
+    """O primeiro chunk não chegou no tempo dado (o roteador passa para o próximo modelo)."""
+
+
+class TokenBucket:
+    """Limitador de taxa de uma API Key; usado só dentro do event loop do pipeline."""
+
+    def __init__(self, rate=RATE_LIMIT_RPS, capacity=RATE_LIMIT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, max_wait):
+        """Consome uma ficha, esperando até `max_wait` segundos pela próxima."""
+        self._refill()
+        # A ficha é reservada já (o saldo pode ficar negativo): quem chega depois espera mais
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > max_wait:
+            self.tokens += 1
+            raise ServiceBusyError("Muitas requisições no momento. Tente novamente em alguns segundos.")
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Abre após falhas seguidas e libera uma requisição de teste depois do cooldown."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    async def allow(self, max_wait):
+        """Espera o circuito permitir a requisição (ou falha se demoraria demais)."""
+        while True:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.probing:
+                self.probing = True
+                return
+            remaining = self.cooldown - (time.monotonic() - self.opened_at) if state == "open" else 1.0
+            if remaining > max_wait:
+                raise CircuitOpenError("A ISA AI está com instabilidade na API. Tente novamente em instantes.")
+            await asyncio.sleep(max(remaining, 0.05))
+            max_wait -= max(remaining, 0.05)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_neutral(self):
+        """Resposta que não diz nada sobre a saúde do modelo (ex.: 429 ou chave inválida)."""
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+def overload_errors():
+    """Erros de sobrecarga/prazo da API (o SDK da Groq só é importado aqui, quando necessário)."""
+    import groq
+
+    return (groq.RateLimitError, groq.InternalServerError, DeadlineExceededError)
+
+
+def is_retryable(error):
+    import groq
+
+    if isinstance(error, (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code >= 500
+
+
+def is_model_failure(error):
+    """Erro que indica instabilidade do modelo/API (5xx, conexão, prazo).
+
+    Limite da conta (429) e erros do pedido (chave inválida, 4xx) não contam para o
+    circuit breaker: dizem respeito a uma chave, não ao modelo.
+    """
+    import groq
+
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error):
+    """Segundos pedidos pelo servidor no cabeçalho retry-after (ou None)."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if "retry-after-ms" in headers:
+        try:
+            seconds = float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            seconds = None
+        if seconds is not None and math.isfinite(seconds):
+            return max(seconds, 0.0)
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        # Data HTTP; um valor inválido vale como ausente (fica o backoff normal)
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = parsed.timestamp() - time.time()
+    return max(seconds, 0.0) if math.isfinite(seconds) else None
+
+
+def backoff_delay(attempt, error):
+    """Backoff exponencial com jitter total, respeitando o retry-after quando houver."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    server_delay = retry_after(error)
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+    return delay
+
+
+def request_key(params):
+    """Chave de um pedido: modelo, mensagens (incluindo o prompt do sistema), max_tokens etc."""
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    """Pedidos em andamento por chave (single-flight): o primeiro vai à API, os iguais o acompanham."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.upstream = 0
+        self.coalesced = 0
+
+    def join(self, key, start):
+        """(requisição, já estava em andamento?); `start()` só é chamado se não houver uma igual."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, True
+            flight = self._flights[key] = start()
+            self.upstream += 1
+            return flight, False
+
+    def finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "upstream": self.upstream, "coalesced": self.coalesced}
+
+
+class _Pipeline:
+    """Event loop de fundo com os recursos compartilhados do processo."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # Um limitador por API Key (pelo hash): o volume de uma conta não atrasa as outras
+        self.buckets = OrderedDict()
+        # Um circuit breaker por modelo e chave: a falha de um modelo não bloqueia os outros,
+        # e os erros de uma conta não abrem o circuito das demais
+        self.breakers = OrderedDict()
+        self.clients = ClientPool(factory=new_async_client, closer=self._close_async_client)
+        self.retries = 0
+        self.inflight = _InFlight()
+        thread = threading.Thread(target=self.loop.run_forever, name="isa-pipeline", daemon=True)
+        thread.start()
+
+    def _close_async_client(self, client):
+        asyncio.run_coroutine_threadsafe(client.close(), self.loop)
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def bucket(self, api_key):
+        key = hash_api_key(api_key)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket()
+            while len(self.buckets) > MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def breaker(self, model, api_key):
+        key = (model, hash_api_key(api_key))
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker()
+            while len(self.breakers) > MAX_BREAKERS:
+                self.breakers.popitem(last=False)
+        else:
+            self.breakers.move_to_end(key)
+        return breaker
+
+    async def call(self, api_key, params, on_chunk=None, deadline=REQUEST_DEADLINE, max_attempts=None):
+        """Executa a chamada com limitador, circuit breaker, prazo e novas tentativas.
+
+        Com `on_chunk`, a resposta vem em streaming e cada chunk é repassado; depois
+        do primeiro chunk entregue não há nova tentativa (o texto já foi exibido).
+        """
+        with self.clients.lease(api_key) as client:
+            return await self._call(client, api_key, params, on_chunk, deadline, max_attempts)
+
+    async def _call(self, client, api_key, params, on_chunk, deadline, max_attempts):
+        breaker = self.breaker(params.get("model"), api_key)
+        bucket = self.bucket(api_key)
+        max_attempts = max_attempts or MAX_ATTEMPTS
+        expires_at = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = expires_at - time.monotonic()
+            await breaker.allow(min(QUEUE_MAX_WAIT, remaining))
+            await bucket.acquire(min(QUEUE_MAX_WAIT, expires_at - time.monotonic()))
+            delivered = False
+            try:
+                remaining = expires_at - time.monotonic()
+                if on_chunk is None:
+                    result = await asyncio.wait_for(client.chat.completions.create(**params), remaining)
+                else:
+                    async def consume():
+                        nonlocal delivered
+                        stream = await client.chat.completions.create(**params, stream=True)
+                        async for chunk in stream:
+                            delivered = True
+                            on_chunk(chunk)
+                    result = await asyncio.wait_for(consume(), remaining)
+            except Exception as error:
+                if is_model_failure(error):
+                    breaker.record_failure()
+                else:
+                    breaker.record_neutral()
+                attempt += 1
+                delay = backoff_delay(attempt, error)
+                give_up = delivered or not is_retryable(error) or attempt >= max_attempts
+                if give_up or time.monotonic() + delay >= expires_at:
+                    if isinstance(error, asyncio.TimeoutError):
+                        raise DeadlineExceededError(f"sem resposta em {deadline:.0f}s") from error
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def stats(self):
+        return {
+            "open_circuits": sum(breaker.state != "closed" for breaker in list(self.breakers.values())),
+            "rate_limited_keys": len(self.buckets),
+            "retries": self.retries,
+            **self.inflight.stats(),
+        }
+
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_pipeline():
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = _Pipeline()
+        return _PIPELINE
+
+
+# Devolvido por _EventLog.get quando o evento não chega no tempo dado
+_MISSING = object()
+
+
+class _EventLog:
+    """Eventos (chunks, fim ou erro) de uma requisição em streaming, guardados para todos os leitores."""
+
+    def __init__(self):
+        self.items = []
+        self._changed = threading.Condition()
+
+    def push(self, item):
+        with self._changed:
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def get(self, position, timeout=None):
+        """Evento na posição dada; bloqueia até ele chegar (ou devolve `missing` após `timeout` segundos)."""
+        with self._changed:
+            if not self._changed.wait_for(lambda: len(self.items) > position, timeout):
+                return _MISSING
+            return self.items[position]
+
+
+class StreamHandle:
+    """Lado síncrono (thread do Streamlit) de uma requisição em streaming.
+
+    Cada sessão lê com o seu próprio handle; os de um pedido agrupado compartilham
+    os eventos e cada um recebe a resposta desde o primeiro chunk.
+    """
+
+    _END = object()
+
+    def __init__(self, log=None, shared=False):
+        self.log = log or _EventLog()
+        self.shared = shared
+        self.future = None
+        self._position = 0
+
+    def _push(self, item):
+        self.log.push(item)
+
+    def subscribe(self):
+        """Novo leitor da mesma requisição (para outra sessão)."""
+        reader = StreamHandle(self.log, shared=True)
+        reader.future = self.future
+        return reader
+
+    def wait_first_event(self, timeout=None):
+        """Bloqueia até o primeiro chunk; se a requisição falhou antes dele, relança o erro aqui.
+
+        Sem o primeiro chunk em `timeout` segundos, a requisição é cancelada e sobe
+        FirstTokenTimeoutError (quem acompanha o mesmo pedido recebe o mesmo erro).
+        """
+        item = self.log.get(self._position, timeout)
+        if item is _MISSING:
+            self.future.cancel()
+            raise FirstTokenTimeoutError(f"sem o primeiro chunk em {timeout:.1f}s")
+        if isinstance(item, BaseException):
+            raise item
+
+    def chunks(self):
+        """Gera os chunks recebidos; erros da requisição são relançados aqui."""
+        while True:
+            item = self.log.get(self._position)
+            if item is self._END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            self._position += 1
+            yield item
+
+
+def stream_chat(api_key, max_attempts=None, coalesce=True, **params):
+    """Inicia (ou acompanha, se já há um igual em andamento) um pedido em streaming.
+
+    Devolve o StreamHandle para consumi-lo.
+    """
+    pipeline = get_pipeline()
+
+    def start():
+        handle = StreamHandle()
+
+        async def run():
+            try:
+                await pipeline.call(api_key, params, on_chunk=handle._push, max_attempts=max_attempts)
+            except asyncio.CancelledError:
+                # Cancelado por quem esperava o primeiro chunk: os outros leitores também passam adiante
+                handle._push(FirstTokenTimeoutError("pedido cancelado sem o primeiro chunk"))
+                raise
+            except BaseException as error:
+                handle._push(error)
+            else:
+                handle._push(StreamHandle._END)
+
+        handle.future = pipeline.submit(run())
+        return handle
+
+    if not coalesce:
+        return start()
+    # A chave da API entra na chave do grupo: cada conta paga (e vê os erros de) só os seus pedidos
+    key = ("stream", hash_api_key(api_key), request_key(params))
+    flight, shared = pipeline.inflight.join(key, start)
+    if not shared:
+        # Terminado o pedido, um igual que chegar depois vai de novo à API (ou ao cache de respostas)
+        flight.future.add_done_callback(lambda _: pipeline.inflight.finish(key, flight))
+    return flight.subscribe() if shared else flight
+
+
+def complete_chat(api_key, max_attempts=None, coalesce=True, **params):
+    """Requisição sem streaming (agrupada com uma igual em andamento); bloqueia até a resposta ou o erro."""
+    pipeline = get_pipeline()
+
+    def start():
+        return pipeline.submit(pipeline.call(api_key, params, max_attempts=max_attempts))
+
+    if not coalesce:
+        return start().result()
+    key = ("complete", hash_api_key(api_key), request_key(params))
+    future, shared = pipeline.inflight.join(key, start)
+    if not shared:
+        future.add_done_callback(lambda _: pipeline.inflight.finish(key, future))
+    return future.result()
@@ -0,0 +1,147 @@
+"""Prompts do sistema pré-compilados, com um prefixo idêntico (byte a byte) para todos.
+
+A mensagem do sistema é montada em camadas, da mais estável para a mais variável:
+
+    [prefixo comum: persona e regras gerais] [estilo e foco escolhidos]
+
+e tudo o que muda a cada pedido (resumo da conversa, histórico, pergunta e trechos
+de arquivos) vem depois dela. Assim os provedores que reaproveitam o cache de
+prefixo (KV) do prompt processam de novo só o final de cada pedido.
+
+As combinações de estilo e foco são compiladas uma vez, na importação; cada
+execução do script só consulta o dicionário.
+"""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from isa.context import count_tokens
+from isa.metrics import REGISTRY
+
+# Persona e regras gerais: não devem conter nada que dependa da sessão ou do pedido
+SYSTEM_PREFIX = (
+    'Você é o "ISA AI", um assistente virtual amigável, inteligente e útil.\n'
+    "Sua missão é responder perguntas sobre diversos tópicos, gerar códigos, dar explicações "
+    "e fornecer resumos de forma clara, precisa e útil. Seu tom deve ser encorajador e profissional.\n"
+    "\n"
+    "Regras gerais:\n"
+    "- PRECISÃO: Mantenha a precisão e a utilidade acima de tudo.\n"
+    "- CÓDIGO: Se a resposta for um código, envolva-o em blocos de código Markdown com o idioma "
+    "especificado (ex: ```python, ```javascript).\n"
+    "- ARQUIVOS: Quando a pergunta trouxer trechos de arquivos, baseie a resposta neles.\n"
+)
+
+# Opções das Configurações Avançadas (a primeira de cada é a padrão)
+STYLE_OPTIONS = ("Profissional (Padrão)", "Casual e Amigável", "Formal e Detalhado", "Encorajador")
+FOCUS_OPTIONS = (
+    "Geral (Resumo e Explicação)",
+    "Geração de Código",
+    "Lista de Tópicos",
+    "Respostas Curtas e Diretas",
+)
+
+# Por quanto tempo um prefixo enviado continua "quente" no provedor (estimativa)
+PREFIX_CACHE_TTL = float(os.getenv("ISA_PREFIX_CACHE_TTL", "300"))
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+PREFIX_DIGEST = _digest(SYSTEM_PREFIX)
+PREFIX_TOKENS = count_tokens(SYSTEM_PREFIX)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Mensagem do sistema de uma combinação de estilo e foco."""
+    style: str
+    focus: str
+    system: str
+    tokens: int
+    digest: str
+
+    @property
+    def message(self):
+        return {"role": "system", "content": self.system}
+
+
+def compile_template(style, focus):
+    suffix = (
+        "\n"
+        "Instruções desta conversa (Configurações Avançadas do usuário):\n"
+        f"- ESTILO: Responda de forma {style.split('(')[0].strip()}.\n"
+        f"- FOCO: Sua resposta deve ter como foco principal {focus.lower()}.\n"
+    )
+    system = SYSTEM_PREFIX + suffix
+    return PromptTemplate(style=style, focus=focus, system=system, tokens=count_tokens(system), digest=_digest(system))
+
+
+TEMPLATES = {(style, focus): compile_template(style, focus) for style in STYLE_OPTIONS for focus in FOCUS_OPTIONS}
+
+
+def get_template(style, focus):
+    """Template pré-compilado (uma opção desconhecida é compilada na hora)."""
+    template = TEMPLATES.get((style, focus))
+    return template if template is not None else compile_template(style, focus)
+
+
+class PrefixCacheTracker:
+    """Quanto de cada prompt o provedor reaproveitou do cache de prefixo.
+
+    Usa os `cached_tokens` informados pela API quando existem; senão estima: o
+    template inteiro conta como cache se o mesmo modelo o recebeu há menos de
+    PREFIX_CACHE_TTL segundos, ou só o prefixo comum se ele foi enviado.
+    """
+
+    def __init__(self, ttl=PREFIX_CACHE_TTL):
+        self.ttl = ttl
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def observe(self, model, template, prompt_tokens=None, cached_tokens=None):
+        """Registra um pedido enviado com `template` e devolve os tokens em cache."""
+        now = time.monotonic()
+        with self._lock:
+            if cached_tokens is None:
+                if now - self._seen.get((model, template.digest), -self.ttl) < self.ttl:
+                    cached_tokens = template.tokens
+                elif now - self._seen.get((model, PREFIX_DIGEST), -self.ttl) < self.ttl:
+                    cached_tokens = PREFIX_TOKENS
+                else:
+                    cached_tokens = 0
+                source = "estimated"
+            else:
+                source = "reported"
+            self._seen[(model, template.digest)] = self._seen[(model, PREFIX_DIGEST)] = now
+            prompt_tokens = max(prompt_tokens or template.tokens, cached_tokens)
+            self.requests += 1
+            self.hits += cached_tokens > 0
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+        REGISTRY.inc("isa_prompt_prefix_requests_total", result="hit" if cached_tokens else "miss", source=source)
+        return cached_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.requests, 4) if self.requests else 0.0,
+                "token_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            }
+
+
+REGISTRY.describe("isa_prompt_prefix_requests_total", "Pedidos cujo prefixo do prompt estava (ou não) no cache do provedor.")
+
+_TRACKER = PrefixCacheTracker()
+
+
+def get_prefix_tracker():
+    return _TRACKER
@@ -0,0 +1,128 @@
+"""Cache em disco das respostas para prompts repetidos (ex.: botões de sugestão).
+
+A chave é o hash do pedido normalizado: modelo, max_tokens e as mensagens realmente
+enviadas (prompt do sistema, contexto já recortado e pergunta). As entradas expiram
+após CACHE_TTL segundos e, passando de CACHE_MAX_ENTRIES, saem as menos usadas (LRU).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from isa.session_store import DATA_DIR
+
+CACHE_DB = os.path.join(DATA_DIR, "respostas.sqlite3")
+CACHE_TTL = int(os.getenv("ISA_CACHE_TTL", str(24 * 60 * 60)))
+CACHE_MAX_ENTRIES = int(os.getenv("ISA_CACHE_MAX_ENTRIES", "2000"))
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _normalize(text):
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def cache_key(model, messages, max_tokens):
+    """Hash estável do pedido (espaços extras não mudam a chave)."""
+    payload = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [[m["role"], _normalize(m["content"])] for m in messages],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU com TTL guardado em SQLite (sobrevive a reinícios do servidor)."""
+
+    def __init__(self, path=CACHE_DB, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY,"
+                    " content TEXT NOT NULL,"
+                    " completion_tokens INTEGER,"
+                    " created REAL NOT NULL,"
+                    " last_access REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def get(self, key):
+        """Resposta guardada para a chave, ou None (contabiliza acertos e falhas)."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT content, completion_tokens, created FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[2] > self.ttl:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        row = None
+                    if row is not None:
+                        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else {"content": row[0], "completion_tokens": row[1]}
+
+    def put(self, key, content, completion_tokens=None):
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                        (key, content, completion_tokens, now, now),
+                    )
+                    conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Cache indisponível não impede a resposta
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_CACHE = ResponseCache()
+
+
+def get_response_cache():
+    return _CACHE
@@ -0,0 +1,279 @@
+"""Busca local (BM25) em trechos dos arquivos carregados, para injetar só o que é relevante.
+
+Cada arquivo é dividido em trechos respeitando a estrutura do código (funções e
+classes em .py/.java/.js, parágrafos nos demais) e processado uma única vez por hash
+do conteúdo. Os trechos guardam apenas posições no texto original.
+"""
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+
+# Tamanho alvo de cada trecho (caracteres)
+CHUNK_TARGET_CHARS = 1500
+CHUNK_MAX_CHARS = 3000
+# Trechos injetados no prompt por pergunta
+TOP_K = 6
+# Documentos já processados mantidos em memória (um por conteúdo distinto)
+MAX_CACHED_DOCUMENTS = 256
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Linhas que abrem um novo bloco "de topo" em cada linguagem
+_BOUNDARY_PATTERNS = {
+    ".py": re.compile(r"^(?:@|def |async def |class )"),
+    ".java": re.compile(
+        r"^\s{0,4}(?:@\w+|(?:public|private|protected|static|final|abstract|class|interface|enum|record)\b)"
+    ),
+    ".js": re.compile(
+        r"^\s{0,2}(?:export\s+)?(?:default\s+)?(?:async\s+function|function|class|const\s+\w+\s*=\s*(?:async\s*)?(?:\(|function)|\w+\s*\([^)]*\)\s*\{)"
+    ),
+}
+
+_WORD_RE = re.compile(r"[A-Za-zÀ-ÿ_][A-Za-zÀ-ÿ0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-ZÀ-Ý]?[a-zà-ÿ0-9]+|[A-ZÀ-Ý]+(?![a-zà-ÿ])")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Trecho do documento, guardado como posições (sem copiar o texto)."""
+    start: int
+    end: int
+    first_line: int
+    last_line: int
+
+
+def tokenize(text):
+    """Termos em minúsculas; identificadores em camelCase/snake_case também viram partes."""
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def _extension(filename):
+    name = filename.lower()
+    return name[name.rfind("."):] if "." in name else ""
+
+
+def boundary_pattern(filename):
+    """Regex das linhas que abrem uma definição de topo (None para texto comum)."""
+    return _BOUNDARY_PATTERNS.get(_extension(filename))
+
+
+def _line_offsets(text):
+    offsets = [0]
+    for match in re.finditer("\n", text):
+        offsets.append(match.end())
+    return offsets
+
+
+def _segments(text, lines, filename):
+    """Pontos de corte naturais do texto (índices de linha)."""
+    pattern = boundary_pattern(filename)
+    cuts = [0]
+    for number in range(1, len(lines)):
+        start = lines[number]
+        end = lines[number + 1] if number + 1 < len(lines) else len(text)
+        line = text[start:end]
+        previous = text[lines[number - 1]:start]
+        if pattern is not None:
+            # Decorators e anotações ficam junto da definição que vem logo abaixo
+            if pattern.match(line) and not pattern.match(previous):
+                cuts.append(number)
+        elif line.strip() and not previous.strip():
+            cuts.append(number)
+    return cuts
+
+
+def chunk_text(text, filename=""):
+    """Divide o texto em trechos de ~CHUNK_TARGET_CHARS respeitando os cortes naturais."""
+    if not text:
+        return []
+    lines = _line_offsets(text)
+    cuts = _segments(text, lines, filename) + [len(lines)]
+    chunks = []
+    chunk_first = 0
+    for index in range(1, len(cuts)):
+        first, stop = chunk_first, cuts[index]
+        start = lines[first]
+        end = lines[stop] if stop < len(lines) else len(text)
+        size = end - start
+        next_cut = cuts[index + 1] if index + 1 < len(cuts) else None
+        next_end = (lines[next_cut] if next_cut is not None and next_cut < len(lines) else len(text))
+        if next_cut is not None and size < CHUNK_TARGET_CHARS and next_end - start <= CHUNK_MAX_CHARS:
+            continue  # ainda cabe o próximo segmento no mesmo trecho
+        chunks.extend(_split_oversized(text, lines, first, stop))
+        chunk_first = stop
+    return chunks
+
+
+def _split_oversized(text, lines, first, stop):
+    """Quebra por linhas um segmento maior que CHUNK_MAX_CHARS (ex.: função enorme)."""
+    chunks = []
+    line = first
+    while line < stop:
+        start = lines[line]
+        last = line
+        while last + 1 < stop and lines[last + 1] - start < CHUNK_MAX_CHARS:
+            last += 1
+        end = lines[last + 1] if last + 1 < len(lines) else len(text)
+        chunks.append(Chunk(start, end, line + 1, last + 1))
+        line = last + 1
+    return chunks
+
+
+@dataclass(eq=False)
+class Document:
+    """Documento indexável: o texto é guardado uma vez e os trechos são só posições nele."""
+    name: str
+    digest: str
+    text: str
+    chunks: list
+    chunk_terms: list
+
+    def chunk_text(self, chunk):
+        return self.text[chunk.start:chunk.end]
+
+
+def parse_document(text, name, digest):
+    """Divide em trechos e conta os termos de cada um (feito uma vez por conteúdo)."""
+    chunks = chunk_text(text, name)
+    chunk_terms = [Counter(tokenize(text[c.start:c.end])) for c in chunks]
+    return Document(name=name, digest=digest, text=text, chunks=chunks, chunk_terms=chunk_terms)
+
+
+class CorpusIndex:
+    """Índice BM25 sobre vários documentos, com inclusão e remoção incrementais.
+
+    As listas invertidas (trecho, peso) de cada termo são arrays NumPy reconstruídos
+    só quando o conjunto de documentos muda; a pontuação de uma pergunta soma os
+    pesos dos termos dela de forma vetorizada.
+    """
+
+    def __init__(self):
+        self.documents = OrderedDict()
+        self._entries = None
+        self._postings = None
+
+    def __contains__(self, digest):
+        return digest in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def chunk_count(self):
+        return sum(len(d.chunks) for d in self.documents.values())
+
+    def add(self, document):
+        """Inclui o documento; devolve False se o mesmo conteúdo já estava indexado."""
+        if document.digest in self.documents:
+            return False
+        self.documents[document.digest] = document
+        self._postings = None
+        return True
+
+    def remove(self, digest):
+        if self.documents.pop(digest, None) is not None:
+            self._postings = None
+
+    def _build(self):
+        import numpy as np  # Só quando há documentos: fica fora da partida do app
+
+        self._entries = [(d, c) for d in self.documents.values() for c in d.chunks]
+        counters = [terms for d in self.documents.values() for terms in d.chunk_terms]
+        lengths = np.array([sum(c.values()) for c in counters], dtype=np.float32)
+        average = lengths.mean() if len(lengths) else 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (average or 1.0))
+
+        rows, frequencies = {}, {}
+        for row, counter in enumerate(counters):
+            for term, count in counter.items():
+                rows.setdefault(term, []).append(row)
+                frequencies.setdefault(term, []).append(count)
+
+        total = len(counters)
+        self._postings = {}
+        for term, term_rows in rows.items():
+            term_rows = np.array(term_rows, dtype=np.int32)
+            tf = np.array(frequencies[term], dtype=np.float32)
+            idf = np.log1p((total - len(term_rows) + 0.5) / (len(term_rows) + 0.5))
+            # Peso BM25 do termo em cada trecho, já calculado para todas as perguntas
+            self._postings[term] = (term_rows, idf * tf * (BM25_K1 + 1) / (tf + norm[term_rows]))
+
+    def search(self, query, top_k=TOP_K):
+        """Pares (documento, trecho) mais relevantes, na ordem dos documentos e das linhas."""
+        if self._postings is None:
+            self._build()
+        if len(self._entries) <= top_k:
+            return list(self._entries)
+        import numpy as np
+
+        scores = np.zeros(len(self._entries), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+                matched = True
+        if not matched:
+            # Nada em comum com a pergunta: usa o começo dos documentos
+            return self._entries[:top_k]
+        best = np.argsort(-scores, kind="stable")[:top_k]
+        return [self._entries[i] for i in sorted(best)]
+
+
+_DOCUMENTS = OrderedDict()
+_DOCUMENTS_LOCK = threading.Lock()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cached_document(digest, name):
+    """Documento já processado com esse conteúdo, se houver (sem precisar decodificar)."""
+    with _DOCUMENTS_LOCK:
+        document = _DOCUMENTS.get((digest, _extension(name)))
+        if document is None:
+            return None
+        _DOCUMENTS.move_to_end((digest, _extension(name)))
+    # Mesmo conteúdo com outro nome: reaproveita o texto, os trechos e os termos
+    return document if document.name == name else replace(document, name=name)
+
+
+def load_document(text, name, digest):
+    """Documento do conteúdo `digest` (o trabalho de indexação é reaproveitado entre sessões)."""
+    document = cached_document(digest, name)
+    if document is not None:
+        return document
+    document = parse_document(text, name, digest)
+    with _DOCUMENTS_LOCK:
+        _DOCUMENTS[(digest, _extension(name))] = document
+        while len(_DOCUMENTS) > MAX_CACHED_DOCUMENTS:
+            _DOCUMENTS.popitem(last=False)
+    return document
+
+
+def build_file_injection(index, query, top_k=TOP_K):
+    """Bloco de texto com os trechos relevantes dos documentos, pronto para ir no prompt."""
+    results = index.search(query, top_k)
+    if len(results) == index.chunk_count:
+        return "".join(
+            f"\n\n--- CONTEÚDO DO ARQUIVO: {d.name} ---\n{d.text}\n--- FIM DO ARQUIVO ---\n\n"
+            for d in index.documents.values()
+        )
+    parts = [f"\n\n--- TRECHOS RELEVANTES ({len(results)} de {index.chunk_count}) ---\n"]
+    for document, chunk in results:
+        parts.append(f"[{document.name}, linhas {chunk.first_line}-{chunk.last_line}]\n")
+        parts.append(document.chunk_text(chunk).rstrip("\n"))
+        parts.append("\n\n")
+    parts.append("--- FIM DOS TRECHOS ---\n\n")
+    return "".join(parts)
@@ -0,0 +1,244 @@
+"""Escolha do modelo a cada pergunta, com base no pedido e na latência medida de cada modelo.
+
+Cada modelo do pool tem um perfil fixo (janela de contexto, velocidade e qualidade) e
+estatísticas vivas das últimas requisições: latências (p50/p95 até o primeiro token
+com streaming; a latência total sem streaming fica numa série à parte) e taxa de erro
+numa janela de tempo. O roteador pontua os modelos para o pedido atual, deixa por último os
+que estão lentos ou falhando e devolve a lista de candidatos na ordem de tentativa.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from isa.pipeline import CircuitOpenError, DeadlineExceededError, FirstTokenTimeoutError
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Características fixas de um modelo (velocidade e qualidade de 1 a 3)."""
+    name: str
+    context: int
+    speed: int
+    quality: int
+    label: str
+
+
+MODEL_PROFILES = {
+    "llama-3.1-8b-instant": ModelProfile("llama-3.1-8b-instant", 131072, 3, 1, "Rápido e Estável"),
+    "openai/gpt-oss-20b": ModelProfile("openai/gpt-oss-20b", 131072, 2, 2, "Equilibrado"),
+    "llama-3.3-70b-versatile": ModelProfile("llama-3.3-70b-versatile", 131072, 1, 3, "Mais Capaz"),
+}
+
+# Modelos disponíveis para o roteador, na ordem de preferência padrão
+MODEL_POOL = [
+    name.strip()
+    for name in os.getenv("ISA_MODEL_POOL", "llama-3.1-8b-instant,llama-3.3-70b-versatile").split(",")
+    if name.strip()
+]
+DEFAULT_MODEL = MODEL_POOL[0]
+
+# Peso de (velocidade, qualidade) para cada foco de resposta
+FOCUS_WEIGHTS = {
+    "Geração de Código": (0.5, 1.0),
+    "Geral (Resumo e Explicação)": (1.0, 0.5),
+    "Lista de Tópicos": (1.0, 0.3),
+    "Respostas Curtas e Diretas": (1.0, 0.0),
+}
+DEFAULT_WEIGHTS = (1.0, 0.5)
+# Prompts grandes (ex.: arquivos anexados) pesam mais a qualidade
+LARGE_PROMPT_TOKENS = int(os.getenv("ISA_LARGE_PROMPT_TOKENS", "4000"))
+
+# Janela das estatísticas: amostras mais antigas são descartadas, o que permite a um
+# modelo rebaixado voltar a ser escolhido depois que o problema passou
+STATS_WINDOW = float(os.getenv("ISA_ROUTER_WINDOW", "300"))
+STATS_MAX_SAMPLES = 100
+MIN_SAMPLES = 3
+# Latência (até o primeiro token) considerada boa; acima dela o modelo perde pontos
+LATENCY_TARGET = float(os.getenv("ISA_LATENCY_TARGET", "2.0"))
+# Acima destes limites o modelo só é usado como último recurso
+SLOW_P95 = float(os.getenv("ISA_SLOW_P95", "10.0"))
+MAX_ERROR_RATE = 0.5
+
+# Tentativas por modelo quando ainda há outro candidato para assumir
+FAILOVER_ATTEMPTS = 2
+# Espera máxima pelo primeiro chunk quando ainda há outro candidato: o maior entre este
+# valor e FIRST_TOKEN_P95_FACTOR × a p95 medida do modelo (prompts grandes demoram mais)
+FIRST_TOKEN_TIMEOUT = float(os.getenv("ISA_FIRST_TOKEN_TIMEOUT", str(LATENCY_TARGET * 5)))
+FIRST_TOKEN_P95_FACTOR = 2.0
+
+
+def failover_errors():
+    """Erros que indicam problema do modelo (e não do pedido): vale tentar o próximo.
+
+    O ServiceBusyError do limite de taxa fica de fora: o limite é da API Key, vale para
+    qualquer modelo. Já o circuito aberto é de um modelo só.
+    """
+    import groq
+
+    return (
+        groq.RateLimitError,
+        groq.InternalServerError,
+        groq.APIConnectionError,
+        groq.NotFoundError,
+        DeadlineExceededError,
+        FirstTokenTimeoutError,
+        CircuitOpenError,
+    )
+
+
+def percentile(values, q):
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not values:
+        return None
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+@dataclass
+class ModelHealth:
+    """Resumo das estatísticas recentes de um modelo."""
+    samples: int = 0
+    p50: float | None = None
+    p95: float | None = None
+    # Latência total das respostas sem streaming (não entra na pontuação nem no prazo do 1º chunk)
+    total_p95: float | None = None
+    error_rate: float = 0.0
+
+    @property
+    def degraded(self):
+        if self.samples < MIN_SAMPLES:
+            return False
+        return self.error_rate >= MAX_ERROR_RATE or (self.p95 or 0.0) > SLOW_P95
+
+
+class ModelStats:
+    """Amostras (instante, latência, sucesso, streaming) das últimas requisições de um modelo."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=STATS_MAX_SAMPLES)
+
+    def record(self, latency, ok, streaming=True):
+        self.samples.append((time.monotonic(), latency, ok, streaming))
+
+    def health(self):
+        cutoff = time.monotonic() - STATS_WINDOW
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return ModelHealth()
+        answered = [(latency, streaming) for _, latency, ok, streaming in self.samples if ok and latency is not None]
+        latencies = sorted(latency for latency, streaming in answered if streaming)
+        totals = sorted(latency for latency, streaming in answered if not streaming)
+        errors = sum(1 for _, _, ok, _ in self.samples if not ok)
+        return ModelHealth(
+            samples=len(self.samples),
+            p50=percentile(latencies, 0.5),
+            p95=percentile(latencies, 0.95),
+            total_p95=percentile(totals, 0.95),
+            error_rate=errors / len(self.samples),
+        )
+
+
+@dataclass
+class RouteDecision:
+    """Modelo escolhido, candidatos na ordem de tentativa e o motivo (para a sidebar)."""
+    model: str
+    candidates: tuple
+    reason: str
+    failed_over_from: tuple = ()
+
+
+class ModelRouter:
+    """Roteador compartilhado pelo processo (as estatísticas valem para todas as sessões)."""
+
+    def __init__(self, pool=None, profiles=None):
+        self.pool = list(pool or MODEL_POOL)
+        self.profiles = profiles or MODEL_PROFILES
+        self.stats = {model: ModelStats() for model in self.pool}
+        self._lock = threading.Lock()
+
+    def profile(self, model):
+        return self.profiles.get(model) or ModelProfile(model, 8192, 2, 2, model)
+
+    def route(self, prompt_tokens, max_tokens, focus):
+        """Ordena os modelos do pool para este pedido; o primeiro é o escolhido."""
+        speed_weight, quality_weight = FOCUS_WEIGHTS.get(focus, DEFAULT_WEIGHTS)
+        if prompt_tokens > LARGE_PROMPT_TOKENS:
+            quality_weight += 0.5
+        health = self.health()
+        ranked = []
+        for position, model in enumerate(self.pool):
+            profile = self.profile(model)
+            fits = profile.context >= prompt_tokens + max_tokens
+            score = speed_weight * profile.speed + quality_weight * profile.quality
+            p95 = health[model].p95
+            if p95 is not None and p95 > LATENCY_TARGET:
+                score -= p95 / LATENCY_TARGET
+            # Em caso de empate vale a ordem do pool
+            ranked.append((not fits, health[model].degraded, -score, position, model))
+        ranked.sort()
+        chosen = ranked[0]
+        candidates = tuple(item[-1] for item in ranked)
+        if chosen[0]:
+            reason = "nenhum modelo comporta o prompt inteiro"
+        elif any(item[1] for item in ranked) and not chosen[1]:
+            slow = [item[-1] for item in ranked if item[1]]
+            reason = f"{', '.join(slow)} lento ou com erros"
+        elif prompt_tokens > LARGE_PROMPT_TOKENS:
+            reason = "prompt grande"
+        else:
+            reason = f"foco: {focus}"
+        return RouteDecision(model=candidates[0], candidates=candidates, reason=reason)
+
+    def record(self, model, latency, ok=True, streaming=True):
+        """Registra uma requisição: `latency` é o tempo até o primeiro token (streaming) ou o total."""
+        with self._lock:
+            if model not in self.stats:
+                self.stats[model] = ModelStats()
+            self.stats[model].record(latency, ok, streaming)
+
+    def health(self):
+        with self._lock:
+            return {model: stats.health() for model, stats in self.stats.items()}
+
+    def first_token_timeout(self, model):
+        """Quanto esperar pelo primeiro chunk de `model` antes de passar para o próximo candidato."""
+        p95 = self.health().get(model, ModelHealth()).p95
+        return max(FIRST_TOKEN_TIMEOUT, FIRST_TOKEN_P95_FACTOR * (p95 or 0.0))
+
+    def run(self, decision, attempt):
+        """Chama `attempt(modelo, tentativas, prazo_primeiro_chunk)` nos candidatos até um responder (failover).
+
+        Um modelo lento (sem o primeiro chunk no prazo) conta como falha, assim como um
+        erro; o último candidato não tem prazo para o primeiro chunk. Devolve o resultado
+        do primeiro que funcionar e atualiza `decision` com o modelo usado; as falhas
+        entram nas estatísticas de cada modelo (menos o circuito aberto, que não chegou a
+        enviar nada). Outros erros, como o limite de taxa da chave, sobem direto.
+        """
+        failed = []
+        for index, model in enumerate(decision.candidates):
+            is_last = index == len(decision.candidates) - 1
+            try:
+                if is_last:
+                    result = attempt(model, None, None)
+                else:
+                    result = attempt(model, FAILOVER_ATTEMPTS, self.first_token_timeout(model))
+            except failover_errors() as error:
+                if not isinstance(error, CircuitOpenError):
+                    self.record(model, None, ok=False)
+                if is_last:
+                    raise
+                failed.append(model)
+                continue
+            decision.model = model
+            decision.failed_over_from = tuple(failed)
+            return result
+
+
+_ROUTER = ModelRouter()
+
+
+def get_router():
+    return _ROUTER
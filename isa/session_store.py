@@ -0,0 +1,429 @@
+"""Armazenamento das conversas no servidor, identificadas por um ID opaco.
+
+Duas camadas:
+- memória: LRU das conversas ativas do processo (reconectar não decodifica nada);
+- SQLite em modo WAL: durável e compartilhável entre processos/réplicas que usam o
+  mesmo arquivo, de onde um processo reiniciado retoma a conversa.
+
+As gravações no SQLite são preguiçosas e em lote: cada turno só atualiza a memória, e
+uma thread de fundo grava as mensagens pendentes a cada FLUSH_INTERVAL segundos (ou na
+hora, quando acumulam FLUSH_BATCH mensagens ou o LRU enche). Uma conversa com mensagens
+pendentes não sai do LRU até ser gravada, e o acesso ao SQLite acontece fora do lock da
+memória.
+
+Um índice FTS5 (mantido por triggers a cada gravação) permite buscar texto em todas
+as conversas salvas sem decodificar nenhuma delas.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+DATA_DIR = os.getenv("ISA_DATA_DIR", ".isa_data")
+HISTORY_DB = os.path.join(DATA_DIR, "historico.sqlite3")
+
+# Conversas mantidas em memória por processo
+MAX_SESSIONS = int(os.getenv("ISA_SESSION_CACHE_SIZE", "256"))
+# Intervalo entre gravações em lote e quantidade de mensagens que força a gravação
+FLUSH_INTERVAL = float(os.getenv("ISA_SESSION_FLUSH_INTERVAL", "2"))
+FLUSH_BATCH = 32
+# Resultados por busca; no app, a busca fica restrita às conversas da própria sessão
+SEARCH_LIMIT = 20
+SEARCH_ENABLED = os.getenv("ISA_HISTORY_SEARCH", "1") == "1"
+
+_SEARCH_TERM_RE = re.compile(r"\w+")
+
+
+def fts_query(text):
+    """Converte o texto digitado numa consulta FTS5 segura: todos os termos (o último como prefixo)."""
+    terms = _SEARCH_TERM_RE.findall(text)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+@dataclass
+class SearchHit:
+    """Mensagem encontrada numa busca, com o trecho que casou."""
+    conversation_id: str
+    seq: int
+    role: str
+    snippet: str
+
+
+class SqliteHistoryStore:
+    """Histórico em SQLite (WAL), uma linha por mensagem."""
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._lock:
+                # WAL: leitores (outras sessões/réplicas) não bloqueiam a gravação em lote
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS messages ("
+                    " conversation_id TEXT NOT NULL,"
+                    " seq INTEGER NOT NULL,"
+                    " role TEXT NOT NULL,"
+                    " content TEXT NOT NULL,"
+                    " PRIMARY KEY (conversation_id, seq))"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS summaries ("
+                    " conversation_id TEXT PRIMARY KEY,"
+                    " covered INTEGER NOT NULL,"
+                    " text TEXT NOT NULL)"
+                )
+                self._create_search_index(conn)
+                conn.commit()
+                self._ready = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Faz o INSERT OR REPLACE disparar o trigger de remoção (e limpar o índice)
+        conn.execute("PRAGMA recursive_triggers=ON")
+        return conn
+
+    def _create_search_index(self, conn):
+        """Índice FTS5 sobre o conteúdo das mensagens (sem cópia do texto)."""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            " content, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN"
+            " INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN"
+            " INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content); END"
+        )
+        if not exists:
+            # Banco de uma versão anterior: indexa as mensagens que já existiam
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+    def write(self, message_rows, summary_rows=(), truncations=()):
+        """Grava um lote numa única transação.
+
+        `truncations` são pares (conversa, seq): mensagens a partir de `seq` são
+        apagadas antes (ex.: a última pergunta foi descartada após um erro).
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM messages WHERE conversation_id = ? AND seq >= ?", truncations)
+                conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", message_rows)
+                conn.executemany("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)", summary_rows)
+        finally:
+            conn.close()
+
+    def load(self, conversation_id):
+        """(mensagens, resumo) da conversa."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,),
+            ).fetchall()
+            summary = conn.execute(
+                "SELECT covered, text FROM summaries WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        messages = [{"role": role, "content": content} for role, content in rows]
+        return messages, ({"text": summary[1], "covered": summary[0]} if summary else None)
+
+    def message_count(self, conversation_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def delete(self, conversation_id):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+                conn.execute("DELETE FROM summaries WHERE conversation_id = ?", (conversation_id,))
+        finally:
+            conn.close()
+
+    def conversation_ids(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT DISTINCT conversation_id FROM messages ORDER BY conversation_id").fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+
+    def search(self, text, limit=SEARCH_LIMIT, role=None, conversation_ids=None):
+        """Mensagens que contêm todos os termos de `text`, das mais relevantes (BM25) às menos.
+
+        Com `conversation_ids`, só nessas conversas (uma lista vazia não encontra nada).
+        """
+        query = fts_query(text)
+        if query is None or (conversation_ids is not None and not conversation_ids):
+            return []
+        sql = (
+            "SELECT m.conversation_id, m.seq, m.role, snippet(messages_fts, 0, '**', '**', ' … ', 16)"
+            " FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid"
+            " WHERE messages_fts MATCH ?"
+        )
+        params = [query]
+        if role is not None:
+            sql += " AND m.role = ?"
+            params.append(role)
+        if conversation_ids is not None:
+            conversation_ids = list(conversation_ids)
+            sql += f" AND m.conversation_id IN ({','.join('?' * len(conversation_ids))})"
+            params.extend(conversation_ids)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return [SearchHit(*row) for row in rows]
+
+
+@dataclass
+class _Session:
+    """Conversa em memória e o que dela ainda não foi gravado no SQLite."""
+    messages: list = field(default_factory=list)
+    summary: dict | None = None
+    # Mensagens [0, flushed) já estão no SQLite; `truncate_at` pede para apagar a partir dali
+    flushed: int = 0
+    truncate_at: int | None = None
+    summary_dirty: bool = False
+    # Quantas vezes mensagens foram descartadas (uma gravação em andamento fica desatualizada)
+    truncations: int = 0
+
+    @property
+    def dirty(self):
+        return self.flushed < len(self.messages) or self.summary_dirty or self.truncate_at is not None
+
+
+class SessionStore:
+    """Conversas por ID opaco: LRU em memória na frente do SQLite, com gravação em lote."""
+
+    def __init__(self, backend=None, max_sessions=MAX_SESSIONS, flush_interval=FLUSH_INTERVAL):
+        self.backend = backend or SqliteHistoryStore()
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self._sessions = OrderedDict()
+        # _lock protege a memória (nunca é mantido durante o acesso ao SQLite);
+        # _write_lock põe as gravações em fila, para um lote nunca sobrescrever um mais novo
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._flusher = None
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    def _session(self, conversation_id, create=False):
+        """Conversa da camada de memória, trazendo do SQLite se preciso (chamado sem o lock)."""
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is not None:
+                self._sessions.move_to_end(conversation_id)
+                self.hits += 1
+                return session
+            self.misses += 1
+        messages, summary = self.backend.load(conversation_id)
+        with self._lock:
+            # Outra thread pode ter trazido (ou criado) a conversa durante a leitura
+            session = self._sessions.get(conversation_id)
+            if session is None:
+                if not messages and summary is None and not create:
+                    return None
+                session = _Session(messages=messages, summary=summary, flushed=len(messages))
+                self._sessions[conversation_id] = session
+                self._trim(keep=conversation_id)
+            return session
+
+    @contextmanager
+    def _editing(self, conversation_id):
+        """Conversa (criada se preciso) para alterar com o lock adquirido."""
+        while True:
+            session = self._session(conversation_id, create=True)
+            with self._lock:
+                # Pode ter saído do LRU entre a leitura e o lock
+                if self._sessions.get(conversation_id) is session:
+                    yield session
+                    return
+
+    def _trim(self, keep=None):
+        """Tira do LRU as conversas mais antigas já gravadas, menos `keep` (com o lock).
+
+        As que têm alterações pendentes ficam até a próxima gravação dar certo.
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess > 0:
+            clean = [i for i, s in self._sessions.items() if not s.dirty and i != keep]
+            for conversation_id in clean[:excess]:
+                del self._sessions[conversation_id]
+
+    def _over_capacity(self):
+        """O LRU passou do limite por causa de conversas pendentes (gravá-las libera espaço)."""
+        with self._lock:
+            return len(self._sessions) > self.max_sessions
+
+    def load(self, conversation_id):
+        """(mensagens, resumo) da conversa; ([], None) se o ID não existe."""
+        with self._lock:
+            cached = self._sessions.get(conversation_id)
+            count = len(cached.messages) if cached is not None and not cached.dirty else None
+        # Outra réplica pode ter continuado a conversa: confere o SQLite (consulta barata)
+        if count is not None:
+            try:
+                stale = self.backend.message_count(conversation_id) != count
+            except sqlite3.Error:
+                stale = False
+            if stale:
+                with self._lock:
+                    if self._sessions.get(conversation_id) is cached and not cached.dirty:
+                        del self._sessions[conversation_id]
+        session = self._session(conversation_id)
+        if session is None:
+            return [], None
+        with self._lock:
+            return list(session.messages), session.summary
+
+    def append(self, conversation_id, start, messages):
+        """Grava `messages` a partir da posição `start` (o que vinha depois é substituído)."""
+        with self._editing(conversation_id) as session:
+            if start < len(session.messages):
+                del session.messages[start:]
+                session.truncations += 1
+                session.flushed = min(session.flushed, start)
+                # Mesmo sem nada gravado além de `start`, um lote em andamento pode gravar
+                session.truncate_at = start if session.truncate_at is None else min(session.truncate_at, start)
+            session.messages.extend({"role": m["role"], "content": m["content"]} for m in messages)
+            pending = len(session.messages) - session.flushed
+        self._ensure_flusher()
+        if self._over_capacity():
+            self.flush()
+        elif pending >= FLUSH_BATCH:
+            self.flush(conversation_id)
+
+    def save_summary(self, conversation_id, summary):
+        with self._editing(conversation_id) as session:
+            session.summary = {"text": summary.text, "covered": summary.covered}
+            session.summary_dirty = True
+        self._ensure_flusher()
+        if self._over_capacity():
+            self.flush()
+
+    def delete(self, conversation_id):
+        with self._write_lock:
+            with self._lock:
+                self._sessions.pop(conversation_id, None)
+            self.backend.delete(conversation_id)
+
+    def conversation_ids(self):
+        """IDs de todas as conversas salvas (as pendentes são gravadas antes)."""
+        self.flush()
+        return self.backend.conversation_ids()
+
+    def search(self, text, limit=SEARCH_LIMIT, role=None, conversation_ids=None):
+        """Busca no índice de texto; ver SqliteHistoryStore.search.
+
+        Antes, grava o que está pendente nas conversas buscadas (em todas, sem `conversation_ids`).
+        """
+        if conversation_ids is not None:
+            conversation_ids = list(conversation_ids)
+        self._flush(conversation_ids)
+        return self.backend.search(text, limit, role, conversation_ids)
+
+    def flush(self, conversation_id=None):
+        """Grava no SQLite o que está pendente (de uma conversa ou de todas)."""
+        self._flush(None if conversation_id is None else [conversation_id])
+
+    def _flush(self, conversation_ids=None):
+        with self._write_lock:
+            with self._lock:
+                if conversation_ids is None:
+                    items = [(i, s) for i, s in self._sessions.items() if s.dirty]
+                else:
+                    sessions = ((i, self._sessions.get(i)) for i in dict.fromkeys(conversation_ids))
+                    items = [(i, s) for i, s in sessions if s is not None and s.dirty]
+                if not items:
+                    return
+                batch, rows = self._snapshot(items)
+            try:
+                self.backend.write(*rows)
+            except (OSError, sqlite3.Error):
+                # Fica pendente (e na memória) e é tentado de novo na próxima rodada
+                return
+            with self._lock:
+                for session, written, truncations, summary in batch:
+                    # Mensagens descartadas durante a gravação: o que foi gravado precisa ser refeito
+                    if session.truncations == truncations:
+                        session.flushed = written
+                        session.truncate_at = None
+                    if session.summary is summary:
+                        session.summary_dirty = False
+                self.flushes += 1
+                self._trim()
+
+    def _snapshot(self, items):
+        """Linhas a gravar e o estado de cada conversa nesse momento (com o lock)."""
+        batch, message_rows, summary_rows, truncations = [], [], [], []
+        for conversation_id, session in items:
+            if session.truncate_at is not None:
+                truncations.append((conversation_id, session.truncate_at))
+            for seq in range(session.flushed, len(session.messages)):
+                message = session.messages[seq]
+                message_rows.append((conversation_id, seq, message["role"], message["content"]))
+            if session.summary_dirty and session.summary:
+                summary_rows.append((conversation_id, session.summary["covered"], session.summary["text"]))
+            batch.append((session, len(session.messages), session.truncations, session.summary))
+        return batch, (message_rows, summary_rows, truncations)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_forever, name="isa-session-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = sum(len(s.messages) - s.flushed for s in self._sessions.values())
+            return {
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending_messages": pending,
+                "flushes": self.flushes,
+            }
+
+
+_STORE = SessionStore()
+
+
+def get_session_store():
+    return _STORE
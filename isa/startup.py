@@ -0,0 +1,73 @@
+"""Inicialização do processo (uma única vez) e aquecimento em segundo plano.
+
+A primeira execução do script faz só o necessário para desenhar a página. O que é
+caro e pode esperar roda numa thread logo depois dela: importar o SDK da Groq,
+compilar as folhas de estilo dos outros temas e importar os módulos pesados das
+ações menos comuns. O cliente de cada API Key só é criado no primeiro pedido real
+dela (pelo pipeline): chaves digitadas e nunca usadas não ocupam o pool de clientes.
+
+    ISA_WARMUP=0   desliga o aquecimento (cada coisa fica para o seu primeiro uso)
+"""
+import importlib
+import os
+import threading
+import time
+
+from isa.metrics import REGISTRY, start_exporters
+from isa.pipeline import get_pipeline
+from isa.prompts import get_prefix_tracker
+from isa.response_cache import get_response_cache
+from isa.session_store import get_session_store
+from isa.theme import compile_all
+
+WARMUP_ENABLED = os.getenv("ISA_WARMUP", "1") == "1"
+# Usados só em algumas ações (busca nos arquivos enviados); o SDK da Groq vem com os clientes
+WARM_MODULES = ("groq", "numpy")
+
+_LOCK = threading.Lock()
+_INITIALIZED = False
+_WARMED = False
+
+
+def _collector(prefix, stats):
+    return lambda: {f"{prefix}_{name}": value for name, value in stats().items()}
+
+
+def initialize():
+    """Trabalho de uma vez por processo: exportadores e coletores de métricas."""
+    global _INITIALIZED
+    with _LOCK:
+        if _INITIALIZED:
+            return
+        _INITIALIZED = True
+    start_exporters()
+    REGISTRY.register_collector("response_cache", _collector("isa_response_cache", lambda: get_response_cache().stats()))
+    REGISTRY.register_collector("prompt_prefix", _collector("isa_prompt_prefix", lambda: get_prefix_tracker().stats()))
+    REGISTRY.register_collector("request_coalescing", _collector("isa_requests", lambda: get_pipeline().inflight.stats()))
+    REGISTRY.register_collector("session_store", _collector("isa_session_store", lambda: get_session_store().stats()))
+
+
+def warmup():
+    """Aquece em segundo plano (uma vez por processo) o que o primeiro pedido vai usar."""
+    global _WARMED
+    if not WARMUP_ENABLED:
+        return
+    with _LOCK:
+        if _WARMED:
+            return
+        _WARMED = True
+    threading.Thread(target=_warm, name="isa-warmup", daemon=True).start()
+
+
+def _warm():
+    started = time.perf_counter()
+    try:
+        compile_all()
+        for name in WARM_MODULES:
+            importlib.import_module(name)
+        # Event loop do pipeline (os clientes de cada chave ficam para o primeiro pedido)
+        get_pipeline()
+    except Exception:
+        # Aquecer é só uma otimização: o primeiro uso de verdade tenta de novo
+        pass
+    REGISTRY.observe("isa_stage_seconds", time.perf_counter() - started, stage="warmup")
@@ -0,0 +1,101 @@
+"""Renderização incremental (streaming) das respostas da ISA AI."""
+import time
+from dataclasses import dataclass, asdict
+
+# Intervalo mínimo entre duas atualizações da interface durante o streaming (segundos).
+# Evita um re-render por token: os deltas são acumulados e enviados em lotes.
+FLUSH_INTERVAL = 0.08
+# Quantidade de caracteres novos que força uma atualização mesmo antes do intervalo
+FLUSH_MIN_CHARS = 64
+# Cursor exibido no fim do texto enquanto a resposta ainda está sendo gerada
+CURSOR = "▌"
+
+
+@dataclass
+class TurnStats:
+    """Métricas de um turno de conversa (tempo até o primeiro token, taxa, etc.)."""
+    ttft: float | None = None
+    total: float = 0.0
+    completion_tokens: int = 0
+    prompt_tokens: int | None = None
+    # Tokens do prompt reaproveitados do cache de prefixo do provedor (se informado)
+    cached_tokens: int | None = None
+    chunks: int = 0
+    flushes: int = 0
+    cache_hit: bool = False
+
+    @property
+    def tokens_per_sec(self):
+        """Taxa de geração em tokens/s, medida a partir do primeiro token."""
+        generation_time = self.total - (self.ttft or 0.0)
+        if generation_time <= 0:
+            # Resposta bloqueante: o primeiro token só aparece no fim
+            generation_time = self.total
+        if generation_time <= 0 or not self.completion_tokens:
+            return 0.0
+        return self.completion_tokens / generation_time
+
+    def as_dict(self):
+        data = asdict(self)
+        data["tokens_per_sec"] = round(self.tokens_per_sec, 2)
+        return data
+
+
+def cached_prompt_tokens(usage):
+    """`cached_tokens` do uso informado pela API, ou None se ela não informa."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
+
+def iter_groq_deltas(stream, stats):
+    """Extrai o texto de cada chunk do stream da Groq e captura o uso de tokens do último chunk."""
+    for chunk in stream:
+        x_groq = getattr(chunk, "x_groq", None)
+        usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None)
+        if usage is not None:
+            stats.completion_tokens = usage.completion_tokens or stats.completion_tokens
+            stats.prompt_tokens = usage.prompt_tokens
+            stats.cached_tokens = cached_prompt_tokens(usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def render_stream(deltas, placeholder, stats=None, started_at=None):
+    """Escreve os deltas no placeholder em lotes e devolve (texto_final, stats).
+
+    `started_at` deve ser o instante (time.perf_counter) em que a requisição foi
+    enviada, para que o TTFT inclua o tempo de espera pela API.
+    """
+    stats = stats or TurnStats()
+    started_at = started_at or time.perf_counter()
+    text = ""
+    pending = []
+    pending_chars = 0
+    last_flush = started_at
+
+    for delta in deltas:
+        now = time.perf_counter()
+        if stats.ttft is None:
+            stats.ttft = now - started_at
+        stats.chunks += 1
+        pending.append(delta)
+        pending_chars += len(delta)
+        if pending_chars >= FLUSH_MIN_CHARS or now - last_flush >= FLUSH_INTERVAL:
+            text += "".join(pending)
+            pending.clear()
+            pending_chars = 0
+            placeholder.markdown(text + CURSOR)
+            stats.flushes += 1
+            last_flush = now
+
+    text += "".join(pending)
+    placeholder.markdown(text)
+    stats.flushes += 1
+    stats.total = time.perf_counter() - started_at
+    if not stats.completion_tokens:
+        # Sem uso informado pela API: cada chunk da Groq corresponde a ~1 token
+        stats.completion_tokens = stats.chunks
+    return text, stats
@@ -0,0 +1,94 @@
+"""Resumo contínuo dos turnos antigos para manter o tamanho do prompt estável.
+
+Quando o histórico ainda não resumido passa de SUMMARY_THRESHOLD tokens, os turnos
+mais antigos são incorporados ao resumo existente em uma thread de fundo (a resposta
+ao usuário não espera por isso). O resumo só é atualizado de forma incremental:
+o modelo recebe o resumo anterior e apenas as mensagens novas a incorporar.
+
+A chamada passa pelo pipeline (isa/pipeline.py) como qualquer outra: conta no limite
+de taxa do processo e tem o mesmo prazo, novas tentativas e circuit breaker.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from isa.context import message_tokens
+from isa.pipeline import complete_chat
+
+# Tokens de histórico não resumido que disparam um novo resumo
+SUMMARY_THRESHOLD = int(os.getenv("ISA_SUMMARY_THRESHOLD", "3000"))
+# Quantidade de turnos (pergunta + resposta) incorporados ao resumo de cada vez
+SUMMARY_CHUNK_TURNS = 4
+# Mensagens mais recentes que nunca entram no resumo
+KEEP_RECENT_MESSAGES = 4
+SUMMARY_MAX_TOKENS = 512
+
+SUMMARY_INSTRUCTIONS = """Você mantém o resumo de uma conversa entre um usuário e a assistente ISA AI.
+Atualize o resumo atual incorporando as novas mensagens. Preserve fatos, decisões, nomes,
+trechos de código importantes e perguntas em aberto. Seja conciso (no máximo 250 palavras)
+e responda apenas com o novo resumo, em português."""
+
+# Poucas threads bastam: o resumo é raro e não bloqueia a interface
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="isa-resumo")
+
+
+@dataclass
+class ConversationSummary:
+    """Resumo dos primeiros `covered` itens do histórico."""
+    text: str = ""
+    covered: int = 0
+
+    def as_message(self):
+        return {"role": "system", "content": f"Resumo da conversa até aqui:\n{self.text}"}
+
+
+def pending_tokens(history, summary):
+    return sum(message_tokens(m) for m in history[summary.covered:])
+
+
+def next_chunk(history, summary, threshold=SUMMARY_THRESHOLD):
+    """Mensagens que devem entrar no resumo agora (ou None, se ainda não é hora)."""
+    if pending_tokens(history, summary) <= threshold:
+        return None
+    end = min(summary.covered + SUMMARY_CHUNK_TURNS * 2, len(history) - KEEP_RECENT_MESSAGES)
+    if end <= summary.covered:
+        return None
+    return history[summary.covered:end]
+
+
+def _summarize(api_key, model, previous, chunk):
+    transcript = "\n\n".join(f"[{m['role']}] {m['content']}" for m in chunk)
+    completion = complete_chat(
+        api_key,
+        model=model,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": f"Resumo atual:\n{previous.text or '(vazio)'}\n\nNovas mensagens:\n{transcript}"},
+        ],
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    text = completion.choices[0].message.content.strip()
+    return ConversationSummary(text=text, covered=previous.covered + len(chunk))
+
+
+def submit_summary(api_key, model, history, summary):
+    """Agenda a atualização do resumo em segundo plano; devolve um Future ou None."""
+    chunk = next_chunk(history, summary)
+    if not chunk:
+        return None
+    return _EXECUTOR.submit(_summarize, api_key, model, summary, list(chunk))
+
+
+def collect_summary(future, current):
+    """Resumo atualizado se o Future já terminou; caso contrário, o resumo atual."""
+    if future is None or not future.done():
+        return current, future
+    try:
+        updated = future.result()
+    except Exception:
+        # Falha no resumo não afeta o chat: tenta de novo no próximo turno
+        return current, None
+    if updated.covered <= current.covered:
+        return current, None
+    return updated, None
@@ -0,0 +1,415 @@
+"""Temas da interface: cada paleta vira uma folha de estilo minificada uma única vez.
+
+A folha de estilo é instalada no <head> da página e só é reenviada quando o tema da
+sessão muda (ou quando a execução que a enviou foi interrompida); nos demais reruns
+nenhum CSS trafega pelo websocket.
+"""
+import inspect
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+# "head": instala o CSS no <head> só quando o tema muda (padrão).
+# "inline": reenvia o CSS já compilado em todo rerun, via st.markdown.
+CSS_MODE = os.getenv("ISA_CSS_MODE", "head")
+# Arquivo JSON opcional com paletas extras: {"nome": {"bg_main": "#...", ...}}
+CUSTOM_THEMES_FILE = os.getenv("ISA_CUSTOM_THEMES")
+# Tema inicial das sessões ('dark', 'light' ou uma paleta extra)
+DEFAULT_THEME = os.getenv("ISA_DEFAULT_THEME", "dark")
+
+_HTML_RUNS_JAVASCRIPT = hasattr(st, "html") and "unsafe_allow_javascript" in inspect.signature(st.html).parameters
+
+
+@dataclass(frozen=True)
+class Palette:
+    """Cores de um tema."""
+    bg_main: str
+    bg_gradient_end: str
+    bg_secondary: str
+    bg_widget: str
+    text: str
+    accent: str
+    shadow: str
+    heading: str
+    heading_shadow_priority: str
+    border: str
+    hr: str
+
+
+# Cor Neon e sombra Neon (comuns aos dois temas padrão)
+COLOR_ACCENT = '#00ffb3'
+COLOR_SHADOW = 'rgba(0, 255, 179, 0.3)'
+
+PALETTES = {
+    # Tema escuro: texto BRANCO/NEON, bordas e títulos em neon
+    'dark': Palette(
+        bg_main='#0c121e',
+        bg_gradient_end='#1e293b',
+        bg_secondary='#111827',
+        bg_widget='#1e293b',
+        text='#e2e8f0',
+        accent=COLOR_ACCENT,
+        shadow=COLOR_SHADOW,
+        heading=COLOR_ACCENT,
+        heading_shadow_priority='!important',
+        border=COLOR_ACCENT,
+        hr=COLOR_ACCENT,
+    ),
+    # Tema claro: texto PRETO/CINZA ESCURO, bordas e linhas em cinza
+    'light': Palette(
+        bg_main='#f1f5f9',
+        bg_gradient_end='#e2e8f0',
+        bg_secondary='#ffffff',
+        bg_widget='#f8fafc',
+        text='#1e293b',
+        accent=COLOR_ACCENT,
+        shadow=COLOR_SHADOW,
+        heading='#1e293b',
+        heading_shadow_priority='',
+        border='#94a3b8',
+        hr='#94a3b8',
+    ),
+}
+
+
+def _stylesheet(p):
+    """CSS completo do tema (sem minificar)."""
+    return f"""
+    /* Estilo do corpo, Main, e App */
+    body, .main, .stApp {{
+        /* Fundo principal usa o BG_MAIN */
+        background: linear-gradient(145deg, {p.bg_main}, {p.bg_gradient_end}) !important;
+        color: {p.text};
+        font-family: 'Segoe UI', sans-serif;
+    }}
+    
+    /* Títulos e Elementos Neon */
+    h1, h2, h3, .stMarkdown h1, section[data-testid="stSidebar"] h1, section[data-testid="stSidebar"] h2, section[data-testid="stSidebar"] h3 {{
+        color: {p.heading} !important;
+        text-shadow: 0 0 15px {p.accent} {p.heading_shadow_priority};
+        font-weight: 700;
+    }}
+    
+    /* Sidebar */
+    section[data-testid="stSidebar"] {{
+        background-color: {p.bg_secondary};
+        border-right: 2px solid {p.accent};
+        box-shadow: 0 0 10px {p.shadow};
+    }}
+    
+    /* CORREÇÃO FINAL DE TEXTO: AGRESSIVIDADE MÁXIMA PARA A SIDEBAR */
+    section[data-testid="stSidebar"] * {{
+        color: {p.text} !important; 
+    }}
+
+    /* Seletor para o texto do Main (chat, markdown geral) */
+    .stMarkdown, 
+    .stMarkdown p, 
+    .stMarkdown li {{
+        color: {p.text} !important; 
+    }}
+
+    /* EXCEÇÃO: Mantém as cores do status da API (verde/vermelho) */
+    p[style*='color: #00ffb3'] {{
+        color: #00ffb3 !important;
+    }}
+    p[style*='color: #ff4b4b'] {{
+        color: #ff4b4b !important;
+    }}
+
+    /* --- LINHAS SEPARADORAS (HR) --- */
+    hr {{
+        border-top: 1px solid {p.hr} !important;
+        margin: 1rem 0 !important;
+    }}
+
+
+    /* --- PADRONIZAÇÃO DE FUNDO DOS WIDGETS E CHAT/CÓDIGO --- */
+
+    /* Fundo do Input do Chat */
+    div[data-testid="stForm"] > div > div {{
+        background-color: {p.bg_widget} !important;
+        border: 1px solid {p.border};
+        border-radius: 10px;
+    }}
+    
+    /* Fundo do ALERTA (st.info, st.warning etc.) */
+    div[data-testid^="stAlert"] {{
+        background-color: {p.bg_widget} !important; 
+        border: 1px solid {p.border};
+        color: {p.text} !important; /* CORRIGINDO A COR DO TEXTO AQUI */
+    }}
+    /* Garante que o texto dentro do alerta também siga a cor */
+    div[data-testid^="stAlert"] * {{
+        color: {p.text} !important; 
+    }}
+
+
+    /* Fundo dos Balões de Chat (user e assistant) */
+    div[data-testid="stChatMessage"] {{
+        background-color: {p.bg_widget} !important; 
+    }}
+
+    /* Balão de chat do usuário */
+    div[data-testid="stChatMessage"]:nth-child(even) {{
+        background-color: {p.bg_widget} !important; 
+    }}
+
+    /* Balão de chat do assistente */
+    div[data-testid="stChatMessage"]:nth-child(odd) {{
+        background-color: {p.bg_widget} !important; 
+    }}
+    
+    /* Garante que o texto do balão também use a cor padrão */
+    div[data-testid="stChatMessage"] div.stMarkdown, 
+    div[data-testid="stChatMessage"] .stMarkdown p, 
+    div[data-testid="stChatMessage"] .stMarkdown li {{
+        color: {p.text} !important; 
+    }}
+    
+    /* Fundo dos Widgets de Input na Sidebar (Slider, Selectbox, TextInput) */
+    div[data-testid^="st"] > div > div > div[data-baseweb="input"],
+    div[data-testid^="st"] > div > div > div[data-baseweb="select"],
+    div[data-testid^="st"] > div > div > div[data-baseweb="slider"],
+    section[data-testid="stSidebar"] div[data-testid="stTextInput"] > div > div,
+    section[data-testid="stSidebar"] div[data-testid="stSelectbox"] > div > div,
+    section[data-testid="stSidebar"] div[data-testid="stSlider"] > div > div {{
+        background-color: {p.bg_widget} !important;
+        color: {p.text} !important; 
+    }}
+
+    /* Fundo do código (bloco de código no markdown <pre>) */
+    pre, div[data-testid="stCodeBlock"] {{
+        background-color: {p.bg_widget} !important;
+        border: 1px solid {p.border};
+        border-radius: 6px;
+    }}
+
+    /* Fundo do componente de UPLOAD de arquivo (Caixa de arquivo) */
+    section[data-testid="stFileUploaderDropzone"] {{
+        background-color: {p.bg_widget} !important; 
+        border: 2px dashed {p.border};
+        border-radius: 6px;
+    }}
+    
+    /* O botão 'Browse files' dentro do File Uploader */
+    section[data-testid="stFileUploaderDropzone"] button {{
+        background-color: {p.bg_widget} !important; 
+        color: {p.text} !important;
+        border: 1px solid {p.border};
+    }}
+    section[data-testid="stFileUploaderDropzone"] button:hover {{
+        background-color: {p.accent} !important;
+        color: {p.bg_main} !important;
+    }}
+    
+    /* Cores do scrollbar */
+    ::-webkit-scrollbar {{
+        width: 8px;
+    }}
+    ::-webkit-scrollbar-thumb {{
+        background: {p.accent};
+        border-radius: 10px;
+    }}
+    
+    /* Estilo dos botões de sugestão (Main) */
+    .stButton>button {{
+        color: {p.accent} !important;
+        border-color: {p.accent} !important;
+        background-color: {p.bg_main} !important;
+        border-radius: 20px;
+        padding: 5px 15px;
+        margin: 5px;
+        transition: all 0.2s;
+        white-space: normal; 
+        line-height: 1.2;
+        height: auto; 
+    }}
+    .stButton>button:hover {{
+        background-color: {p.accent} !important;
+        color: {p.bg_main} !important;
+        box-shadow: 0 0 10px {p.accent};
+    }}
+
+    /* CORREÇÃO DOS BOTÕES NA SIDEBAR (Tema, Limpar Histórico) */
+    div[data-testid="stSidebar"] .stButton > button {{
+        background-color: {p.bg_secondary} !important;
+        color: {p.text} !important; 
+        border-color: {p.border} !important;
+    }}
+    div[data-testid="stSidebar"] .stButton > button:hover {{
+        background-color: {p.accent} !important;
+        color: {p.bg_main} !important;
+    }}
+    
+    /* CORREÇÃO VISUAL DO TRECHO "Modelo em Uso" E BOTÃO SUPORTE */
+    /* Garante que todo texto da sidebar use COLOR_TEXT */
+    section[data-testid="stSidebar"] p,
+    section[data-testid="stSidebar"] span,
+    section[data-testid="stSidebar"] div {{
+        color: {p.text} !important;
+    }}
+
+    /* Corrigir o bloco de código inline (o nome do modelo) */
+    section[data-testid="stSidebar"] code {{
+        background-color: {p.bg_widget} !important;
+        color: {p.text} !important;
+        border: 1px solid {p.border};
+        border-radius: 4px;
+        padding: 2px 4px;
+        font-weight: bold;
+    }}
+
+    /* Botão "E-mail Para o Suporte" (Link Button) */
+    section[data-testid="stSidebar"] a, 
+    section[data-testid="stSidebar"] .st-link-button {{
+        /* Cor do Texto do Link */
+        color: {p.text} !important; 
+        /* Cor de Fundo do Botão de Link */
+        background-color: {p.bg_widget} !important;
+        /* Cor da Borda do Botão de Link */
+        border: 1px solid {p.border} !important;
+    }}
+
+    /* Outras configurações (rodapé, etc.) */
+    footer, div[role="contentinfo"] {{
+        display: none;
+    }}
+    /* Otimização: remove a animação de digitação do H1 (causa problemas de layout) */
+    .typing {{
+        border-right: none;
+        white-space: normal;
+        overflow: visible;
+        animation: none;
+    }}
+    """ + ICON_CSS
+
+
+# Ícone animado da ISA (canto superior direito); igual em todos os temas
+ICON_CSS = """
+    .isa-icon {
+        position: fixed;
+        top: 20px;
+        right: 40px;
+        font-size: 35px;
+        color: #00ffb3;
+        animation: pulse 2s infinite;
+        z-index: 999;
+    }
+    @keyframes pulse {
+        0% { text-shadow: 0 0 5px #00ffb3; }
+        50% { text-shadow: 0 0 20px #00ffb3; transform: scale(1.1); }
+        100% { text-shadow: 0 0 5px #00ffb3; transform: scale(1); }
+    }
+"""
+ICON_HTML = '<div class="isa-icon">🤖</div>'
+
+# Comentários e strings entre aspas (que podem conter aspas, ':' ou ',' e ficam intactas)
+_TOKENS_RE = re.compile(r"""(/\*.*?\*/|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""", re.S)
+_SPACES_RE = re.compile(r"\s+")
+_PUNCTUATION_RE = re.compile(r"\s*([{};:,>])\s*")
+
+
+def _minify_code(css):
+    css = _SPACES_RE.sub(" ", css)
+    css = _PUNCTUATION_RE.sub(r"\1", css)
+    return css.replace(";}", "}")
+
+
+def minify(css):
+    """Remove comentários e espaços desnecessários (fora das strings entre aspas)."""
+    parts, code = [], []
+    for position, token in enumerate(_TOKENS_RE.split(css)):
+        if position % 2 == 0:
+            code.append(token)
+        elif token.startswith("/*"):
+            # Um comentário vale como espaço (ex.: entre dois seletores)
+            code.append(" ")
+        else:
+            parts += [_minify_code("".join(code)), token]
+            code = []
+    parts.append(_minify_code("".join(code)))
+    return "".join(parts).strip()
+
+
+def register_palette(name, palette):
+    """Inclui (ou substitui) uma paleta; a folha de estilo é compilada no primeiro uso."""
+    PALETTES[name] = palette
+    COMPILED_CSS.pop(name, None)
+
+
+def compiled_css(theme):
+    """Folha de estilo minificada do tema (compilada uma vez por processo)."""
+    css = COMPILED_CSS.get(theme)
+    if css is None:
+        palette = PALETTES.get(theme) or PALETTES['dark']
+        css = COMPILED_CSS[theme if theme in PALETTES else 'dark'] = minify(_stylesheet(palette))
+    return css
+
+
+def compile_all():
+    """Compila as folhas de estilo que faltam (aquecimento, fora da primeira execução)."""
+    for name in list(PALETTES):
+        compiled_css(name)
+
+
+def _load_custom_palettes():
+    if not CUSTOM_THEMES_FILE:
+        return
+    with open(CUSTOM_THEMES_FILE, encoding="utf-8") as f:
+        for name, colors in json.load(f).items():
+            # Cores omitidas herdam do tema escuro
+            register_palette(name, Palette(**{**PALETTES['dark'].__dict__, **colors}))
+
+
+# Compilado uma vez por processo: o tema padrão na primeira execução, os demais no aquecimento
+COMPILED_CSS = {}
+_load_custom_palettes()
+
+
+def _install_in_head_script(css):
+    payload = json.dumps(css).replace("</", "<\\/")
+    return f"""<script>
+const doc = window.parent.document;
+let style = doc.getElementById("isa-theme-css");
+if (!style) {{
+    style = doc.createElement("style");
+    style.id = "isa-theme-css";
+    doc.head.appendChild(style);
+}}
+style.textContent = {payload};
+</script>"""
+
+
+def _run_script(html):
+    # Versões novas do Streamlit executam o script direto na página (sem iframe);
+    # nas antigas, o iframe de components.html acessa a página por window.parent
+    if _HTML_RUNS_JAVASCRIPT:
+        st.html(html, unsafe_allow_javascript=True)
+    else:
+        components.html(html, height=0)
+
+
+def apply_theme(theme):
+    """Aplica o tema da sessão, reenviando o CSS apenas quando ele muda."""
+    css = compiled_css(theme)
+    if CSS_MODE == "inline":
+        st.markdown(f"<style>{css}</style>{ICON_HTML}", unsafe_allow_html=True)
+        return
+    if st.session_state.get('injected_theme') != theme:
+        _run_script(_install_in_head_script(css))
+        # Só conta como instalado quando a execução chega ao fim (confirm_theme): se ela for
+        # interrompida por um st.rerun(), o elemento pode sumir antes de rodar no navegador
+        st.session_state.pending_theme = theme
+    st.markdown(ICON_HTML, unsafe_allow_html=True)
+
+
+def confirm_theme():
+    """Chamado no fim do script: o CSS enviado nesta execução ficou na página."""
+    pending = st.session_state.pop('pending_theme', None)
+    if pending is not None:
+        st.session_state.injected_theme = pending
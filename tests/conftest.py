@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+
+# Antes de importar o pacote: os módulos leem o diretório de dados na importação
+os.environ.setdefault("ISA_DATA_DIR", tempfile.mkdtemp(prefix="isa-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    """SessionStore com um SQLite próprio do teste (o flusher de fundo não é iniciado antes do primeiro append)."""
+    from isa.session_store import SessionStore, SqliteHistoryStore
+
+    return SessionStore(SqliteHistoryStore(str(tmp_path / "historico.sqlite3")), flush_interval=3600)
+
+
+class FakeBackend:
+    """API de mentira para o pipeline: responde "olá mundo" ou o erro programado."""
+
+    def __init__(self):
+        self.calls = []
+        # (api_key, modelo) ou modelo -> erros a levantar, um por chamada
+        self.errors = {}
+        # modelo -> segundos até o primeiro chunk
+        self.delays = {}
+
+    def client(self, api_key):
+        from types import SimpleNamespace
+
+        async def create(model, stream=False, **params):
+            import asyncio
+
+            self.calls.append((api_key, model))
+            errors = self.errors.get((api_key, model)) or self.errors.get(model)
+            if errors:
+                raise errors.pop(0)
+            await asyncio.sleep(self.delays.get(model, 0))
+            if not stream:
+                return SimpleNamespace(content=f"resposta de {model}")
+
+            async def chunks():
+                for word in ("olá", " mundo"):
+                    yield word
+
+            return chunks()
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Pipeline próprio do teste (no lugar do global), com a FakeBackend e backoff curto."""
+    from isa import pipeline as module
+    from isa.client_pool import ClientPool
+
+    backend = FakeBackend()
+    instance = module._Pipeline()
+    instance.backend = backend
+    instance.clients = ClientPool(factory=backend.client, closer=lambda client: None)
+    monkeypatch.setattr(module, "_PIPELINE", instance)
+    monkeypatch.setattr(module, "BACKOFF_BASE", 0.001)
+    yield instance
+    instance.loop.call_soon_threadsafe(instance.loop.stop)
+
+
+@pytest.fixture
+def api_error():
+    """Fábrica de erros do SDK da Groq pelo status HTTP."""
+    import groq
+    import httpx
+
+    def make(status, headers=None):
+        request = httpx.Request("POST", "http://teste/openai/v1/chat/completions")
+        response = httpx.Response(status, headers=headers, request=request)
+        cls = {401: groq.AuthenticationError, 404: groq.NotFoundError, 429: groq.RateLimitError}.get(status)
+        cls = cls or (groq.InternalServerError if status >= 500 else groq.APIStatusError)
+        return cls(f"erro {status}", response=response, body=None)
+
+    return make
@@ -0,0 +1,48 @@
+import gzip
+import json
+
+import pytest
+
+from isa import archive
+from isa.archive import export_conversations, import_archive, read_archive
+
+
+def gzip_frames(monkeypatch):
+    # Resultado igual com ou sem o pacote zstandard instalado
+    monkeypatch.setattr(archive, "zstandard", None)
+
+
+def test_jsonl_round_trip(monkeypatch):
+    gzip_frames(monkeypatch)
+    messages = [{"role": "user", "content": "olá"}, {"role": "assistant", "content": "oi!"}]
+    data = export_conversations([("a", messages, {"text": "resumo", "covered": 2}), ("b", messages[:1], None)])
+    assert read_archive(data) == {"a": (messages, {"text": "resumo", "covered": 2}), "b": (messages[:1], None)}
+
+
+def test_decompression_is_capped(monkeypatch):
+    monkeypatch.setattr(archive, "MAX_IMPORT_BYTES", 1024 * 1024)
+    bomb = gzip.compress(b" " * (4 * 1024 * 1024))
+    with pytest.raises(ValueError, match="descompactado"):
+        read_archive(bomb)
+
+
+@pytest.mark.parametrize("content", [None, 5, ["lista"], {"texto": "x"}])
+def test_rejects_non_string_content(content):
+    line = json.dumps({"conversation": "a", "seq": 0, "role": "user", "content": content})
+    with pytest.raises(ValueError):
+        read_archive(line.encode("utf-8"))
+
+
+def test_rejects_invalid_plain_json_history():
+    with pytest.raises(ValueError):
+        read_archive(json.dumps([{"role": "user", "content": 1}]).encode("utf-8"))
+    with pytest.raises(ValueError):
+        read_archive(b'["texto solto"]')
+
+
+def test_import_writes_new_conversations(monkeypatch, store):
+    gzip_frames(monkeypatch)
+    messages = [{"role": "user", "content": "pergunta"}, {"role": "assistant", "content": "resposta"}]
+    imported = import_archive(export_conversations([("a", messages, None)]), store=store)
+    assert len(imported) == 1 and imported[0][1] == 2
+    assert store.load(imported[0][0])[0] == messages
@@ -0,0 +1,45 @@
+from isa.client_pool import ClientPool
+
+
+class FakeClient:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_reuses_client_per_key():
+    pool = ClientPool(FakeClient, max_size=2)
+    assert pool.get("a") is pool.get("a")
+    assert pool.stats()["misses"] == 1 and pool.stats()["hits"] == 1
+
+
+def test_evicted_idle_client_is_closed():
+    pool = ClientPool(FakeClient, max_size=1)
+    first = pool.get("a")
+    pool.get("b")
+    assert first.closed
+    assert pool.stats()["evictions"] == 1
+
+
+def test_evicted_client_in_use_closes_after_last_lease():
+    pool = ClientPool(FakeClient, max_size=1)
+    with pool.lease("a") as client:
+        with pool.lease("a"):
+            pool.get("b")
+            assert not client.closed
+        assert not client.closed
+        assert pool.stats()["retired"] == 1
+    assert client.closed
+    assert pool.stats()["retired"] == 0
+
+
+def test_discard_waits_for_lease():
+    pool = ClientPool(FakeClient)
+    with pool.lease("a") as client:
+        pool.discard("a")
+        assert not client.closed
+        assert pool.get("a") is not client
+    assert client.closed
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from isa.pipeline import FirstTokenTimeoutError, complete_chat, stream_chat
+
+PARAMS = {"model": "m", "messages": [{"role": "user", "content": "oi"}], "max_tokens": 16}
+
+
+def test_identical_streams_share_one_request(pipeline):
+    pipeline.backend.delays["m"] = 0.2
+    leader = stream_chat("chave", **PARAMS)
+    follower = stream_chat("chave", **PARAMS)
+    assert follower.shared and not leader.shared
+    assert "".join(leader.chunks()) == "".join(follower.chunks()) == "olá mundo"
+    assert len(pipeline.backend.calls) == 1
+    assert pipeline.inflight.stats()["coalesced"] == 1
+
+
+def test_api_key_is_part_of_the_key(pipeline):
+    pipeline.backend.delays["m"] = 0.2
+    first = stream_chat("chave-a", **PARAMS)
+    second = stream_chat("chave-b", **PARAMS)
+    assert not second.shared
+    assert "".join(first.chunks()) == "".join(second.chunks()) == "olá mundo"
+    assert sorted(key for key, _ in pipeline.backend.calls) == ["chave-a", "chave-b"]
+
+
+def test_different_params_are_not_coalesced(pipeline):
+    pipeline.backend.delays["m"] = 0.2
+    first = stream_chat("chave", **PARAMS)
+    second = stream_chat("chave", **{**PARAMS, "max_tokens": 32})
+    assert not second.shared
+    assert "".join(first.chunks()) == "".join(second.chunks()) == "olá mundo"
+    assert len(pipeline.backend.calls) == 2
+
+
+def test_followers_are_released_when_the_leader_is_cancelled(pipeline):
+    pipeline.backend.delays["m"] = 5
+    leader = stream_chat("chave", **PARAMS)
+    follower = stream_chat("chave", **PARAMS)
+    with pytest.raises(FirstTokenTimeoutError):
+        leader.wait_first_event(0.05)
+    # O seguidor recebe o erro do cancelamento (e não o próprio prazo de 2 s)
+    with pytest.raises(FirstTokenTimeoutError, match="cancelado"):
+        follower.wait_first_event(2)
+    with pytest.raises(FirstTokenTimeoutError):
+        list(follower.chunks())
+
+    # O pedido cancelado sai do grupo: um igual depois vai de novo à API
+    pipeline.backend.delays["m"] = 0
+    retry = stream_chat("chave", **PARAMS)
+    assert not retry.shared
+    assert "".join(retry.chunks()) == "olá mundo"
+
+
+def test_identical_completions_share_one_request(pipeline):
+    pipeline.backend.delays["m"] = 0.2
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda _: complete_chat("chave", **PARAMS), range(3)))
+    assert [result.content for result in results] == ["resposta de m"] * 3
+    assert len(pipeline.backend.calls) == 1
+
+
+def test_completions_of_different_keys_are_separate(pipeline):
+    pipeline.backend.delays["m"] = 0.2
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda key: complete_chat(key, **PARAMS), ["chave-a", "chave-b"]))
+    assert sorted(key for key, _ in pipeline.backend.calls) == ["chave-a", "chave-b"]
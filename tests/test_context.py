@@ -0,0 +1,44 @@
+from isa import context
+from isa.context import MIN_PROMPT_BUDGET, build_context, context_budget, count_tokens
+
+
+def test_budget_reserves_room_for_the_prompt():
+    assert context_budget("llama-3.1-8b-instant", 2048, 8192) == 6144
+    # A resposta ocupa o orçamento inteiro: o prompt ainda tem o mínimo
+    assert context_budget("llama-3.1-8b-instant", 4096, 4096) == MIN_PROMPT_BUDGET
+
+
+def test_history_window_keeps_recent_messages():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": "x" * 350} for i in range(10)]
+    messages, report = build_context("sistema", history, "pergunta", budget=500)
+    assert report.kept_messages == len(messages) - 2
+    assert 0 < report.kept_messages < len(history)
+    assert messages[1]["role"] == "user"
+    assert not report.history_dropped
+
+
+def test_report_flags_dropped_history():
+    history = [{"role": "user", "content": "x" * 3500}, {"role": "assistant", "content": "ok"}]
+    _, report = build_context("sistema", history, "pergunta", budget=100)
+    assert report.history_dropped
+
+
+def test_count_tokens_caches_by_hash(monkeypatch):
+    calls = []
+
+    class Encoding:
+        def encode(self, text, disallowed_special=()):
+            calls.append(len(text))
+            return text.split()
+
+    monkeypatch.setattr(context, "_ENCODING", Encoding())
+    monkeypatch.setattr(context, "_TOKEN_CACHE", type(context._TOKEN_CACHE)())
+    monkeypatch.setattr(context, "TOKEN_CACHE_SIZE", 2)
+    text = "uma frase longa " * 1000
+    assert count_tokens(text) == count_tokens(text) == 3000
+    assert len(calls) == 1
+    # O cache guarda só o hash, e respeita o limite de entradas
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in context._TOKEN_CACHE)
+    count_tokens("a")
+    count_tokens("b")
+    assert len(context._TOKEN_CACHE) == 2
@@ -0,0 +1,95 @@
+import codecs
+import hashlib
+
+import pytest
+
+from isa.ingest import detect_encoding, looks_western, memoryview_blocks, read_text
+
+PORTUGUES = "Olá, ação, coração\n" * 10
+
+
+def test_memoryview_blocks_cover_the_buffer():
+    data = bytes(range(256)) * 10
+    blocks = list(memoryview_blocks(data, size=100))
+    assert all(isinstance(block, memoryview) for block in blocks)
+    assert b"".join(blocks) == data
+
+
+@pytest.mark.parametrize("bom, encoding", [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+])
+def test_detect_encoding_by_bom(bom, encoding):
+    assert detect_encoding(bom + b"abc") == encoding
+
+
+def test_detect_encoding_utf8_with_character_cut_at_the_end():
+    sample = "coração".encode("utf-8")[:-1]
+    assert detect_encoding(sample) == "utf-8"
+
+
+def test_detect_encoding_portuguese_cp1252():
+    # O detector sozinho escolhe cp1250 e o texto vira "açăo"
+    assert detect_encoding(PORTUGUES.encode("cp1252")) == "cp1252"
+
+
+def test_detect_encoding_windows_punctuation_cp1252():
+    sample = 'def conexão():\n    # “aspas” — € e função\n    return "não"\n'.encode("cp1252") * 5
+    assert detect_encoding(sample) == "cp1252"
+
+
+def test_detect_encoding_keeps_other_codepages():
+    pytest.importorskip("charset_normalizer")
+    assert detect_encoding(("Привет, как дела? Это тестовый файл.\n" * 10).encode("cp1251")) == "cp1251"
+    assert detect_encoding(("Zażółć gęślą jaźń, świętość.\n" * 10).encode("cp1250")) == "cp1250"
+
+
+def test_looks_western():
+    assert looks_western(PORTUGUES)
+    assert looks_western("only ascii")
+    assert not looks_western("Ïðèâåò, êàê äåëà?")
+    assert not looks_western("Za¿ó³æ gêœl¹ jaŸñ")
+
+
+def test_read_text_portuguese_cp1252_across_blocks():
+    data = PORTUGUES.encode("cp1252")
+    result = read_text(memoryview_blocks(data, size=7), "notas.txt")
+    assert result.encoding == "cp1252"
+    assert result.text == PORTUGUES
+    assert result.digest == hashlib.sha256(data).hexdigest()
+    assert result.total_bytes == len(data)
+    assert not result.truncated
+
+
+def test_read_text_utf8_split_inside_a_character():
+    text = "ção" * 1000
+    data = text.encode("utf-8")
+    # Blocos de tamanho ímpar cortam os caracteres de 2 bytes ao meio
+    result = read_text(memoryview_blocks(data, size=3), "a.txt")
+    assert result.text == text
+    assert result.encoding == "utf-8"
+
+
+def test_read_text_keeps_head_tail_and_outline_of_large_files():
+    lines = [f"def funcao_{i}(x):\n    return x + {i}\n" for i in range(2000)]
+    data = "".join(lines).encode("utf-8")
+    result = read_text(memoryview_blocks(data, size=1024), "modulo.py", max_tokens=1000)
+    assert result.truncated
+    assert result.omitted_lines > 0
+    assert len(result.text) < 1000 * 4
+    assert result.text.startswith("def funcao_0(x):\n")
+    assert result.text.endswith("def funcao_1999(x):\n    return x + 1999\n")
+    assert f"{result.omitted_lines} linhas omitidas" in result.text
+    # A estrutura do trecho omitido lista as definições com o número da linha
+    assert "[Estrutura do trecho omitido]" in result.text
+    assert ": def funcao_" in result.text.split("[Estrutura do trecho omitido]")[1]
+
+
+def test_read_text_stops_at_max_bytes():
+    data = b"linha\n" * 1000
+    result = read_text(memoryview_blocks(data, size=100), "a.txt", max_bytes=1000)
+    assert result.total_bytes == 1000
+    assert result.truncated
+    assert "leitura interrompida" in result.text
+    assert result.digest == hashlib.sha256(data[:1000]).hexdigest()
@@ -0,0 +1,118 @@
+import base64
+import json
+
+from isa.persistence import (
+    CODEC_ZLIB,
+    ID_PARAM,
+    URL_PARAM,
+    HistoryPersistence,
+    decode_url_history,
+)
+from isa.summarizer import ConversationSummary
+
+
+def conversation(count, start=0):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"mensagem {i} com acentuação"}
+        for i in range(start, start + count)
+    ]
+
+
+def url_persistence(store):
+    persistence = HistoryPersistence(store=store, storage="url")
+    # Resultado igual com ou sem o pacote zstandard instalado
+    persistence.codec = CODEC_ZLIB
+    persistence._reset_state()
+    return persistence
+
+
+def test_url_envelope_round_trip(store):
+    params = {}
+    persistence = url_persistence(store)
+    messages = conversation(4)
+    persistence.save(messages[:2], params)
+    persistence.save(messages, params, ConversationSummary("resumo", 2))
+    assert ID_PARAM not in params
+    assert decode_url_history(params[URL_PARAM]) == (messages, {"text": "resumo", "covered": 2})
+
+
+def test_url_save_only_appends_new_messages(store):
+    params = {}
+    persistence = url_persistence(store)
+    persistence.save(conversation(2), params)
+    first = base64.urlsafe_b64decode(params[URL_PARAM] + "==")
+    persistence.save(conversation(4), params)
+    second = base64.urlsafe_b64decode(params[URL_PARAM] + "==")
+    assert second.startswith(first)
+
+
+def test_legacy_url_history_is_decoded():
+    messages = conversation(2)
+    value = base64.b64encode(json.dumps(messages).encode("utf-8")).decode("ascii")
+    assert decode_url_history(value) == (messages, None)
+
+
+def test_reloaded_url_link_keeps_the_summary(store):
+    params = {}
+    url_persistence(store).save(conversation(10), params, ConversationSummary("resumo", 6))
+
+    reloaded = url_persistence(store)
+    messages = reloaded.load(dict(params))
+    assert reloaded.summary == {"text": "resumo", "covered": 6}
+    reloaded_params = dict(params)
+    reloaded.save(messages + conversation(1, start=10), reloaded_params, ConversationSummary("resumo", 6))
+
+    messages, summary = decode_url_history(reloaded_params[URL_PARAM])
+    assert messages == conversation(11)
+    assert summary == {"text": "resumo", "covered": 6}
+
+
+def test_large_url_history_moves_to_the_store(store, monkeypatch):
+    monkeypatch.setattr("isa.persistence.URL_MAX_BYTES", 200)
+    params = {}
+    persistence = url_persistence(store)
+    messages = conversation(40)
+    persistence.save(messages, params, ConversationSummary("resumo", 10))
+    assert URL_PARAM not in params
+    assert persistence.mode == "store"
+    assert store.load(params[ID_PARAM]) == (messages, {"text": "resumo", "covered": 10})
+
+
+def test_store_mode_creates_the_id_on_first_save(store):
+    params = {}
+    persistence = HistoryPersistence(store=store, storage="store")
+    persistence.save([], params)
+    assert params == {}
+    persistence.save(conversation(2), params)
+    persistence.save(conversation(4), params)
+    assert store.load(params[ID_PARAM])[0] == conversation(4)
+
+    reloaded = HistoryPersistence(store=store, storage="store")
+    assert reloaded.load(dict(params)) == conversation(4)
+    assert reloaded.saved_count == 4
+
+
+def test_legacy_url_link_moves_to_the_store(store):
+    params = {}
+    url_persistence(store).save(conversation(3), params, ConversationSummary("resumo", 2))
+
+    persistence = HistoryPersistence(store=store, storage="store")
+    assert persistence.load(params) == conversation(3)
+    assert URL_PARAM not in params
+    assert store.load(params[ID_PARAM]) == (conversation(3), {"text": "resumo", "covered": 2})
+
+
+def test_shorter_history_replaces_the_saved_one(store):
+    params = {}
+    persistence = HistoryPersistence(store=store, storage="store")
+    persistence.save(conversation(4), params)
+    first_id = params[ID_PARAM]
+    persistence.save(conversation(1), params)
+    assert store.load(first_id) == ([], None)
+    assert store.load(params[ID_PARAM])[0] == conversation(1)
+
+
+def test_invalid_link_loads_an_empty_history(store):
+    persistence = HistoryPersistence(store=store, storage="url")
+    assert persistence.load({URL_PARAM: "não é base64"}) == []
+    assert persistence.saved_count == 0
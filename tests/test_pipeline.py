@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import groq
+import pytest
+
+from isa import pipeline as module
+from isa.pipeline import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ServiceBusyError,
+    TokenBucket,
+    backoff_delay,
+    is_model_failure,
+    is_retryable,
+    retry_after,
+)
+
+PARAMS = {"model": "m", "messages": [{"role": "user", "content": "oi"}]}
+
+
+def call(pipeline, api_key="chave", **kwargs):
+    return pipeline.submit(pipeline.call(api_key, dict(PARAMS), **kwargs)).result(timeout=10)
+
+
+def test_token_bucket_allows_burst_then_rejects_long_waits():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=2)
+        await bucket.acquire(0)
+        await bucket.acquire(0)
+        with pytest.raises(ServiceBusyError):
+            await bucket.acquire(0.01)
+        started = time.monotonic()
+        await bucket.acquire(1)
+        return time.monotonic() - started
+
+    # A terceira ficha espera o reabastecimento (1/10 s), sem consumir a recusada
+    assert 0.05 < asyncio.run(scenario()) < 0.5
+
+
+def test_circuit_breaker_opens_and_probes_once(monkeypatch):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.allow(0.01))
+
+    # Passado o cooldown: uma requisição de teste por vez
+    breaker.opened_at -= 30
+    assert breaker.state == "half-open"
+    asyncio.run(breaker.allow(0))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.allow(0))
+    # Resposta neutra (ex.: 429) libera o teste sem fechar nem reabrir o circuito
+    breaker.record_neutral()
+    asyncio.run(breaker.allow(0))
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_error_classification(api_error):
+    request = api_error(500).request
+    assert is_retryable(api_error(500)) and is_model_failure(api_error(500))
+    assert is_retryable(groq.APIConnectionError(request=request)) and is_model_failure(groq.APITimeoutError(request))
+    assert is_retryable(api_error(429)) and not is_model_failure(api_error(429))
+    assert not is_retryable(api_error(401)) and not is_model_failure(api_error(401))
+
+
+def test_retry_after_and_backoff(api_error, monkeypatch):
+    assert retry_after(api_error(429, {"retry-after": "3"})) == 3.0
+    assert retry_after(api_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(api_error(429, {"retry-after": "quando der"})) is None
+    assert retry_after(ValueError()) is None
+
+    monkeypatch.setattr(module, "BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(module, "BACKOFF_CAP", 4.0)
+    delays = [backoff_delay(10, ValueError()) for _ in range(200)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    # O retry-after do servidor é o mínimo
+    assert backoff_delay(1, api_error(429, {"retry-after": "7"})) >= 7.0
+
+
+def test_call_retries_server_errors(pipeline, api_error):
+    pipeline.backend.errors["m"] = [api_error(500), api_error(503)]
+    assert call(pipeline).content == "resposta de m"
+    assert len(pipeline.backend.calls) == 3
+    assert pipeline.retries == 2
+    assert pipeline.breaker("m", "chave").state == "closed"
+
+
+def test_call_gives_up_after_max_attempts(pipeline, api_error):
+    pipeline.backend.errors["m"] = [api_error(500) for _ in range(5)]
+    with pytest.raises(groq.InternalServerError):
+        call(pipeline, max_attempts=2)
+    assert len(pipeline.backend.calls) == 2
+
+
+def test_request_errors_are_not_retried_nor_counted(pipeline, api_error):
+    pipeline.backend.errors["m"] = [api_error(401)]
+    breaker = pipeline.breaker("m", "chave")
+    breaker.failures = 3
+    with pytest.raises(groq.AuthenticationError):
+        call(pipeline)
+    assert len(pipeline.backend.calls) == 1
+    # Nem falha nem sucesso: a contagem do circuito fica como estava
+    assert breaker.failures == 3
+
+
+def test_breakers_are_per_model_and_key(pipeline, api_error):
+    pipeline.breaker("m", "chave-a").threshold = 2
+    pipeline.backend.errors[("chave-a", "m")] = [api_error(500) for _ in range(2)]
+    with pytest.raises(groq.InternalServerError):
+        call(pipeline, "chave-a", max_attempts=2)
+    assert pipeline.breaker("m", "chave-a").state == "open"
+    assert pipeline.breaker("m", "chave-b").state == "closed"
+    assert call(pipeline, "chave-b").content == "resposta de m"
+
+
+def test_rate_limit_does_not_open_the_circuit(pipeline, api_error):
+    pipeline.breaker("m", "chave").threshold = 2
+    pipeline.backend.errors["m"] = [api_error(429, {"retry-after-ms": "1"}) for _ in range(3)]
+    assert call(pipeline).content == "resposta de m"
+    assert pipeline.breaker("m", "chave").failures == 0
+
+
+def test_rate_limit_is_per_key(pipeline, monkeypatch):
+    monkeypatch.setattr(module, "QUEUE_MAX_WAIT", 0.01)
+    pipeline.bucket("chave-a").tokens = 0
+    pipeline.bucket("chave-a").rate = 0.001
+    with pytest.raises(ServiceBusyError):
+        call(pipeline, "chave-a")
+    assert call(pipeline, "chave-b").content == "resposta de m"
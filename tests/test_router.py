@@ -0,0 +1,118 @@
+import pytest
+
+from isa import router as router_module
+from isa.pipeline import CircuitOpenError, FirstTokenTimeoutError, ServiceBusyError, stream_chat
+from isa.router import FIRST_TOKEN_P95_FACTOR, ModelRouter, RouteDecision
+
+PARAMS = {"messages": [{"role": "user", "content": "oi"}], "max_tokens": 16}
+
+
+def decision(*candidates):
+    return RouteDecision(model=candidates[0], candidates=candidates, reason="teste")
+
+
+def test_failover_to_the_next_candidate(api_error):
+    router = ModelRouter(pool=["a", "b"])
+    calls = []
+
+    def attempt(model, attempts, first_token_timeout):
+        calls.append((model, attempts, first_token_timeout))
+        if model == "a":
+            raise api_error(503)
+        return f"resposta de {model}"
+
+    chosen = decision("a", "b")
+    assert router.run(chosen, attempt) == "resposta de b"
+    assert (chosen.model, chosen.failed_over_from) == ("b", ("a",))
+    # O último candidato não tem prazo para o primeiro chunk nem limite de tentativas do failover
+    assert calls[0][1:] == (router_module.FAILOVER_ATTEMPTS, router.first_token_timeout("a"))
+    assert calls[1][1:] == (None, None)
+    assert router.health()["a"].error_rate == 1.0
+
+
+def test_last_candidate_error_is_raised(api_error):
+    router = ModelRouter(pool=["a", "b"])
+
+    def attempt(model, attempts, first_token_timeout):
+        raise api_error(500)
+
+    with pytest.raises(Exception, match="erro 500"):
+        router.run(decision("a", "b"), attempt)
+    assert router.health()["b"].samples == 1
+
+
+def test_request_errors_do_not_fail_over(api_error):
+    router = ModelRouter(pool=["a", "b"])
+    tried = []
+
+    def attempt(model, attempts, first_token_timeout):
+        tried.append(model)
+        raise api_error(401)
+
+    with pytest.raises(Exception, match="erro 401"):
+        router.run(decision("a", "b"), attempt)
+    assert tried == ["a"]
+
+
+def test_local_rate_limit_neither_fails_over_nor_counts():
+    router = ModelRouter(pool=["a", "b"])
+    tried = []
+
+    def attempt(model, attempts, first_token_timeout):
+        tried.append(model)
+        raise ServiceBusyError("muitas requisições")
+
+    with pytest.raises(ServiceBusyError):
+        router.run(decision("a", "b"), attempt)
+    assert tried == ["a"]
+    assert router.health()["a"].samples == 0
+
+
+def test_open_circuit_fails_over_without_counting():
+    router = ModelRouter(pool=["a", "b"])
+
+    def attempt(model, attempts, first_token_timeout):
+        if model == "a":
+            raise CircuitOpenError("instabilidade")
+        return model
+
+    assert router.run(decision("a", "b"), attempt) == "b"
+    assert router.health()["a"].samples == 0
+
+
+def test_first_token_timeout_follows_p95(monkeypatch):
+    monkeypatch.setattr(router_module, "FIRST_TOKEN_TIMEOUT", 1.0)
+    router = ModelRouter(pool=["a"])
+    assert router.first_token_timeout("a") == 1.0
+    for latency in (3.0, 3.0, 3.0):
+        router.record("a", latency)
+    assert router.first_token_timeout("a") == FIRST_TOKEN_P95_FACTOR * 3.0
+    # A latência total sem streaming fica fora da p95 do primeiro token
+    router.record("a", 60.0, streaming=False)
+    assert router.first_token_timeout("a") == FIRST_TOKEN_P95_FACTOR * 3.0
+    assert router.health()["a"].total_p95 == 60.0
+
+
+def test_slow_first_token_fails_over(pipeline, monkeypatch):
+    monkeypatch.setattr(router_module, "FIRST_TOKEN_TIMEOUT", 0.2)
+    pipeline.backend.delays["lento"] = 5
+    router = ModelRouter(pool=["lento", "rapido"])
+
+    def start_stream(model, attempts, first_token_timeout):
+        request = stream_chat("chave", max_attempts=attempts, model=model, **PARAMS)
+        request.wait_first_event(first_token_timeout)
+        return request
+
+    chosen = decision("lento", "rapido")
+    request = router.run(chosen, start_stream)
+    assert "".join(request.chunks()) == "olá mundo"
+    assert (chosen.model, chosen.failed_over_from) == ("rapido", ("lento",))
+    assert router.health()["lento"].error_rate == 1.0
+
+
+def test_first_token_timeout_cancels_the_request(pipeline):
+    pipeline.backend.delays["lento"] = 5
+    request = stream_chat("chave", model="lento", **PARAMS)
+    with pytest.raises(FirstTokenTimeoutError):
+        request.wait_first_event(0.1)
+    assert request.future.cancelled()
@@ -0,0 +1,174 @@
+import sqlite3
+
+from isa.session_store import SessionStore, SqliteHistoryStore, fts_query
+from isa.summarizer import ConversationSummary
+
+
+def messages(*contents):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": c} for i, c in enumerate(contents)]
+
+
+def cold_copy(store):
+    """Outro processo/réplica: mesma base, sem a camada de memória."""
+    return SessionStore(SqliteHistoryStore(store.backend.path), flush_interval=3600)
+
+
+def test_fts_query_quotes_terms_and_prefixes_the_last():
+    assert fts_query('lista "encadeada') == '"lista" "encadeada"*'
+    assert fts_query("  ?! ") is None
+
+
+def test_append_is_written_in_batch_on_flush(store):
+    store.append("c1", 0, messages("oi", "olá"))
+    assert store.stats()["pending_messages"] == 2
+    assert cold_copy(store).load("c1") == ([], None)
+
+    store.flush()
+    assert store.stats()["pending_messages"] == 0
+    assert cold_copy(store).load("c1") == (messages("oi", "olá"), None)
+
+
+def test_load_unknown_conversation(store):
+    assert store.load("nao-existe") == ([], None)
+    assert store.stats()["sessions"] == 0
+
+
+def test_append_from_an_earlier_position_truncates(store):
+    store.append("c1", 0, messages("a", "b", "c"))
+    store.flush()
+    # A última pergunta foi descartada (erro) e outra entrou no lugar
+    store.append("c1", 2, [{"role": "user", "content": "d"}])
+    assert store.load("c1")[0] == messages("a", "b", "d")
+
+    store.flush()
+    assert cold_copy(store).load("c1")[0] == messages("a", "b", "d")
+
+
+def test_truncation_without_new_messages_is_flushed(store):
+    store.append("c1", 0, messages("a", "b", "c"))
+    store.flush()
+    store.append("c1", 1, [])
+    store.flush()
+    assert cold_copy(store).load("c1")[0] == messages("a")
+
+
+def test_summary_is_saved_with_the_messages(store):
+    store.append("c1", 0, messages("a", "b"))
+    store.save_summary("c1", ConversationSummary("resumo", 2))
+    store.flush()
+    assert cold_copy(store).load("c1") == (messages("a", "b"), {"text": "resumo", "covered": 2})
+
+
+def test_evicted_session_is_flushed(tmp_path):
+    store = SessionStore(SqliteHistoryStore(str(tmp_path / "h.sqlite3")), max_sessions=1, flush_interval=3600)
+    store.append("c1", 0, messages("primeira"))
+    store.append("c2", 0, messages("segunda"))
+    assert store.stats()["sessions"] == 1
+    assert cold_copy(store).load("c1")[0] == messages("primeira")
+    assert store.load("c1")[0] == messages("primeira")
+
+
+class FlakyBackend(SqliteHistoryStore):
+    """SQLite que falha nas gravações enquanto `failing` for verdadeiro."""
+
+    failing = True
+
+    def write(self, *args, **kwargs):
+        if self.failing:
+            raise sqlite3.OperationalError("database is locked")
+        return super().write(*args, **kwargs)
+
+
+def test_pending_session_is_kept_until_flush_succeeds(tmp_path):
+    backend = FlakyBackend(str(tmp_path / "h.sqlite3"))
+    store = SessionStore(backend, max_sessions=1, flush_interval=3600)
+    store.append("c1", 0, messages("primeira"))
+    store.append("c2", 0, messages("segunda"))
+    # A gravação falhou: nada sai da memória
+    assert store.stats()["sessions"] == 2
+    assert store.load("c1")[0] == messages("primeira")
+
+    backend.failing = False
+    store.flush()
+    assert store.stats()["sessions"] == 1
+    assert cold_copy(store).load("c1")[0] == messages("primeira")
+    assert cold_copy(store).load("c2")[0] == messages("segunda")
+
+
+def test_truncation_during_a_write_is_not_lost(tmp_path):
+    class SlowBackend(SqliteHistoryStore):
+        def write(self, *args, **kwargs):
+            # Outra thread descarta a última mensagem enquanto o lote é gravado
+            store.append("c1", 1, [])
+            return super().write(*args, **kwargs)
+
+    store = SessionStore(SlowBackend(str(tmp_path / "h.sqlite3")), flush_interval=3600)
+    store.append("c1", 0, messages("pergunta", "resposta"))
+    store.flush()
+    # O lote gravado ficou velho: a conversa continua pendente e é regravada
+    assert store.stats()["pending_messages"] == 1
+    assert store.load("c1")[0] == messages("pergunta")
+    store.flush()
+    assert store.stats()["pending_messages"] == 0
+    assert cold_copy(store).load("c1")[0] == messages("pergunta")
+
+
+def test_load_picks_up_messages_written_by_another_replica(store):
+    store.append("c1", 0, messages("a"))
+    store.flush()
+    assert store.load("c1")[0] == messages("a")
+
+    other = cold_copy(store)
+    other.append("c1", 1, [{"role": "assistant", "content": "b"}])
+    other.flush()
+    assert store.load("c1")[0] == messages("a", "b")
+
+
+def test_delete(store):
+    store.append("c1", 0, messages("a"))
+    store.save_summary("c1", ConversationSummary("resumo", 1))
+    store.flush()
+    store.delete("c1")
+    assert store.load("c1") == ([], None)
+    assert cold_copy(store).load("c1") == ([], None)
+
+
+def test_search_is_limited_to_the_given_conversations(store):
+    store.append("minha", 0, messages("Como funciona uma lista encadeada?", "Uma lista encadeada tem nós."))
+    store.append("alheia", 0, messages("Lista encadeada em C", "Use ponteiros."))
+    hits = store.search("encadeada", conversation_ids={"minha"})
+    assert {hit.conversation_id for hit in hits} == {"minha"}
+    assert len(hits) == 2
+    assert all("**" in hit.snippet for hit in hits)
+    assert store.search("encadeada", conversation_ids=set()) == []
+    assert {hit.conversation_id for hit in store.search("encadeada")} == {"minha", "alheia"}
+
+
+def test_search_by_role_prefix_and_without_accents(store):
+    store.append("c1", 0, messages("Explique a função", "A funcao recebe uma lista encadeada"))
+    hits = store.search("funcao enca", role="assistant")
+    assert [(hit.seq, hit.role) for hit in hits] == [(1, "assistant")]
+    assert {hit.seq for hit in store.search("função")} == {0, 1}
+
+
+def test_search_index_follows_truncation(store):
+    store.append("c1", 0, messages("pergunta", "resposta sobre recursão"))
+    store.flush()
+    store.append("c1", 1, [{"role": "assistant", "content": "outra resposta"}])
+    assert store.search("recursão") == []
+    assert [hit.seq for hit in store.search("outra")] == [1]
+
+
+def test_existing_database_is_indexed_on_first_use(tmp_path):
+    path = str(tmp_path / "antigo.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE messages (conversation_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+        " role TEXT NOT NULL, content TEXT NOT NULL, PRIMARY KEY (conversation_id, seq))"
+    )
+    conn.execute("INSERT INTO messages VALUES ('c1', 0, 'user', 'mensagem antiga sobre grafos')")
+    conn.commit()
+    conn.close()
+    store = SessionStore(SqliteHistoryStore(path), flush_interval=3600)
+    assert [hit.conversation_id for hit in store.search("grafos")] == ["c1"]
+    assert store.conversation_ids() == ["c1"]
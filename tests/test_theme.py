@@ -0,0 +1,29 @@
+from isa.theme import PALETTES, compiled_css, minify
+
+
+def test_minify_removes_comments_and_spaces():
+    css = """
+    /* título */
+    h1 ,  h2 > span {
+        color : #fff ;
+        margin: 0 auto;
+    }
+    """
+    assert minify(css) == "h1,h2>span{color:#fff;margin:0 auto}"
+
+
+def test_minify_keeps_quoted_strings():
+    css = """p[style*='color: #00ffb3'] { font-family: 'Segoe UI', sans-serif; content: "a ; b { }"; }"""
+    assert minify(css) == """p[style*='color: #00ffb3']{font-family:'Segoe UI',sans-serif;content:"a ; b { }"}"""
+
+
+def test_minify_ignores_quotes_inside_comments():
+    css = """/* Botão "E-mail" e 'Browse files' */ a { color: red; }"""
+    assert minify(css) == "a{color:red}"
+
+
+def test_compiled_css_keeps_status_selectors():
+    css = compiled_css("dark")
+    assert "p[style*='color: #00ffb3']" in css
+    assert "p[style*='color: #ff4b4b']" in css
+    assert set(PALETTES) >= {"dark", "light"}